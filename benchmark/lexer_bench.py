@@ -0,0 +1,186 @@
+"""
+词法分析的性能测试，使用生成的语料测试 grammer.TOKENS 的 BaseLexer:
+
+    python -m benchmark.lexer_bench --sizes 1 10 100 --output lexer.json
+    python -m benchmark.lexer_bench --sizes 1 --compare lexer.json
+
+结果保存为 json，可以通过 --compare 与之前 commit 的结果进行比较。
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, List, Optional
+
+from error.reporter import SourceCodeMaker
+from grammer import TOKENS
+from lexer.cache import TableCache
+from lexer.lexer import BaseLexer, IncrementalLexer
+
+MB = 1024 * 1024
+KEYWORDS = ["let", "if", "else", "while", "for", "def", "return", "impl", "trait", "struct", "self", "true", "false"]
+
+
+def _identifier(rand: random.Random) -> str:
+    head = rand.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+    return head + "".join(rand.choice("abcdefghijklmnopqrstuvwxyz0123456789_") for _ in range(rand.randint(0, 12)))
+
+
+def _identifiers(rand: random.Random) -> str:
+    words = [rand.choice(KEYWORDS) if rand.random() < 0.2 else _identifier(rand) for _ in range(8)]
+    return f"let {words[0]} = {words[1]}.{words[2]}({words[3]}, {words[4]}) + {words[5]} * {words[6]} - {words[7]};\n"
+
+
+def _strings(rand: random.Random) -> str:
+    parts = ["".join(rand.choice("abcdefghij klmnopqrstuvwxyz,.!") for _ in range(rand.randint(10, 80))) for _ in range(4)]
+    return 'let s = "' + '\\"'.join(parts) + '";\n'
+
+
+def _comments(rand: random.Random) -> str:
+    return "# " + "".join(rand.choice("abcdefghij klmnopqrstuvwxyz,.;(){}\"'") for _ in range(rand.randint(100, 400))) + "\n"
+
+
+def _numbers(rand: random.Random) -> str:
+    return f"let n = {rand.randint(0, 10 ** 9)} + {rand.randint(0, 10 ** 6)}.{rand.randint(0, 10 ** 6)} * {rand.randint(0, 99)};\n"
+
+
+def _nesting(rand: random.Random) -> str:
+    depth = rand.randint(20, 60)
+    expr = "(" * depth + "a + 1" + ")" * depth
+    return "if x {\n" * 4 + f"let v = [{expr}, {{1: {expr}}}];\n" + "}\n" * 4
+
+
+CORPORA: Dict[str, Callable[[random.Random], str]] = {
+    "identifiers": _identifiers,
+    "strings": _strings,
+    "comments": _comments,
+    "numbers": _numbers,
+    "nesting": _nesting,
+}
+
+
+def generate(corpus: str, size: int, seed: int = 0) -> str:
+    # 生成大约 size 字节的语料，内容都是 ascii 字符
+    rand = random.Random(seed)
+    chunk = CORPORA[corpus]
+    res = []
+    length = 0
+    while length < size:
+        line = chunk(rand)
+        res.append(line)
+        length += len(line)
+    return "".join(res)
+
+
+def bench_construction() -> Dict[str, float]:
+    lexer = BaseLexer(TOKENS, SourceCodeMaker(""), "")
+    start = time.perf_counter()
+    table = lexer._compile_table(TOKENS)
+    build = time.perf_counter() - start
+    with TemporaryDirectory() as directory:
+        TableCache(directory).load(TOKENS, lambda: table)
+        start = time.perf_counter()
+        TableCache(directory).load(TOKENS, lambda: table)
+        load = time.perf_counter() - start
+    return {"dfa_states": table.state_count, "dfa_build_seconds": build, "dfa_cache_load_seconds": load}
+
+
+def bench_lex(source: str, repeat: int, memory: bool) -> Dict[str, float]:
+    # 所有 token 都不忽略，token 数量即状态机识别出的 token 数量(不包括 EOF)
+    lexer = IncrementalLexer(TOKENS, set())
+    seconds = None
+    tokens = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        store = lexer.lex(source)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+        tokens = len(store) - 1
+        del store
+    size = len(source.encode("utf-8"))
+    res = {
+        "chars": len(source),
+        "bytes": size,
+        "tokens": tokens,
+        "seconds": seconds,
+        "tokens_per_sec": tokens / seconds if seconds else None,
+        "bytes_per_sec": size / seconds if seconds else None,
+    }
+    if memory:
+        # tracemalloc 会拖慢词法分析，单独运行一次统计内存峰值
+        tracemalloc.start()
+        store = lexer.lex(source)
+        res["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del store
+    return res
+
+
+def commit_id() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(corpora: List[str], sizes: List[float], repeat: int = 1, memory: bool = True, seed: int = 0) -> Dict:
+    results = []
+    for corpus in corpora:
+        for size in sizes:
+            source = generate(corpus, int(size * MB), seed)
+            results.append({"corpus": corpus, "size_mb": size} | bench_lex(source, repeat, memory))
+    return {
+        "commit": commit_id(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "construction": bench_construction(),
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict) -> List[str]:
+    lines = []
+    old = {(r["corpus"], r["size_mb"]): r for r in baseline["results"]}
+    for r in report["results"]:
+        base = old.get((r["corpus"], r["size_mb"]))
+        if base is None or not base["tokens_per_sec"]:
+            continue
+        ratio = r["tokens_per_sec"] / base["tokens_per_sec"]
+        lines.append(f"{r['corpus']:<12} {r['size_mb']:>6}MB  {ratio:6.2f}x tokens/sec")
+    return lines
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="lexer throughput benchmark")
+    arg_parser.add_argument("--corpora", nargs="+", choices=list(CORPORA), default=list(CORPORA))
+    arg_parser.add_argument("--sizes", nargs="+", type=float, default=[1, 10, 100], help="corpus sizes in MB")
+    arg_parser.add_argument("--repeat", type=int, default=1)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    arg_parser.add_argument("--output", help="write the json report to this file")
+    arg_parser.add_argument("--compare", help="json report of a previous run")
+    args = arg_parser.parse_args(argv)
+
+    report = run(args.corpora, args.sizes, args.repeat, not args.no_memory, args.seed)
+    for r in report["results"]:
+        print(f"{r['corpus']:<12} {r['size_mb']:>6}MB  {r['tokens_per_sec']:>12.0f} tokens/s  "
+              f"{r['bytes_per_sec'] / MB:8.2f} MB/s  peak {r.get('peak_memory_bytes', 0) / MB:8.2f} MB")
+    construction = report["construction"]
+    print(f"dfa states {construction['dfa_states']}  build {construction['dfa_build_seconds']:.4f}s  "
+          f"cache load {construction['dfa_cache_load_seconds']:.4f}s")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(report, json.load(f))))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
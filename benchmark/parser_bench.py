@@ -0,0 +1,146 @@
+"""
+语法分析的性能测试，token 预先由 BaseLexer 全部解析出来，只统计 parse_proc 的时间:
+
+    python -m benchmark.parser_bench --output parser.json
+    python -m benchmark.parser_bench --compare parser.json
+
+除了常见的代码外还包含嵌套很深的表达式以及代码块，用于验证语法分析不受 python 递归深度的限制。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmark.lexer_bench import commit_id
+from error.reporter import SourceCodeMaker
+from grammer import TOKENS
+from lexer.lexer import BaseLexer
+from parser.expr import parse_proc
+from runtime.bridge import BRIDGE_CODE
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "demo")
+
+
+def _typical(scale: int) -> str:
+    demos = [BRIDGE_CODE]
+    for name in sorted(os.listdir(DEMO_DIR)):
+        with open(os.path.join(DEMO_DIR, name), encoding="utf-8") as f:
+            demos.append(f.read())
+    return "\n".join(demos * scale)
+
+
+def _expressions(scale: int) -> str:
+    rand = random.Random(0)
+    ops = ["+", "-", "*", "/", "==", "<", "and", "or", "|", "&", "<<"]
+    lines = []
+    for i in range(300 * scale):
+        expr = "a"
+        for _ in range(8):
+            expr += f" {rand.choice(ops)} {rand.choice(['a', 'b.c', 'f(x, 1)', '2', '3.5', '(a + b)', 'not c'])}"
+        lines.append(f"let v{i} = {expr};")
+    return "\n".join(lines)
+
+
+def _statements(scale: int) -> str:
+    body = "let a = 1; if a < 2 { a = a + 1; } elif a == 3 { f(a); } else { while a > 0 { a = a - 1; } }"
+    return "\n".join(f"def f{i}(a: Int) -> Int {{ {body} for x in g(a) {{ {body} }} return a; }}" for i in range(100 * scale))
+
+
+def _deep_parens(depth: int) -> str:
+    return "let v = " + "(" * depth + "1" + ")" * depth + ";"
+
+
+def _deep_chain(depth: int) -> str:
+    # a + (b + (c + ...))
+    return "let v = " + "a + (" * depth + "a" + ")" * depth + ";"
+
+
+def _deep_blocks(depth: int) -> str:
+    return "if a == 1 {" * depth + "f(a);" + "}" * depth
+
+
+CORPORA: Dict[str, Callable[[int], str]] = {
+    "typical": _typical,
+    "expressions": _expressions,
+    "statements": _statements,
+}
+
+DEEP_CORPORA: Dict[str, Callable[[int], str]] = {
+    "deep_parens": _deep_parens,
+    "deep_chain": _deep_chain,
+    "deep_blocks": _deep_blocks,
+}
+
+
+def bench_parse(source: str, repeat: int) -> Dict:
+    seconds = None
+    tokens = 0
+    for _ in range(repeat):
+        lexer = BaseLexer(TOKENS, SourceCodeMaker(source), source, ignore={"white_space", "comment"})
+        tokens = len(lexer._mock_lexer._tokens) - 1
+        start = time.perf_counter()
+        try:
+            parse_proc(lexer)
+        except RecursionError:
+            return {"tokens": tokens, "seconds": None, "tokens_per_sec": None, "error": "RecursionError"}
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    return {"tokens": tokens, "seconds": seconds, "tokens_per_sec": tokens / seconds if seconds else None}
+
+
+def run(scale: int = 10, depth: int = 10000, repeat: int = 5) -> Dict:
+    results = []
+    for name, corpus in CORPORA.items():
+        results.append({"corpus": name} | bench_parse(corpus(scale), repeat))
+    for name, corpus in DEEP_CORPORA.items():
+        results.append({"corpus": name, "depth": depth} | bench_parse(corpus(depth), 1))
+    return {
+        "commit": commit_id(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "recursion_limit": sys.getrecursionlimit(),
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict) -> List[str]:
+    lines = []
+    old = {r["corpus"]: r for r in baseline["results"]}
+    for r in report["results"]:
+        base = old.get(r["corpus"])
+        if base is None or not base["tokens_per_sec"] or not r["tokens_per_sec"]:
+            continue
+        lines.append(f"{r['corpus']:<12} {r['tokens_per_sec'] / base['tokens_per_sec']:6.2f}x tokens/sec")
+    return lines
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="parser benchmark")
+    arg_parser.add_argument("--scale", type=int, default=10, help="size multiplier of the typical corpora")
+    arg_parser.add_argument("--depth", type=int, default=10000, help="nesting depth of the deep corpora")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--output", help="write the json report to this file")
+    arg_parser.add_argument("--compare", help="json report of a previous run")
+    args = arg_parser.parse_args(argv)
+
+    report = run(args.scale, args.depth, args.repeat)
+    for r in report["results"]:
+        if r["seconds"] is None:
+            print(f"{r['corpus']:<12} {r['tokens']:>8} tokens  {r['error']}")
+        else:
+            print(f"{r['corpus']:<12} {r['tokens']:>8} tokens  {r['seconds']:8.4f}s  {r['tokens_per_sec']:>10.0f} tokens/s")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(report, json.load(f))))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,11 +1,19 @@
+import argparse
 import logging
-import sys
 from runtime.interpreter import  INTERPRETER
 from utils.logger import LOGGER
 
 if __name__ == '__main__':
-    with open(sys.argv[1], encoding='utf-8') as f:
-        code = f.read()
-        LOGGER.setLevel(logging.WARNING)
-        INTERPRETER.init()
-        INTERPRETER.run(code)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("files", nargs="+")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="number of processes used to parse files")
+    arg_parser.add_argument("-b", "--byte-code", action="store_true", help="experimental: generate python 3.12 bytecode directly instead of python source (slower)")
+    args = arg_parser.parse_args()
+    LOGGER.setLevel(logging.WARNING)
+    INTERPRETER.init()
+    if len(args.files) == 1:
+        with open(args.files[0], encoding='utf-8') as f:
+            INTERPRETER.run(f.read(), byte_code=args.byte_code)
+    else:
+        # 多个文件在进程池中并行解析后合并执行
+        INTERPRETER.run_files(args.files, args.jobs, byte_code=args.byte_code)
@@ -1,110 +1,106 @@
-from typing import List, Tuple, Any
-
-from bytecode import ConcreteBytecode, ConcreteInstr
+import sys
+from types import CodeType
+from typing import Dict, List, Optional, Set
 
+from bytecode.instr import BinaryOp, Compare
 
+from code_gen.instances import InstanceCache
+from code_gen.ir import CodeRepr, ByteCodes, Comment, repr_to_bytecode, Label
+from code_gen.script import PythonCodeGenerator
 from parser.node import LiteralNode, VarNode, AssignNode, BinaryOpNode, ProcNode, FunctionDefNode, FunctionCallNode, \
     BlockNode, ReturnNode, VarDefNode, StructInitNode, AttributeNode, TraitImplNode, IfStatement, LoopStatement, \
-    ContinueOrBreak
-from parser.types import VarType
-from parser.visitor.visitor import Visitor
-from dataclasses import dataclass, field
-from bytecode.instr import Compare
-from code_gen.ir import CodeRepr, ByteCodes, ConcreteBytecodeConverter, Comment, repr_to_bytecode, Label
-from bytecode.instr import BinaryOp
-
-
-@dataclass
-class StackFrame:
-    bytecode_obj: ConcreteBytecode
-    varnames_index: dict[str, int] = field(default_factory=dict)
-    names_index: dict[str, int] = field(default_factory=dict)
-    const_index: dict[str, int] = field(default_factory=dict)
-
-    def add_var(self, name):
-        self.bytecode_obj.varnames.append(name)
-        self.varnames_index[name] = len(self.bytecode_obj.varnames) - 1
-        return self.varnames_index[name]
-
-    def add_const(self, val):
-        if val in self.bytecode_obj.consts:
-            return self.const_index[val]
-        self.bytecode_obj.consts.append(val)
-        self.const_index[val] = len(self.bytecode_obj.consts) - 1
-        return self.const_index[val]
-
-    def add_global(self, name):
-        self.bytecode_obj.names.append(name)
-        self.names_index[name] = len(self.bytecode_obj.names) - 1
-        return self.names_index[name]
-
-    def append_code(self, op_name: str, op_num:int = None):
-        self.bytecode_obj.append(ConcreteInstr(op_name, arg=UNSET if op_num is None else op_num))
-
-    def append_codes(self, *codes: str|Tuple[str, int]):
-        for c in codes:
-            if isinstance(c, str):
-                self.append_code(c)
-            else:
-                opcode, opnum = c
-                self.append_code(opcode, opnum)
-
-
+    ContinueOrBreak, ASTNode
+from parser.scope import TraitImpls
+from parser.visitor.script_gen_visitor import EvalVisitor, TypeContext
+from runtime.data import MetaManager, field_slot
+from utils.logger import LOGGER
 
 
 BINARY_OP_MAP = {
-    '+': 0,
-    'and': 1,
-    '//': 2,
-    '<<': 3,
-    'MATRIX_MULTIPLY': 4,
-    '*': 5,
-    '%': 6,  # `%`
-    'or': 7,
-    '**': 8,
-    '>>': 9,
-    '-': 10,
-    '/': 11,
-    '^': 12
+    '+': BinaryOp.ADD,
+    '<<': BinaryOp.LSHIFT,
+    '*': BinaryOp.MULTIPLY,
+    '>>': BinaryOp.RSHIFT,
+    '-': BinaryOp.SUBTRACT,
+    '/': BinaryOp.TRUE_DIVIDE,
+    '^': BinaryOp.XOR,
 }
 
 COMPARE_OP_MAP = {
-    "<": 0 << 4,
-    "<=": 1 << 4,
-    "==": 2 << 4,
-    "!=": 3 << 4,
-    ">": 4 << 4,
-    ">=": 5 << 4,
-    "in": 6,
-    "not in": 7,
-    "is": 8,
-    "is not": 9,
-    "exception match": 10,
-    "BAD": 11
+    "<": Compare.LT,
+    "<=": Compare.LE,
+    "==": Compare.EQ,
+    "!=": Compare.NE,
+    ">": Compare.GT,
+    ">=": Compare.GE,
 }
 
+# 生成的指令(KW_NAMES、RETURN_CONST、带 NULL 标记的 LOAD_GLOBAL 等)只适用于这个版本的字节码
+BYTE_CODE_VERSION = (3, 12)
 
-class BytecodeGenerateVisitor(Visitor):
+# 作为语句时需要丢弃结果的表达式
+EXPRESSION_NODES = (FunctionCallNode, BinaryOpNode, LiteralNode, VarNode, AttributeNode, StructInitNode)
 
 
-    def __init__(self):
+class BytecodeGenerateVisitor(EvalVisitor):
+    """
+    直接生成 CPython 字节码的后端，跳过生成源码以及 compile。
+    单态化、trait 的分派以及 dyn 对象与 EvalVisitor 共用(resolve_call、define_function 等)，
+    表达式返回 CodeRepr 的列表，visit_proc 返回模块的 code 对象，function_defs 中是定义函数的 code 对象。
+    生成的指令依赖于当前 Python 版本的字节码(3.12)
+    """
+
+    def __init__(self, meta_manager: MetaManager, trait_impl: TraitImpls, instance_cache: Optional[InstanceCache] = None,
+                 dependencies: Optional[Dict[int, tuple]] = None):
+        if sys.version_info[:2] != BYTE_CODE_VERSION:
+            raise RuntimeError(f"byte code backend requires python {'.'.join(map(str, BYTE_CODE_VERSION))}, "
+                               f"but running on {sys.version_info[0]}.{sys.version_info[1]}")
+        super().__init__(meta_manager, PythonCodeGenerator(), trait_impl, instance_cache, dependencies)
         self._current_if_statement_index = -1
-        self._current_loop_statement_index = -1
-
-    def visit_lit(self, node: 'LiteralNode'):
-        match VarType(node.literal_type):
-            case VarType.Float: val = float(node.val)
-            case VarType.Int: val = int(node.val)
-            case VarType.Bool if node.val == "true": val = True
-            case VarType.Bool if node.val == "false": val = False
-            case VarType.String: val = node.val[1: -1]
+        # 正在生成的函数的局部变量，生成模块代码时为空
+        self._locals: List[Set[str]] = []
+
+    def _load(self, name: str) -> CodeRepr:
+        if not self._locals:
+            return CodeRepr(ByteCodes.LOAD_NAME, name=name)
+        if name in self._locals[-1]:
+            return CodeRepr(ByteCodes.LOAD_FAST, var=name)
+        return CodeRepr(ByteCodes.LOAD_GLOBAL, name=name)
+
+    def _store(self, name: str) -> CodeRepr:
+        if not self._locals:
+            return CodeRepr(ByteCodes.STORE_NAME, name=name)
+        self._locals[-1].add(name)
+        return CodeRepr(ByteCodes.STORE_FAST, var=name)
+
+    def _load_callable(self, name: str) -> List[CodeRepr]:
+        if self._locals and name not in self._locals[-1]:
+            # LOAD_GLOBAL 同时压入调用需要的 NULL
+            return [CodeRepr(ByteCodes.LOAD_GLOBAL, name=name, flag=True)]
+        return [CodeRepr(ByteCodes.PUSH_NULL), self._load(name)]
+
+    def _statements(self, stmts: List[ASTNode], context: TypeContext) -> List[CodeRepr|Comment|Label]:
+        res = []
+        for stmt in stmts:
+            if code := stmt.accept(self, context):
+                res += code
+                if isinstance(stmt, EXPRESSION_NODES):
+                    res.append(CodeRepr(ByteCodes.POP_TOP))
+        return res
+
+    def visit_lit(self, node: 'LiteralNode', context=None):
+        match node.literal_type.lower():
+            case "float": val = float(node.val)
+            case "string": val = node.val[1: -1]
+            case "int": val = int(node.val)
+            case "bool": val = node.val == "true"
             case _: raise Exception(f"unknown literal type {node.val}")
         return [CodeRepr(ByteCodes.LOAD_CONST, const=val)]
 
-    def visit_bin_op(self, node: 'BinaryOpNode'):
+    def _bin_op(self, node: 'BinaryOpNode', context) -> List[CodeRepr]:
         res = []
-        res += node.left.accept(self)
-        res += node.right.accept(self)
+        res += node.left.accept(self, context)
+        res += node.right.accept(self, context)
         if node.op in BINARY_OP_MAP:
             res.append(CodeRepr(ByteCodes.BINARY_OP, op_num=BINARY_OP_MAP[node.op]))
         elif node.op in COMPARE_OP_MAP:
@@ -113,270 +109,147 @@ class BytecodeGenerateVisitor(Visitor):
             raise ValueError("unknown op %s" % node.op)
         return res
 
+    def visit_bin_op(self, node: 'BinaryOpNode', context=None):
+        if node.transformed:
+            if native_type := self.native_operand_type(node, context):
+                LOGGER.info("use native operator '%s' for %s", node.op, native_type)
+                return self._bin_op(node, context)
+            return node.transformed.accept(self, context)
+        return self._bin_op(node, context)
 
-    def visit_var(self, node: 'VarNode'):
-        if node.identifier.string == "echo":
-            return [CodeRepr(ByteCodes.LOAD_GLOBAL, name="echo")]
-        return [CodeRepr(ByteCodes.LOAD_FAST, var=node.identifier.string)]
+    def visit_var(self, node: 'VarNode', context=None):
+        return [self._load(node.identifier.string)]
 
-
-    def visit_assign(self, node: 'AssignNode'):
+    def visit_assign(self, node: 'AssignNode', context=None):
         res = []
-        res += node.assign_expr.accept(self)
-        res.append(CodeRepr(ByteCodes.STORE_FAST, var=node.var.identifier.string))
+        res += node.assign_expr.accept(self, context)
+        res.append(self._store(node.var.identifier.string))
         return res
 
-    def visit_proc(self, node: 'ProcNode'):
-        print_obj = ConcreteBytecode()
-        print_obj.name = 'echo'
-        print_obj.names = ['print']
-        print_obj.varnames = ['string']
-        print_obj.argcount = 1
-        print_obj.extend([
-            ConcreteInstr("PUSH_NULL"),
-            ConcreteInstr("LOAD_GLOBAL", 0),
-            ConcreteInstr("LOAD_FAST", 0),
-            ConcreteInstr("CALL", 1),
-            ConcreteInstr("RETURN_VALUE"),
-        ])
-
-        res = [
-            Comment("main function start"),
-            Comment("add echo to global"),
-            CodeRepr(ByteCodes.LOAD_CONST, const=print_obj.to_code()),
-            CodeRepr(ByteCodes.STORE_GLOBAL, name='echo'),
-
-            Comment("init vtable & store to global"),
-            CodeRepr(ByteCodes.PUSH_NULL),
-            CodeRepr(ByteCodes.LOAD_GLOBAL, name='defaultdict', need_shift=True),
-            CodeRepr(ByteCodes.LOAD_GLOBAL, name='dict', need_shift=True),
-            CodeRepr(ByteCodes.CALL, op_num=1),
-            CodeRepr(ByteCodes.STORE_GLOBAL, name='vtables'),
-        ]
-        for statement in node.children:
-            if r := statement.accept(self):
-                res += r
-        res.append(CodeRepr(ByteCodes.RETURN_CONST, null_const=True))
-        return ConcreteBytecodeConverter(res).show().convert()
-
-    def visit_block(self, node: 'BlockNode'):
+    def visit_var_def(self, node: 'VarDefNode', context=None):
         res = []
-        for s in node.stmts:
-            if r := s.accept(self):
-                res += r
-        return res
-
-    def visit_function_call(self, node: 'FunctionCallNode'):
-        res = [
-            Comment(f"==function call start"),
-            CodeRepr(ByteCodes.PUSH_NULL)
-        ]
-        res += node.call_source.accept(self)
-        res.append(CodeRepr(ByteCodes.MAKE_FUNCTION, op_num=0))
-        is_trait = False
-        if isinstance(node.call_source, AttributeNode):
-            res.append(Comment("add self as the first argument for object function"))
-            res += node.call_source.data.accept(self)
-            is_trait = True
-        for i, arg in enumerate(node.args):
-            res += arg.accept(self)
-        res.append(CodeRepr(ByteCodes.CALL, op_num=(len(node.args) + 1 if is_trait else len(node.args))))
-        res.append(CodeRepr(ByteCodes.POP_TOP))
-        res.append(Comment(f"==function call end"))
+        if node.init_expr:
+            res += node.init_expr.accept(self, context)
+            res.append(self._store(node.var_node.string))
         return res
 
-    def visit_loop(self, node: 'LoopStatement'):
-        pass
-
-    def visit_function_def(self, node: 'FunctionDefNode'):
-
-        func_def_bytecodes = [
-            Comment(f"func def of '{node.name.string}' start")
-        ]
-        func_def_bytecodes += node.body.accept(self)
-        func_def_bytecodes.append(Comment(f"func def of '{node.name.string}' end\n\n"))
-
-        func_bc = repr_to_bytecode(func_def_bytecodes)
-        func_bc.argcount = len(node.args) + 1 if node.trait_node else len(node.args)
-        func_bc.string = node.name.string
-        func_obj = func_bc.to_code()
-
-        res = []
-        target_type_name = node.trait_node and node.trait_node.target_type.name
-        if target_type_name:
-            res.append(Comment("load func object"))
-            res.append(CodeRepr(ByteCodes.LOAD_CONST, const=func_obj))
-
-            res.append(Comment("load vtable from global"))
-            res.append(CodeRepr(ByteCodes.LOAD_GLOBAL, name='vtables', need_shift=True))
-            res.append(CodeRepr(ByteCodes.LOAD_CONST, const=target_type_name))
-            res.append(CodeRepr(ByteCodes.BINARY_SUBSCR))
+    def visit_proc(self, node: 'ProcNode', context=None) -> CodeType:
+        res = [Comment("main function start")]
+        res += self._statements(node.children, TypeContext())
+        res.append(CodeRepr(ByteCodes.RETURN_CONST, null_const=True))
+        return repr_to_bytecode(res).to_code()
 
-            res.append(Comment("store function to global vtable"))
-            res.append(CodeRepr(ByteCodes.LOAD_CONST, const=node.name.string))
-            res.append(CodeRepr(ByteCodes.STORE_SUBSCR))
+    def visit_block(self, node: 'BlockNode', context=None):
+        return self._statements(node.stmts, context)
 
+    def visit_function_call(self, node: 'FunctionCallNode', context: TypeContext=None):
+        context = context or TypeContext()
+        target = self.resolve_call(node, context)
+        res = [Comment(f"==function call {node.call_ref.name} start")]
+        if target.name:
+            res += self._load_callable(target.name)
         else:
-            res.append(CodeRepr(ByteCodes.LOAD_CONST, const=func_obj))
-            res.append(CodeRepr(ByteCodes.STORE_FAST, var=node.name.string))
-
-        return res
-
-    def visit_var_def(self, node: 'VarDefNode'):
-        res = []
-        if node.init_expr:
-            res += node.init_expr.accept(self)
-            res.append(CodeRepr(ByteCodes.STORE_FAST, var = node.var_node.string))
+            res.append(CodeRepr(ByteCodes.PUSH_NULL))
+            res += node.call_source.accept(self, context)
+        args = list(node.args)
+        if target.receiver:
+            res.append(Comment("add self as the first argument for object function"))
+            args.insert(0, target.receiver)
+        for arg in args:
+            res += arg.accept(self, target.context)
+        res.append(CodeRepr(ByteCodes.CALL, op_num=len(args)))
+        res.append(Comment(f"==function call {node.call_ref.name} end"))
         return res
 
-    def visit_type(self, node: 'TypeNode'):
-        pass
-
-    def visit_type_def(self, node: 'TypeNode'):
-        pass
-
-    def visit_return(self, node: 'ReturnNode'):
+    def visit_function_def(self, node: 'FunctionDefNode', context: TypeContext=None):
+        if not context or not context.return_type or not node:
+            return None
+        if node.type_parameters and not context.type_binds:
+            return None
+        function_name = context.function_name or node.name.string
+        args = [x.var_node.string for x in node.args]
+        context.trait and args.insert(0, "self")
+
+        self._locals.append(set(args))
+        try:
+            func_def_bytecodes = [Comment(f"func def of '{function_name}' start")]
+            func_def_bytecodes += node.body.accept(self, context)
+            func_def_bytecodes.append(CodeRepr(ByteCodes.RETURN_CONST, null_const=True))
+            func_def_bytecodes.append(Comment(f"func def of '{function_name}' end"))
+        finally:
+            self._locals.pop()
+        func_obj = repr_to_bytecode(func_def_bytecodes, function_name, args).to_code()
+
+        # 与 def 语句相同，在 exec 时创建函数并定义到全局变量中
+        return repr_to_bytecode([
+            CodeRepr(ByteCodes.LOAD_CONST, const=func_obj),
+            CodeRepr(ByteCodes.MAKE_FUNCTION, op_num=0),
+            CodeRepr(ByteCodes.STORE_NAME, name=function_name),
+            CodeRepr(ByteCodes.RETURN_CONST, null_const=True),
+        ]).to_code()
+
+    def visit_return(self, node: 'ReturnNode', context: TypeContext=None):
+        self.prepare_return(node, context)
         res = []
-        res += node.expr.accept(self)
+        res += node.expr.accept(self, context)
         res.append(CodeRepr(ByteCodes.RETURN_VALUE))
         return res
 
-    def visit_identifier(self, node: 'IdNode'):
-        pass
-
-    def visit_struct_init(self, node: 'StructInitNode'):
-        key_names = tuple([expr.var.identifier.string for expr in node.body] + ['$__vtable__'])
-
-        res: List[CodeRepr|Comment] = [
-            Comment("start to create an object")
-        ]
-        for assign in node.body:
-            res += assign.assign_expr.accept(self)
-
-        res.append(Comment("add method to vtables"))
-        res.append(CodeRepr(ByteCodes.LOAD_GLOBAL, name='vtables', need_shift=True))
-        res.append(CodeRepr(ByteCodes.LOAD_CONST, const=node.type_name.name))
-        res.append(CodeRepr(ByteCodes.BINARY_SUBSCR))
-
-        res.append(CodeRepr(ByteCodes.LOAD_CONST, const=key_names))
-        res.append(CodeRepr(ByteCodes.BUILD_CONST_KEY_MAP, op_num=len(node.body) + 1))
-
+    def visit_struct_init(self, node: 'StructInitNode', context=None):
+        class_name, keywords = self.struct_layout(node, context)
+        res: List[CodeRepr|Comment] = [Comment(f"start to create an object of {class_name}")]
+        res += self._load_callable(class_name)
+        for _, assign_expr in node.body:
+            res += assign_expr.accept(self, context)
+        if keywords is not None:
+            res.append(CodeRepr(ByteCodes.KW_NAMES, const=tuple(keywords)))
+        res.append(CodeRepr(ByteCodes.CALL, op_num=len(node.body)))
         return res
 
-
-
-
-
-        # self.append_code("LOAD_CONST", self.current_frame.add_const("$vtable"))
-
-
-
-
-    def visit_function_type(self, node: 'FunctionTypeNode'):
-        pass
-
-    def visit_attribute(self, node: 'AttributeNode'):
-        data_bytes = node.data.accept(self)
-        """
-            implement dynamic bind in runtime
-            every obj has a special attribute $_vatable__, which stores trait functions.
-            let student = Student{name="lily"}
-            impl Write for Student{
-                def toString() -> String{
-                    return self.name;
-                }
-            }
-            student would be a python dict:
-            {
-                "name":  "lily",
-                "$vtable": {
-                    "toString": [function type in python]
-                }   
-            } 
-            for a attribute operation, we don't know it's trait function or a normal attribute.
-            so we need to use: 
-            d.get("$vtable", {}).get("attr", d.get("attr")) to get the final result.
-                                             ^^^^^^^^^^^^^ use normal attribute as default value
-        """
-        res: List[CodeRepr|Comment] = [
-            Comment("get vtable from dict")
-        ]
-        res += data_bytes
-        res.append(CodeRepr(ByteCodes.LOAD_ATTR, name='get', need_shift=True, flag=True))
-        res.append(CodeRepr(ByteCodes.LOAD_CONST, const='$__vtable__'))
-        res.append(CodeRepr(ByteCodes.CALL, op_num=1))
-
-        res.append(Comment("get method object from vtable"))
-        res.append(CodeRepr(ByteCodes.LOAD_ATTR, name='get', need_shift=True, flag=True))
-        res.append(CodeRepr(ByteCodes.LOAD_CONST, const=node.attr.string))
-
-        res.append(Comment("set the default value to attr start"))
-        res += data_bytes
-        res.append(CodeRepr(ByteCodes.LOAD_ATTR, name='get', need_shift=True, flag=True))
+    def visit_attribute(self, node: 'AttributeNode', context=None):
+        if node.is_field:
+            # struct 的字段直接读取 slot
+            res = node.data.accept(self, context)
+            res.append(CodeRepr(ByteCodes.LOAD_ATTR, name=field_slot(node.attr.string)))
+            return res
+        res: List[CodeRepr|Comment] = [Comment("get attribute from vtable or data")]
+        res += self._load_callable("get_attr")
+        res += node.data.accept(self, context)
         res.append(CodeRepr(ByteCodes.LOAD_CONST, const=node.attr.string))
-        res.append(CodeRepr(ByteCodes.CALL, op_num=1))
-        res.append(Comment("set the default value to attr end"))
         res.append(CodeRepr(ByteCodes.CALL, op_num=2))
-        res.append(Comment("get attribute completed"))
-
-        # self.append_codes(
-        #     # try load attr from vtable
-        #     ("LOAD_ATTR", (self.current_frame.add_global("get") << 1) | 1),
-        #     ("LOAD_CONST", self.current_frame.add_const("$__vtable__")),
-        #     ("CALL", 1),
-        #
-        #     ("LOAD_ATTR", (self.current_frame.add_global("get") << 1) | 1),
-        #     ("LOAD_CONST", self.current_frame.add_const(node.attr.name)),
-        #
-        # )
-        #
-        #
-        # node.data.accept(self)
-        # self.append_codes(
-        #     ("LOAD_ATTR", (self.current_frame.add_global("get") << 1) | 1),
-        #     ("LOAD_CONST", self.current_frame.add_const(node.attr.name)),
-        #     ("CALL", 1),
-        #     # us `or` operator to get final attr
-        #     ("CALL", 2)
-        # )
         return res
 
-    def visit_trait_impl(self, node: 'TraitImplNode'):
-        res = []
-        for node in node.functions:
-            res += node.accept(self)
-        return res
+    def visit_trait_impl(self, node: 'TraitImplNode', context=None):
+        return None
 
-    def visit_if(self, node: 'IfStatement'):
+    def visit_if(self, node: 'IfStatement', context=None):
         res: List[CodeRepr|Comment|Label] = [
             Comment("if statement start")
         ]
         self._current_if_statement_index += 1
         if_index = self._current_if_statement_index
-        single_if = len(node.branches) and not node.else_branch
-        for index, v in enumerate(node.branches):
-            condition, body = v
+        for index, (condition, body) in enumerate(node.branches):
             res.append(Label(if_index, str(index)))
-            res += condition.accept(self)
-            res.append(CodeRepr(ByteCodes.POP_JUMP_IF_FALSE, label = Label(if_index, str(index + 1))))
-            res += body.accept(self)
-            # jump to end if there is another branch/else
-            single_if or res.append(CodeRepr(ByteCodes.JUMP_FORWARD, label = Label(if_index, 'end')))
-        res.append(Label(if_index, str(index + 1)))
+            res += condition.accept(self, context)
+            res.append(CodeRepr(ByteCodes.POP_JUMP_IF_FALSE, label=Label(if_index, str(index + 1))))
+            res += body.accept(self, context)
+            # 跳过之后的分支
+            res.append(CodeRepr(ByteCodes.JUMP_FORWARD, label=Label(if_index, 'end')))
+        res.append(Label(if_index, str(len(node.branches))))
         if node.else_branch:
-            res += node.else_branch.accept(self)
+            res += node.else_branch.accept(self, context)
         res.append(Label(if_index, 'end'))
-        # res.append(CodeRepr(ByteCodes.RETURN_CONST, null_const=True))
         res.append(Comment("if statement end"))
         return res
 
-    def visit_loop(self, node: 'LoopStatement'):
+    def visit_loop(self, node: 'LoopStatement', context=None):
         self._current_if_statement_index += 1
         loop_index = self._current_if_statement_index
-        res: List[Label|CodeRepr] = [Comment("while statement start"), Label(loop_index, 'loop_start')]
-        res += node.condition.accept(self)
+        res: List[Label|CodeRepr|Comment] = [Comment("while statement start"), Label(loop_index, 'loop_start')]
+        res += node.condition.accept(self, context)
         res.append(CodeRepr(ByteCodes.POP_JUMP_IF_FALSE, label=Label(loop_index, 'loop_end')))
-        undecided_cmd: List[CodeRepr] = node.body.accept(self)
+        undecided_cmd: List[CodeRepr] = node.body.accept(self, context)
+        # continue/break 跳转到当前所在的循环，内层循环中的已经在生成内层循环时替换
         for cmd in undecided_cmd:
             match cmd:
                 case CodeRepr(op_name=op_name, label=label) if label and label.global_index == -1:
@@ -386,10 +259,9 @@ class BytecodeGenerateVisitor(Visitor):
             res.append(new_cmd)
         res.append(CodeRepr(ByteCodes.JUMP_BACKWARD, label=Label(loop_index, 'loop_start')))
         res.append(Label(loop_index, 'loop_end'))
-        res.append(CodeRepr(ByteCodes.RETURN_CONST, null_const=True))
         return res
 
-    def visit_continue_or_break(self, node: 'ContinueOrBreak'):
+    def visit_continue_or_break(self, node: 'ContinueOrBreak', context=None):
         if node.kind == "continue":
             return [CodeRepr(ByteCodes.JUMP_BACKWARD, label=Label(-1, 'loop_start'))]
-        return [CodeRepr(ByteCodes.JUMP_FORWARD, label=Label(-1, 'loop_end'))]
\ No newline at end of file
+        return [CodeRepr(ByteCodes.JUMP_FORWARD, label=Label(-1, 'loop_end'))]
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from types import CodeType
+from typing import Any, Dict, Optional, Tuple
+
+from parser.node import FunctionDefNode
+from parser.scope import CacheStats, TraitImpls
+
+
+@dataclass
+class Instance:
+    # 编译后的函数名，包含了绑定的类型参数，例如 id___Int、Add_for_Int___add
+    name: str
+    # 生成的源码，或者字节码后端生成的 code 对象
+    source: str|CodeType
+    # exec 之后在全局变量中定义的函数
+    function: Any
+    # 分析以及生成代码时查找过的 impl 及其版本号，见 TraitImpls.record
+    dependencies: Dict[tuple, Optional[int]]
+
+
+class InstanceCache:
+    """
+    单态化函数的缓存，在 Interpreter 的多次运行之间共享。
+    1. 实例: 以 (函数定义, 编译后的函数名) 为 key，函数已经在之前的运行中定义到同一个全局变量中，
+       并且其依赖的 impl 没有变化时，跳过代码生成以及 exec
+    2. 代码对象: 以生成的源码为 key 保存 compile 的结果，重新初始化全局变量之后只需要重新 exec
+    """
+
+    # 代码对象超过上限时清空
+    MAX_CODE_SIZE = 1 << 12
+
+    def __init__(self):
+        self._globals: Optional[dict] = None
+        self._instances: Dict[Tuple[int, str], Tuple[FunctionDefNode, Instance]] = {}
+        self._code: Dict[str, CodeType] = {}
+        self.stats = CacheStats()
+
+    def _bind(self, symbols: dict):
+        # Interpreter.init 会创建新的全局变量，此前定义的函数都不再存在
+        if symbols is not self._globals:
+            self._globals = symbols
+            self._instances.clear()
+
+    def get(self, function_ast: FunctionDefNode, name: str, symbols: dict, trait_impls: TraitImpls) -> Optional[Instance]:
+        self._bind(symbols)
+        cached = self._instances.get((id(function_ast), name))
+        if (cached is not None and cached[0] is function_ast and symbols.get(name) is cached[1].function
+                and trait_impls.is_current(cached[1].dependencies)):
+            self.stats.hits += 1
+            return cached[1]
+        self.stats.misses += 1
+        return None
+
+    def add(self, function_ast: FunctionDefNode, name: str, source: str|CodeType, symbols: dict, dependencies: Dict[tuple, Optional[int]]):
+        """
+        函数的代码已经 exec 到 symbols 之后再加入缓存，生成代码或者执行失败时不会留下无效的实例
+        """
+        self._bind(symbols)
+        if function_ast is not None and name in symbols:
+            self._instances[(id(function_ast), name)] = (function_ast, Instance(name, source, symbols[name], dependencies))
+
+    def compile(self, source: str) -> CodeType:
+        code = self._code.get(source)
+        if code is None:
+            if len(self._code) >= self.MAX_CODE_SIZE:
+                self._code.clear()
+            code = self._code[source] = compile(source, "<instance>", "exec")
+        return code
+
+    def clear(self):
+        self._globals = None
+        self._instances.clear()
+        self._code.clear()
@@ -1,19 +1,22 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
-from bytecode import ConcreteInstr, ConcreteBytecode
-from bytecode.instr import UNSET
+from bytecode import Bytecode, CompilerFlags, ConcreteBytecode, Instr
+from bytecode import Label as BytecodeLabel
 
 
 class ByteCodes(Enum):
     LOAD_CONST = "LOAD_CONST"
     LOAD_FAST = "LOAD_FAST"
+    LOAD_NAME = "LOAD_NAME"
     CALL = "CALL"
+    KW_NAMES = "KW_NAMES"
     RETURN_VALUE = "RETURN_VALUE"
     BINARY_OP = "BINARY_OP"
     LOAD_GLOBAL = "LOAD_GLOBAL"
     STORE_FAST = "STORE_FAST"
+    STORE_NAME = "STORE_NAME"
     STORE_GLOBAL = "STORE_GLOBAL"
     PUSH_NULL = "PUSH_NULL"
     MAKE_FUNCTION = "MAKE_FUNCTION"
@@ -34,6 +37,12 @@ JUMP_CMDS = {
     ByteCodes.POP_JUMP_IF_FALSE
 }
 
+# 参数是 (flag, name) 的指令，LOAD_GLOBAL 的 flag 表示同时压入 NULL，LOAD_ATTR 的 flag 表示加载方法
+FLAG_NAME_CMDS = {
+    ByteCodes.LOAD_GLOBAL,
+    ByteCodes.LOAD_ATTR,
+}
+
 
 @dataclass(frozen=True)
 class Label:
@@ -46,11 +55,9 @@ class CodeRepr:
     const: Any = None
     name: str = None
     var: str = None
-    op_num: int = None
+    op_num: Any = None
     flag: bool = None
-    need_shift: bool = None
     label: Label = None
-    current_offset: int = None
     null_const: bool = False
 
     def __str__(self):
@@ -81,63 +88,44 @@ class Comment:
         return f"====={self.line}====="
 
 
-@dataclass
 class ConcreteBytecodeConverter:
-    # bytecode_obj: ConcreteBytecode
-    # varnames_index: dict[str, int] = field(default_factory=dict)
-    # names_index: dict[str, int] = field(default_factory=dict)
-    # const_index: dict[str, int] = field(default_factory=dict)
-
-    def __init__(self, bytecodes: List[CodeRepr|Comment]):
-        self.bytecodes: List[CodeRepr|Comment] = bytecodes
-        self.varnames_index = {}
-        self.names_index = {}
-        self.const_index = {}
-        self.code_offset = 0
-        self.code_offset_mapping = {}
-
-    def _add(self, d: dict[str, Any], name):
-        if name not in d:
-            d[name] = len(d)
-        return d[name]
-
-    def add_var(self, name):
-        return self._add(self.varnames_index, name)
-
-    def add_const(self, val):
-        return self._add(self.const_index, val)
-
-    def add_name(self, name):
-        return self._add(self.names_index, name)
-
-    def _convert(self, code_repr: CodeRepr|Label) -> Optional[ConcreteInstr|CodeRepr]:
+    """
+    将 CodeRepr 转换为 CPython 字节码。
+    先转换为 bytecode 库的抽象指令，由其计算跳转的偏移、常量/变量表、栈的大小以及 3.11 之后指令需要的 inline cache
+    :param name: code 对象的名字
+    :param argnames: 不为 None 时生成函数的 code 对象，参数按顺序作为前几个局部变量
+    """
+
+    def __init__(self, bytecodes: List[CodeRepr|Comment|Label], name: str = "<module>", argnames: Optional[Sequence[str]] = None):
+        self.bytecodes: List[CodeRepr|Comment|Label] = bytecodes
+        self.name = name
+        self.argnames = argnames
+        self.labels: Dict[Label, BytecodeLabel] = {}
+
+    def _label(self, label: Label) -> BytecodeLabel:
+        if label not in self.labels:
+            self.labels[label] = BytecodeLabel()
+        return self.labels[label]
+
+    def _convert(self, code_repr: CodeRepr|Label) -> Instr|BytecodeLabel:
         if isinstance(code_repr, Label):
-            self.code_offset_mapping[code_repr] = self.code_offset
-            return None
+            return self._label(code_repr)
         op_name = code_repr.op_name
         if op_name in JUMP_CMDS:
-            code_repr.current_offset = self.code_offset
-            self.code_offset += 2
-            return code_repr # do not process jup cmd here, will handle in next round
+            return Instr(op_name.value, self._label(code_repr.label))
         if code_repr.null_const:
-            op_num = self.add_const(None)
-        elif code_repr.const is not None:
-            op_num = self.add_const(code_repr.const)
-        elif code_repr.name:
-            op_num = self.add_name(code_repr.name)
-        elif code_repr.var:
-            op_num = self.add_var(code_repr.var)
-        elif code_repr.op_num is not None:
-            op_num = code_repr.op_num
-        else:
-            op_num = UNSET
-        if code_repr.need_shift:
-            op_num = op_num << 1
-        if code_repr.flag:
-            op_num = op_num | 1
-        res = ConcreteInstr(op_name.value, op_num)
-        self.code_offset += res.size
-        return res
+            return Instr(op_name.value, None)
+        if code_repr.const is not None:
+            return Instr(op_name.value, code_repr.const)
+        if code_repr.name:
+            if op_name in FLAG_NAME_CMDS:
+                return Instr(op_name.value, (bool(code_repr.flag), code_repr.name))
+            return Instr(op_name.value, code_repr.name)
+        if code_repr.var:
+            return Instr(op_name.value, code_repr.var)
+        if code_repr.op_num is not None:
+            return Instr(op_name.value, code_repr.op_num)
+        return Instr(op_name.value)
 
     def show(self):
         for x in self.bytecodes:
@@ -145,27 +133,14 @@ class ConcreteBytecodeConverter:
         return self
 
     def convert(self) -> ConcreteBytecode:
-        instructions = [self._convert(c) for c in self.bytecodes if not isinstance(c, Comment)]
-        replace_offset_instr = []
-        for instr in instructions:
-            if not instr:
-                continue
-            if isinstance(instr, CodeRepr):
-                label = instr.label
-                op_name = instr.op_name.value
-                if self.code_offset_mapping[label] > instr.current_offset:
-                    offset = (self.code_offset_mapping[label] - (instr.current_offset + 2)) // 2
-                else:
-                    offset = ((instr.current_offset + 2) - self.code_offset_mapping[label]) // 2
-                replace_offset_instr.append(ConcreteInstr(op_name, offset))
-            else:
-                replace_offset_instr.append(instr)
-
-        bytecode = ConcreteBytecode(instructions=replace_offset_instr)
-        bytecode.names = list(self.names_index.keys())
-        bytecode.consts = list(self.const_index.keys())
-        bytecode.varnames = list(self.varnames_index.keys())
-        return bytecode
-
-def repr_to_bytecode(bytecodes: List[CodeRepr|Comment]):
-    return ConcreteBytecodeConverter(bytecodes).show().convert()
\ No newline at end of file
+        bytecode = Bytecode([self._convert(c) for c in self.bytecodes if not isinstance(c, Comment)])
+        bytecode.name = self.name
+        bytecode.filename = "<bytecode>"
+        if self.argnames is not None:
+            bytecode.argnames = list(self.argnames)
+            bytecode.argcount = len(self.argnames)
+            bytecode.flags = CompilerFlags.OPTIMIZED | CompilerFlags.NEWLOCALS
+        return bytecode.to_concrete_bytecode()
+
+def repr_to_bytecode(bytecodes: List[CodeRepr|Comment|Label], name: str = "<module>", argnames: Optional[Sequence[str]] = None) -> ConcreteBytecode:
+    return ConcreteBytecodeConverter(bytecodes, name, argnames).convert()
@@ -10,33 +10,34 @@ TOKENS.create_by_string(">=")
 TOKENS.create_by_string("<=")
 TOKENS.create_by_string("==")
 TOKENS.create_by_string("!=")
-TOKENS.create_by_string("let")
-TOKENS.create_by_string("and")
-TOKENS.create_by_string("or")
-TOKENS.create_by_string("if")
-TOKENS.create_by_string("else")
-TOKENS.create_by_string("elif")
-TOKENS.create_by_string("for")
-TOKENS.create_by_string("while")
-TOKENS.create_by_string("def")
-TOKENS.create_by_string("let")
-TOKENS.create_by_string("type")
-TOKENS.create_by_string("return")
-TOKENS.create_by_string("impl")
-TOKENS.create_by_string("trait")
+# 关键字由 id 匹配后查表重新分类，不会增加自动机的状态
+TOKENS.create_keyword("let")
+TOKENS.create_keyword("and")
+TOKENS.create_keyword("or")
+TOKENS.create_keyword("if")
+TOKENS.create_keyword("else")
+TOKENS.create_keyword("elif")
+TOKENS.create_keyword("for")
+TOKENS.create_keyword("while")
+TOKENS.create_keyword("def")
+TOKENS.create_keyword("let")
+TOKENS.create_keyword("type")
+TOKENS.create_keyword("return")
+TOKENS.create_keyword("impl")
+TOKENS.create_keyword("trait")
 TOKENS.create_by_string("->")
-TOKENS.create_by_string("null")
-TOKENS.create_by_string("self")
-TOKENS.create_by_string("break")
-TOKENS.create_by_string("continue")
-TOKENS.create_by_string("true")
-TOKENS.create_by_string("false")
-TOKENS.create_by_string("struct")
-TOKENS.create_by_string("in")
+TOKENS.create_keyword("null")
+TOKENS.create_keyword("self")
+TOKENS.create_keyword("break")
+TOKENS.create_keyword("continue")
+TOKENS.create_keyword("true")
+TOKENS.create_keyword("false")
+TOKENS.create_keyword("struct")
+TOKENS.create_keyword("in")
 TOKENS.create_by_string("|")
 TOKENS.create_by_string("&")
 TOKENS.create_by_string("^")
-TOKENS.create_by_string("not")
+TOKENS.create_keyword("not")
 TOKENS.create_by_string("!")
 TOKENS.create_by_string(">>")
 TOKENS.create_by_string("<<")
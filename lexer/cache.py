@@ -0,0 +1,64 @@
+import os
+import struct
+import zlib
+from typing import Callable, Dict, Optional
+
+from lexer.table import CompiledTable
+from lexer.tokendef import TokenFactory
+from utils.logger import LOGGER
+
+
+class TableCache:
+    """
+    编译后的状态转移表缓存，以 TokenFactory 的指纹作为 key。
+    1. 进程内: 同一份 token 定义只编译/加载一次，多个 BaseLexer 共享同一个只读的 CompiledTable
+    2. 磁盘: 以二进制形式保存到 __pycache__ 中，后续启动时直接加载，跳过 nfa -> dfa 的子集构造
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+        self._tables: Dict[str, CompiledTable] = {}
+
+    def path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"tokens-{fingerprint[:32]}.v{CompiledTable.VERSION}.dfa")
+
+    def load(self, tokens: TokenFactory, builder: Callable[[], CompiledTable]) -> CompiledTable:
+        fingerprint = tokens.fingerprint()
+        table = self._tables.get(fingerprint)
+        if table is not None:
+            return table
+        table = self._read(fingerprint, tokens)
+        if table is None:
+            table = builder()
+            self._write(fingerprint, table)
+        self._tables[fingerprint] = table
+        return table
+
+    def clear(self):
+        self._tables.clear()
+
+    def _read(self, fingerprint: str, tokens: TokenFactory) -> Optional[CompiledTable]:
+        try:
+            with open(self.path(fingerprint), "rb") as f:
+                return CompiledTable.from_bytes(f.read(), tokens)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, struct.error, zlib.error) as e:
+            # 缓存文件损坏或格式不兼容时重新编译
+            LOGGER.warning("ignore invalid lexer table cache %s: %s", self.path(fingerprint), e)
+            return None
+
+    def _write(self, fingerprint: str, table: CompiledTable):
+        path = self.path(fingerprint)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(table.to_bytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # 缓存目录不可写时只是无法加速下次启动，不影响词法分析
+            LOGGER.info("can not write lexer table cache %s: %s", path, e)
+
+
+TABLE_CACHE = TableCache()
@@ -0,0 +1,173 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Iterator, List, Tuple
+
+# 每块保存的元素(字符)数量，编辑时只重新复制编辑位置所在的块，其余的块只复制引用
+CHUNK_SIZE = 1024
+TEXT_CHUNK_SIZE = 4096
+
+
+def _split_chunks(values, size: int) -> list:
+    return [values[i: i + size] for i in range(0, len(values), size)]
+
+
+class ChunkedArray:
+    """
+    分块保存的有序整数序列，每块是一个 array 以及该块所有元素共同的偏移量 delta，元素的值为 array 中的值加上 delta。
+    splice 只重建编辑位置所在的块: 之前的块直接共享，之后的块共享 array 只修改 delta。
+    块的列表、delta 以及用于查找的 _bounds/_lasts 每次编辑都会整体重建，因此代价是 O(块的数量 + CHUNK_SIZE + 编辑的大小)，
+    即 O(元素数量 / CHUNK_SIZE)，只是把逐个元素的复制换成了逐块的复制，仍然与序列的长度成正比。
+    块中的 array 创建之后不再修改，因此可以在编辑前后的多个序列之间共享。
+    """
+
+    def __init__(self, typecode: str, chunks: List[array], deltas: List[int]):
+        self.typecode = typecode
+        self._chunks = chunks
+        self._deltas = deltas
+        # 每块结束处(不包括)的下标以及每块最后一个元素的值，用于按下标和按值二分查找
+        self._bounds = list(accumulate(len(chunk) for chunk in chunks))
+        self._lasts = [chunk[-1] + delta for chunk, delta in zip(chunks, deltas)]
+
+    @staticmethod
+    def from_array(values: array) -> 'ChunkedArray':
+        chunks = _split_chunks(values, CHUNK_SIZE)
+        return ChunkedArray(values.typecode, chunks, [0] * len(chunks))
+
+    def __len__(self):
+        return self._bounds[-1] if self._bounds else 0
+
+    def _split(self, index: int) -> Tuple[int, int]:
+        # 下标 index 所在的块以及在块中的下标，index 等于长度时返回 (块的数量, 0)
+        if index >= len(self):
+            return len(self._chunks), 0
+        chunk = bisect_right(self._bounds, index)
+        return chunk, index - (self._bounds[chunk - 1] if chunk else 0)
+
+    def _start(self, chunk: int) -> int:
+        return self._bounds[chunk - 1] if chunk else 0
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunked array index out of range")
+        chunk, local = self._split(index)
+        return self._chunks[chunk][local] + self._deltas[chunk]
+
+    def __iter__(self) -> Iterator[int]:
+        for chunk, delta in zip(self._chunks, self._deltas):
+            if delta:
+                yield from (value + delta for value in chunk)
+            else:
+                yield from chunk
+
+    def __eq__(self, other):
+        if not isinstance(other, ChunkedArray):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f"ChunkedArray({self.typecode!r}, {list(self)})"
+
+    def bisect_left(self, value: int, lo: int = 0) -> int:
+        chunk = bisect_left(self._lasts, value)
+        if chunk == len(self._chunks):
+            return max(lo, len(self))
+        index = self._start(chunk) + bisect_left(self._chunks[chunk], value - self._deltas[chunk])
+        return max(lo, index)
+
+    def bisect_right(self, value: int, lo: int = 0) -> int:
+        chunk = bisect_right(self._lasts, value)
+        if chunk == len(self._chunks):
+            return max(lo, len(self))
+        index = self._start(chunk) + bisect_right(self._chunks[chunk], value - self._deltas[chunk])
+        return max(lo, index)
+
+    def splice(self, start: int, stop: int, values: array, delta: int) -> 'ChunkedArray':
+        """
+        返回新的序列: [0, start) 的元素不变，[start, stop) 替换为 values，stop 之后的元素都加上 delta
+        """
+        first, first_local = self._split(start)
+        last, last_local = self._split(stop)
+        chunks = self._chunks[:first]
+        deltas = self._deltas[:first]
+        # 编辑位置所在的块与新的元素合并为新的块
+        middle = array(self.typecode)
+        if first_local:
+            middle.extend(self._shift(self._chunks[first][:first_local], self._deltas[first]))
+        middle.extend(values)
+        if last < len(self._chunks):
+            middle.extend(self._shift(self._chunks[last][last_local:], self._deltas[last] + delta))
+        for chunk in _split_chunks(middle, CHUNK_SIZE):
+            chunks.append(chunk)
+            deltas.append(0)
+        chunks.extend(self._chunks[last + 1:])
+        deltas.extend(d + delta for d in self._deltas[last + 1:])
+        return ChunkedArray(self.typecode, chunks, deltas)
+
+    @staticmethod
+    def _shift(values: array, delta: int) -> array:
+        if delta == 0:
+            return values
+        return array(values.typecode, [value + delta for value in values])
+
+
+class Rope:
+    """
+    分块保存的不可变字符串，splice 时只重新拼接编辑位置所在的块，其余的块在编辑前后的 Rope 之间共享。
+    块的列表和 _bounds 每次编辑都会整体重建，代价是 O(块的数量 + TEXT_CHUNK_SIZE + 编辑的大小)
+    """
+
+    def __init__(self, chunks: List[str]):
+        self._chunks = chunks
+        self._bounds = list(accumulate(len(chunk) for chunk in chunks))
+
+    @staticmethod
+    def from_string(string: str) -> 'Rope':
+        return Rope(_split_chunks(string, TEXT_CHUNK_SIZE))
+
+    def __len__(self):
+        return self._bounds[-1] if self._bounds else 0
+
+    def __str__(self):
+        return "".join(self._chunks)
+
+    def _split(self, offset: int) -> Tuple[int, int]:
+        if offset >= len(self):
+            return len(self._chunks), 0
+        chunk = bisect_right(self._bounds, offset)
+        return chunk, offset - (self._bounds[chunk - 1] if chunk else 0)
+
+    def chunk(self, offset: int) -> Tuple[str, int]:
+        # 包含 offset 处字符的块以及块的起始偏移量
+        chunk, local = self._split(offset)
+        return self._chunks[chunk], offset - local
+
+    def slice(self, start: int, end: int) -> str:
+        if start >= end:
+            return ""
+        first, first_local = self._split(start)
+        last, last_local = self._split(end)
+        if first == len(self._chunks):
+            return ""
+        if first == last:
+            return self._chunks[first][first_local: last_local]
+        parts = [self._chunks[first][first_local:]]
+        parts.extend(self._chunks[first + 1: last])
+        if last < len(self._chunks):
+            parts.append(self._chunks[last][:last_local])
+        return "".join(parts)
+
+    def splice(self, offset: int, removed: int, inserted: str) -> 'Rope':
+        first, first_local = self._split(offset)
+        last, last_local = self._split(offset + removed)
+        middle = inserted
+        if first < len(self._chunks):
+            middle = self._chunks[first][:first_local] + middle
+        if last < len(self._chunks):
+            middle = middle + self._chunks[last][last_local:]
+        chunks = self._chunks[:first]
+        chunks.extend(_split_chunks(middle, TEXT_CHUNK_SIZE))
+        chunks.extend(self._chunks[last + 1:])
+        return Rope(chunks)
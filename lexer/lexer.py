@@ -1,12 +1,17 @@
-from lexer.tokendef import TokenDef, Token, EOF as EOF_TOKEN, TokenFactory
+from lexer.tokendef import TokenDef, Token, EOF as EOF_TOKEN, EOF_KIND, TokenFactory
 from lexer.state import DFAState
-from lexer.utils import nfa_to_dfa
-from typing import List, Dict, Optional, Union, Set
+from lexer.utils import nfa_to_dfa, minimize_dfa
+from typing import List, Dict, Optional, Union, Set, Iterator
 from lexer.re_expression import OrExpression
-from lexer.range import CharRange
 from collections import defaultdict
-from lexer.range import RangeSearch
+from lexer.table import CompiledTable
+from lexer.cache import TABLE_CACHE
+from lexer.chunks import ChunkedArray, Rope
 from abc import ABC, abstractproperty, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+import mmap
+import os
 from error.exception import SyntaxError
 from error.reporter import SourceCodeMaker
 
@@ -18,16 +23,26 @@ class CharStream:
 
     def pop(self) -> int: pass
 
+    # 当前读取位置的偏移量，token 的文本通过起止偏移量从源码中截取
+    def offset(self) -> int: pass
+
+    def slice(self, start: int, end: int) -> str: pass
+
+    # [start, end) 之间的字符数量
+    def count(self, start: int, end: int) -> int:
+        return len(self.slice(start, end))
+
 
 class SimpleCharSteam(CharStream):
 
     def __init__(self, string: str):
-        self.string = list(string)
+        self.string = string
         self.current_index = 0
-        self.rows = string.split("\n")
+        self._length = len(string)
+        self._line_starts: Optional[List[int]] = None
 
     def peek(self):
-        if self.current_index == len(self.string):
+        if self.current_index == self._length:
             return CharStream.EOF
         return ord(self.string[self.current_index])
 
@@ -38,8 +53,193 @@ class SimpleCharSteam(CharStream):
         self.current_index += 1
         return res
 
+    def offset(self) -> int:
+        return self.current_index
+
+    def slice(self, start: int, end: int) -> str:
+        return self.string[start: end]
+
+    def count(self, start: int, end: int) -> int:
+        return end - start
+
+    # 行信息只在需要时才计算
+    def peek_line(self, row):
+        if self._line_starts is None:
+            self._line_starts = line_starts(self.string, "\n")
+        start = self._line_starts[row]
+        end = self._line_starts[row + 1] - 1 if row + 1 < len(self._line_starts) else self._length
+        return self.string[start: end]
+
+
+class RopeCharStream(CharStream):
+    """
+    从 Rope 中读取字符，缓存当前所在的块，增量词法分析时不需要拼接完整的源码
+    """
+
+    def __init__(self, rope: Rope):
+        self.rope = rope
+        self.current_index = 0
+        self._length = len(rope)
+        self._chunk = ""
+        self._chunk_start = 0
+
+    def peek(self):
+        i = self.current_index - self._chunk_start
+        if 0 <= i < len(self._chunk):
+            return ord(self._chunk[i])
+        if self.current_index >= self._length:
+            return CharStream.EOF
+        self._chunk, self._chunk_start = self.rope.chunk(self.current_index)
+        return ord(self._chunk[self.current_index - self._chunk_start])
+
+    def pop(self):
+        res = self.peek()
+        if res == CharStream.EOF:
+            return CharStream.EOF
+        self.current_index += 1
+        return res
+
+    def offset(self) -> int:
+        return self.current_index
+
+    def slice(self, start: int, end: int) -> str:
+        return self.rope.slice(start, end)
+
+    def count(self, start: int, end: int) -> int:
+        return end - start
+
+
+class Utf8CharStream(CharStream):
+    """
+    直接按字节偏移读取 utf-8 编码的 bytes/memoryview/mmap，不需要先将整个文件解码为 str
+    """
+
+    def __init__(self, buffer: Union[bytes, memoryview, mmap.mmap]):
+        self.buffer = buffer
+        self.current_index = 0
+        self._length = len(buffer)
+        self._width = 0
+        self._line_starts: Optional[List[int]] = None
+
+    @staticmethod
+    def open(path: str) -> 'Utf8CharStream':
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return Utf8CharStream(b"")
+            return Utf8CharStream(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def peek(self):
+        i = self.current_index
+        if i >= self._length:
+            return CharStream.EOF
+        buffer = self.buffer
+        b = buffer[i]
+        if b < 0x80:
+            self._width = 1
+            return b
+        if b < 0xE0:
+            self._width = 2
+            return ((b & 0x1F) << 6) | (buffer[i + 1] & 0x3F)
+        if b < 0xF0:
+            self._width = 3
+            return ((b & 0x0F) << 12) | ((buffer[i + 1] & 0x3F) << 6) | (buffer[i + 2] & 0x3F)
+        self._width = 4
+        return ((b & 0x07) << 18) | ((buffer[i + 1] & 0x3F) << 12) | ((buffer[i + 2] & 0x3F) << 6) | (buffer[i + 3] & 0x3F)
+
+    def pop(self):
+        res = self.peek()
+        if res == CharStream.EOF:
+            return CharStream.EOF
+        self.current_index += self._width
+        return res
+
+    def offset(self) -> int:
+        return self.current_index
+
+    def slice(self, start: int, end: int) -> str:
+        return str(self.buffer[start: end], "utf-8")
+
     def peek_line(self, row):
-        return self.rows[row]
+        if self._line_starts is None:
+            self._line_starts = line_starts(self.buffer, b"\n")
+        start = self._line_starts[row]
+        end = self._line_starts[row + 1] - 1 if row + 1 < len(self._line_starts) else self._length
+        return self.slice(start, end)
+
+
+def line_starts(source: Union[str, bytes, memoryview, mmap.mmap], newline) -> List[int]:
+    if isinstance(source, memoryview):
+        source = source.obj if isinstance(source.obj, (bytes, mmap.mmap)) else source.tobytes()
+    res = [0]
+    index = source.find(newline)
+    while index != -1:
+        res.append(index + 1)
+        index = source.find(newline, index + 1)
+    return res
+
+
+class SourcePositions:
+    """
+    记录词法分析过程中每个换行 token 结束的偏移量，token 的 (row, col) 在需要时才通过二分查找计算。
+    只有文本恰好为 '\n' 的 token 才会换行，与逐字符计算行列号的结果一致。
+    """
+
+    def __init__(self, chars: CharStream):
+        self.chars = chars
+        self._start = chars.offset()
+        self.lines = array('q')
+
+    def add_line(self, offset: int):
+        self.lines.append(offset)
+
+    def slice(self, start: int, end: int) -> str:
+        return self.chars.slice(start, end)
+
+    def position(self, offset: int, is_end: bool) -> (int, int):
+        row = bisect_right(self.lines, offset)
+        line_start = self.lines[row - 1] if row else self._start
+        col = self.chars.count(line_start, offset)
+        # 起始位置指向 token 的第一个字符，结束位置指向最后一个字符
+        return row + 1, col if is_end else col + 1
+
+
+class TokenStore:
+    """
+    以 struct of arrays 的形式保存 token: kinds/starts/ends 三个数组，最后一个元素为 EOF。
+    通过下标访问时才创建 Token 对象，文本和位置也由 Token 延迟计算。
+    IncrementalLexer 生成的 store 中三个数组为 ChunkedArray，以便编辑之后共享未修改的部分。
+    """
+
+    def __init__(self, tokens: TokenFactory, positions: SourcePositions):
+        self.kinds = array('i')
+        self.starts = array('q')
+        self.ends = array('q')
+        self._names = tokens.names()
+        self._keywords = tokens.keywords()
+        self.positions = positions
+        # parser 会多次 peek 同一个 token，缓存最近一次创建的 Token
+        self._last_index = None
+        self._last_token = None
+
+    def append(self, kind: int, start: int, end: int):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> Token:
+        if index == self._last_index:
+            return self._last_token
+        kind = self.kinds[index]
+        if kind == EOF_KIND:
+            token = EOF_TOKEN
+        else:
+            token = Token(self._names[kind], kind=kind, start=self.starts[index], end=self.ends[index], source=self.positions)
+        self._last_index = index
+        self._last_token = token
+        return token
 
 
 class IndexAssigner:
@@ -63,28 +263,31 @@ class StateTable:
     INIT_STATE = 1
     STOP_STATE = 0
 
-    def __init__(self, dfa_init_state: DFAState):
+    def __init__(self, dfa_init_state: Optional[DFAState], table: Optional[CompiledTable] = None):
         self._dfa_init_state = dfa_init_state
-        self._trans_table, self._accept_table = StateTable.get_trans_table(dfa_init_state)
-        self._trans_searches: Dict[int, RangeSearch] = {state: RangeSearch(list(trans.keys())) for state, trans in self._trans_table.items()}
+        if table is None:
+            self._trans_table, self._accept_table = StateTable.get_trans_table(dfa_init_state)
+            # 编译为数组形式的转移表，避免每个字符都创建 CharRange 并进行二分查找
+            table = CompiledTable.compile(self._trans_table, self._accept_table)
+        self._table = table
+        self._dense = self._table.dense
+        self._accepts = self._table.accepts
         self._current_state_index: int = StateTable.INIT_STATE
         self._stop = False
 
     def trans(self, input_char: int) -> Optional[int]:
-        state_index = self._current_state_index
-        if state_index not in self._trans_searches:
-            self._stop = True
-            return None
-        # 使用二分查找判断该输入会转移到哪个状态
-        r = self._trans_searches.get(state_index).search_cover(CharRange.index(input_char))
-        if not r:
+        if 0 <= input_char < CompiledTable.DENSE_SIZE:
+            next_state = self._dense[(self._current_state_index << CompiledTable.DENSE_SHIFT) | input_char]
+        else:
+            next_state = self._table.next_state(self._current_state_index, input_char)
+        if next_state == StateTable.STOP_STATE:
             self._stop = True
             return None
-        self._current_state_index = self._trans_table[state_index][r]
-        return self._current_state_index
+        self._current_state_index = next_state
+        return next_state
 
     def get_accept(self) -> TokenDef:
-        return self._accept_table.get(self._current_state_index)
+        return self._accepts[self._current_state_index]
 
     @classmethod
     def get_trans_table(cls, init_state: DFAState):
@@ -107,6 +310,10 @@ class StateTable:
                     pending_states.append(next_state)
         return transaction_table, accept_table
 
+    @classmethod
+    def from_table(cls, table: CompiledTable) -> 'StateTable':
+        return cls(None, table)
+
     def init(self):
         self._current_state_index = self.INIT_STATE
         self._stop = False
@@ -122,8 +329,19 @@ class Lexer(ABC):
     @abstractmethod
     def peek(self) -> Token: pass
 
+    def peek_kind(self) -> int:
+        return self.peek().kind
+
+    # expect/try_peek 的参数可以是 token 名称或者 TokenFactory 分配的整数 id
+    def _kinds(self, args) -> Set[Union[int, str]]:
+        return set(args)
+
+    def _match(self, token: Token, args) -> bool:
+        kinds = self._kinds(args)
+        return token.kind in kinds or token.token_type in kinds
+
     def expect(self, *args, pop=False):
-        if self.peek().token_type in args:
+        if self._match(self.peek(), args):
             res = self.peek()
             if pop:
                 self.pop()
@@ -135,7 +353,7 @@ class Lexer(ABC):
         return self.expect(*args, pop=True)
 
     def try_peek(self, token_type):
-        if self.peek().token_type == token_type:
+        if self._match(self.peek(), (token_type,)):
             return self.peek()
         return None
 
@@ -148,9 +366,10 @@ class MockLexer(Lexer):
     def __init__(self, tokens):
         self._token_index = 0
         self._tokens = tokens
+        self._length = len(tokens)
 
     def peek(self) -> Token:
-        if self._token_index == len(self._tokens):
+        if self._token_index == self._length:
             raise IndexError("already read all tokens")
         return self._tokens[self._token_index]
 
@@ -165,27 +384,86 @@ class MockLexer(Lexer):
 
 
 
+class RingBufferLexer(Lexer):
+    """
+    流式的 token 读取，token 在 peek 时才从迭代器中按需生成，只保留最近 size 个 token 用于 unpop，
+    内存占用与源码长度无关。parser 中最多会连续 unpop 3 次(见 parse_expr_unit)。
+    """
+
+    DEFAULT_SIZE = 16
+
+    def __init__(self, tokens: Iterator[Token], size: int = DEFAULT_SIZE):
+        if size < 2:
+            raise ValueError("ring buffer size should be at least 2")
+        self._tokens = tokens
+        self._size = size
+        self._buffer: List[Optional[Token]] = [None] * size
+        # 下一个读取的 token 的绝对位置，以及已经生成的 token 数量
+        self._token_index = 0
+        self._token_count = 0
+
+    def _fill(self):
+        try:
+            token = next(self._tokens)
+        except StopIteration:
+            raise IndexError("already read all tokens")
+        self._buffer[self._token_count % self._size] = token
+        self._token_count += 1
+
+    def peek(self) -> Token:
+        if self._token_index == self._token_count:
+            self._fill()
+        return self._buffer[self._token_index % self._size]
+
+    def pop(self) -> Token:
+        res = self.peek()
+        self._token_index += 1
+        return res
+
+    def unpop(self) -> Token:
+        # 最早的 token 已经被覆盖时无法回退
+        if self._token_index <= self._token_count - self._size or self._token_index == 0:
+            raise IndexError(f"can not unpop more than {self._size - 1} tokens")
+        self._token_index -= 1
+        return self._buffer[self._token_index % self._size]
+
+
 class BaseLexer(Lexer):
 
-    def __init__(self, tokens: TokenFactory, line_marker: SourceCodeMaker, chars: Union[CharStream, str], ignore: Set[str]=None):
+    def __init__(self, tokens: TokenFactory, line_marker: SourceCodeMaker, chars: Union[CharStream, str, bytes, memoryview, mmap.mmap], ignore: Set[str]=None,
+                 streaming: bool = False, buffer_size: int = RingBufferLexer.DEFAULT_SIZE):
         super().__init__()
         self._token_def = tokens
-        self._current_token_detail: Optional[Token] = None
         self._current_token: Optional[TokenDef] = None
-        self._exp = self._create_exp(tokens.tokens())
-        self._dfa = nfa_to_dfa(self._exp.to_nfa())
-        self._state_table = StateTable(self._dfa)
-        self._current_text = ""
-        self._chars = SimpleCharSteam(chars) if type(chars) is str else chars
-        self._col = 1
-        self._start_col = 1
+        # 同一份 token 定义编译出的转移表会缓存在进程内以及磁盘上
+        self._state_table = StateTable.from_table(TABLE_CACHE.load(tokens, lambda: self._compile_table(tokens)))
+        self._chars = BaseLexer._char_stream(chars)
+        # 当前 token 在源码中的起始偏移量，token 文本在需要时才从源码中截取
+        self._start_offset = self._chars.offset()
+        self._positions = SourcePositions(self._chars)
         self._ignore = ignore
-        self.row = 1
-        self._start_row = 1
-        self._mock_lexer = MockLexer(self._parse_all())
+        self._ignore_kinds = {kind for kind in map(tokens.kind, ignore or ()) if kind is not None}
+        self._kind_sets: Dict[tuple, frozenset] = {}
+        self._names = tokens.names()
+        self._keywords = tokens.keywords()
+        # 流式模式下边解析边进行词法分析，否则一次性解析出所有 token
+        self._mock_lexer = RingBufferLexer(self._iter_tokens(), buffer_size) if streaming else MockLexer(self._parse_all())
         self._line_marker = line_marker
 
 
+    @staticmethod
+    def _char_stream(chars: Union[CharStream, str, bytes, memoryview, mmap.mmap]) -> CharStream:
+        if type(chars) is str:
+            return SimpleCharSteam(chars)
+        if isinstance(chars, (bytes, memoryview, mmap.mmap)):
+            return Utf8CharStream(chars)
+        return chars
+
+    def _compile_table(self, tokens: TokenFactory) -> CompiledTable:
+        exp = self._create_exp(tokens.tokens())
+        dfa = minimize_dfa(nfa_to_dfa(exp.to_nfa()))
+        return CompiledTable.compile(*StateTable.get_trans_table(dfa))
+
     def _create_exp(self, tokens):
         expressions = []
         for token in tokens:
@@ -204,52 +482,84 @@ class BaseLexer(Lexer):
 
     def init(self):
         self._current_token = None
-        self._current_text = ""
+        self._start_offset = self._chars.offset()
         self._state_table.init()
-        self._start_col = self._col
-        self._start_row = self.row
-
-    def _parse_all(self) -> List[Token]:
-        res = []
-        while (token := self._parse_token()) != Lexer.EOF:
-            if token.token_type not in self._ignore:
-                res.append(token)
-        res.append(Lexer.EOF)
-        return res
 
-    def _parse_token(self) -> Token:
+    def _reset(self, chars: CharStream, offset: int = 0):
+        # 切换到新的源码并从 offset 处(必须是 token 的边界)开始词法分析
+        self._chars = chars
+        self._positions = SourcePositions(chars)
+        chars.current_index = offset
+        self.init()
+
+    def _scan(self) -> Iterator[tuple]:
+        # 依次生成 (kind, start, end)，被忽略的 token 不会生成，最后生成 EOF
+        ignore = self._ignore_kinds
+        while (kind := self._parse_token()) != EOF_KIND:
+            if kind not in ignore:
+                yield kind, self._start_offset, self._chars.offset()
+            self.init()
+        offset = self._chars.offset()
+        yield EOF_KIND, offset, offset
+
+    def _iter_tokens(self) -> Iterator[Token]:
+        names = self._names
+        for kind, start, end in self._scan():
+            if kind == EOF_KIND:
+                yield Lexer.EOF
+            else:
+                yield Token(names[kind], kind=kind, start=start, end=end, source=self._positions)
+
+    def _parse_all(self) -> TokenStore:
+        store = TokenStore(self._token_def, self._positions)
+        for kind, start, end in self._scan():
+            store.append(kind, start, end)
+        return store
+
+    def _parse_token(self) -> int:
         state = StateTable.INIT_STATE
+        state_table = self._state_table
+        chars = self._chars
         while True:
-            accept_token = self._state_table.get_accept()
+            accept_token = state_table.get_accept()
             if accept_token:
                 self._current_token = accept_token
-            c = self._chars.peek()
-            next_state = self._state_table.trans(c)
+            c = chars.peek()
+            next_state = state_table.trans(c)
             if not next_state:
                 if self._current_token:
-                    if self._current_text == '\n':
-                        self.row += 1
-                        self._col = 1
-                    self._current_token_detail = Token(self._current_token.name,
-                                                       text=self._current_text,
-                                                       start_pos=(self._start_row, self._start_col),
-                                                       end_pos=(self.row, self._col - 1)
-                                                       )
-                    res = self._current_token_detail
-                    self.init()
-                    return res
+                    end = chars.offset()
+                    # 只有文本恰好为 '\n' 的 token 才换行
+                    if end - self._start_offset == 1 and chars.slice(self._start_offset, end) == '\n':
+                        self._positions.add_line(end)
+                    kind = self._current_token.index
+                    keywords = self._keywords.get(kind)
+                    if keywords is not None:
+                        kind = keywords.get(chars.slice(self._start_offset, end), kind)
+                    return kind
                 if c == CharStream.EOF:
-                    return EOF_TOKEN
+                    return EOF_KIND
                 if state == StateTable.INIT_STATE:
                     raise Exception(f"unknown input {chr(c)}")
                 self.init()
             else:
-                self._current_text += chr(c)
-                self._chars.pop()
-                self._col += 1
+                chars.pop()
+
+    def peek_kind(self) -> int:
+        return self._mock_lexer.peek_kind()
+
+    def _kinds(self, args) -> frozenset:
+        kinds = self._kind_sets.get(args)
+        if kinds is None:
+            kinds = frozenset(arg if isinstance(arg, int) else self._token_def.kind(arg) for arg in args)
+            self._kind_sets[args] = kinds
+        return kinds
+
+    def _match(self, token: Token, args) -> bool:
+        return token.kind in self._kinds(args)
 
     def expect(self, *args, pop=False):
-        if self.peek().token_type in args:
+        if self._match(self.peek(), args):
             res = self.peek()
             if pop:
                 self.pop()
@@ -259,8 +569,87 @@ class BaseLexer(Lexer):
             if token == Lexer.EOF:
                 previous_token = self.unpop()
                 raise SyntaxError(f"unexpected EOF after\n" + self._line_marker.mark(previous_token.start_pos, previous_token.end_pos))
-            expect_token = " ".join([f"'{x}'" for x in args])
+            expect_token = " ".join([f"'{x if isinstance(x, str) else self._names[x]}'" for x in args])
             raise SyntaxError(f"expect token in {expect_token}, but got '{self.peek().token_type}'\n" + self._line_marker.mark(token.start_pos, token.end_pos))
 
     def expect_pop(self, *args):
-        return self.expect(*args, pop=True)
\ No newline at end of file
+        return self.expect(*args, pop=True)
+
+
+class IncrementalLexer:
+    """
+    编辑源码后只重新分析受影响的区域: 从编辑位置之前最后一个不受影响的 token 结束处开始分析，
+    当新的 token 边界越过编辑区域并且与旧 token 的起始位置(平移后)重合时，后面的 token 与旧的相同。
+    由于 token 的范围还取决于其后的一个字符(状态机在该字符上停止)，结束位置等于编辑位置的 token 也需要重新分析。
+    源码保存为 Rope，token 的偏移量和换行位置保存为 ChunkedArray，编辑之后未修改的块直接共享，
+    编辑位置之后的偏移量只修改每块的 delta，不需要逐个复制 token；但每次编辑仍需重建块的列表，
+    代价与块的数量(token 数量 / CHUNK_SIZE)成正比。
+    """
+
+    def __init__(self, tokens: TokenFactory, ignore: Set[str] = None):
+        self._token_def = tokens
+        self._lexer = BaseLexer(tokens, SourceCodeMaker(""), "", ignore=ignore, streaming=True)
+        # 最近一次 relex 重新分析的 token 数量(包括被忽略的 token)
+        self.scanned = 0
+
+    def lex(self, source: str) -> TokenStore:
+        self._lexer._reset(SimpleCharSteam(source))
+        store = self._lexer._parse_all()
+        # 完整分析时直接读取字符串，分析完成后再转换为分块的表示
+        positions = store.positions
+        positions.chars = RopeCharStream(Rope.from_string(source))
+        positions.lines = ChunkedArray.from_array(positions.lines)
+        store.kinds = ChunkedArray.from_array(store.kinds)
+        store.starts = ChunkedArray.from_array(store.starts)
+        store.ends = ChunkedArray.from_array(store.ends)
+        return store
+
+    def relex(self, old: TokenStore, offset: int, removed: int, inserted: str) -> TokenStore:
+        rope = old.positions.chars.rope
+        if offset < 0 or removed < 0 or offset + removed > len(rope):
+            raise ValueError(f"invalid edit at {offset} removing {removed} chars")
+        new_rope = rope.splice(offset, removed, inserted)
+        delta = len(inserted) - removed
+        edit_end = offset + len(inserted)
+
+        # 结束位置在编辑位置之前的 token 不受影响
+        keep = old.ends.bisect_left(offset)
+        restart = old.ends[keep - 1] if keep else 0
+        lexer = self._lexer
+        chars = RopeCharStream(new_rope)
+        lexer._reset(chars, restart)
+        kinds, starts, ends = array('i'), array('q'), array('q')
+
+        ignore = lexer._ignore_kinds
+        resync = None
+        self.scanned = 0
+        while (kind := lexer._parse_token()) != EOF_KIND:
+            start, end = lexer._start_offset, chars.offset()
+            self.scanned += 1
+            if kind not in ignore:
+                kinds.append(kind)
+                starts.append(start)
+                ends.append(end)
+            lexer.init()
+            if end >= edit_end:
+                index = old.starts.bisect_left(end - delta, keep)
+                if index < len(old) and old.starts[index] == end - delta:
+                    resync = index
+                    break
+        if resync is None:
+            kinds.append(EOF_KIND)
+            starts.append(len(new_rope))
+            ends.append(len(new_rope))
+            resync = len(old)
+            resync_offset = len(rope)
+        else:
+            resync_offset = old.starts[resync]
+
+        store = TokenStore(self._token_def, lexer._positions)
+        store.kinds = old.kinds.splice(keep, resync, kinds, 0)
+        store.starts = old.starts.splice(keep, resync, starts, delta)
+        store.ends = old.ends.splice(keep, resync, ends, delta)
+        old_lines = old.positions.lines
+        store.positions.lines = old_lines.splice(old_lines.bisect_right(restart), old_lines.bisect_right(resync_offset),
+                                                 lexer._positions.lines, delta)
+        return store
@@ -18,6 +18,10 @@ class Expression:
     @abstractmethod
     def exp_to_nfa(self) -> NFA: pass
 
+    # 表达式的结构描述，用于计算 token 定义的指纹
+    @abstractmethod
+    def key(self) -> tuple: pass
+
     @staticmethod
     def char(ch: str) -> 'Expression':
         return CharExpression(ch)
@@ -82,6 +86,9 @@ class RangeExpression(Expression):
         entry = Edge(CharRange(self._start, self._end), end_state)
         return NFA(entry, end_state)
 
+    def key(self) -> tuple:
+        return "range", self._start, self._end
+
 
 class CharExpression(RangeExpression):
 
@@ -99,6 +106,9 @@ class EmptyExpression(Expression):
         entry = Edge.empty(end_state)
         return NFA(entry, end_state)
 
+    def key(self) -> tuple:
+        return "empty",
+
 
 class OrExpression(Expression):
 
@@ -116,6 +126,9 @@ class OrExpression(Expression):
             entry_state.add_edge(nfa.entry_edge)
         return NFA(entry, end_state)
 
+    def key(self) -> tuple:
+        return "or", *(exp.key() for exp in self.expressions)
+
 
 class ConcatExpression(Expression):
     def __init__(self, expressions: List[Expression]):
@@ -132,6 +145,9 @@ class ConcatExpression(Expression):
             state = nfa.end_state
         return NFA(entry, state)
 
+    def key(self) -> tuple:
+        return "concat", *(exp.key() for exp in self.expressions)
+
 
 class StarExpression(Expression):
 
@@ -152,3 +168,6 @@ class StarExpression(Expression):
         entry = Edge.empty(end_state)
         return NFA(entry, end_state)
 
+    def key(self) -> tuple:
+        return "star", self.expression.key()
+
@@ -0,0 +1,117 @@
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+from lexer.range import CharRange
+
+
+class CompiledTable:
+    """
+    由 StateTable.get_trans_table 的结果编译出的紧凑转移表，状态 0 为停止状态。
+    1. ASCII/Latin-1 (0 ~ DENSE_SIZE - 1) 使用稠密表，每个状态一行，查找为一次下标访问
+    2. 其余 unicode 字符先按所有转移区间的端点切分为若干字符类，每个状态再按字符类存储一行
+    """
+
+    DENSE_SIZE = 256
+    DENSE_SHIFT = 8
+    STOP_STATE = 0
+
+    # 序列化格式: 头部 + zlib 压缩的 dense/class_starts/sparse/accepts 四个数组，统一使用小端序
+    MAGIC = b"SCDFA"
+    # 转移表的生成方式变化时(例如增加了 dfa 最小化)也需要升级版本，使旧的缓存失效
+    VERSION = 2
+    HEADER = struct.Struct("<5sHIIII")
+
+    def __init__(self, state_count: int, dense: array, class_starts: array, sparse: array, accepts: List):
+        self.state_count = state_count
+        self.dense = dense
+        self.class_starts = class_starts
+        self.sparse = sparse
+        self.accepts = accepts
+        self._class_count = len(class_starts)
+
+    @classmethod
+    def compile(cls, trans_table: Dict[int, Dict[CharRange, int]], accept_table: Dict[int, 'TokenDef']) -> 'CompiledTable':
+        state_count = max([0, *trans_table.keys(), *accept_table.keys(),
+                           *(s for trans in trans_table.values() for s in trans.values())]) + 1
+        dense_max = cls.DENSE_SIZE - 1
+
+        # 计算 Latin-1 以外的字符类，每个字符类的起始位置为某个区间的开始或者某个区间结束位置 + 1
+        points = {cls.DENSE_SIZE}
+        for trans in trans_table.values():
+            for r in trans:
+                if r.end <= dense_max:
+                    continue
+                points.add(max(r.start, cls.DENSE_SIZE))
+                if r.end < sys.maxunicode:
+                    points.add(r.end + 1)
+        class_starts = array('i', sorted(points))
+        class_count = len(class_starts)
+
+        dense = array('i', bytes(4 * state_count * cls.DENSE_SIZE))
+        sparse = array('i', bytes(4 * state_count * class_count))
+        for state, trans in trans_table.items():
+            dense_offset = state << cls.DENSE_SHIFT
+            sparse_offset = state * class_count
+            for r, next_state in trans.items():
+                if r.start <= dense_max:
+                    for c in range(r.start, min(r.end, dense_max) + 1):
+                        dense[dense_offset + c] = next_state
+                if r.end > dense_max:
+                    first = bisect_left(class_starts, max(r.start, cls.DENSE_SIZE))
+                    last = bisect_right(class_starts, r.end) - 1
+                    for k in range(first, last + 1):
+                        sparse[sparse_offset + k] = next_state
+
+        accepts = [None] * state_count
+        for state, token in accept_table.items():
+            accepts[state] = token
+        return cls(state_count, dense, class_starts, sparse, accepts)
+
+    def char_class(self, char: int) -> int:
+        return bisect_right(self.class_starts, char) - 1
+
+    def next_state(self, state: int, char: int) -> int:
+        if 0 <= char < self.DENSE_SIZE:
+            return self.dense[(state << self.DENSE_SHIFT) | char]
+        if char < 0:
+            return self.STOP_STATE
+        return self.sparse[state * self._class_count + bisect_right(self.class_starts, char) - 1]
+
+    def get_accept(self, state: int) -> Optional['TokenDef']:
+        return self.accepts[state]
+
+    def to_bytes(self) -> bytes:
+        # accept 状态只保存 token 的 index，加载时通过 TokenFactory 还原
+        accepts = array('i', [-1 if token is None else token.index for token in self.accepts])
+        arrays = [self.dense, self.class_starts, self.sparse, accepts]
+        if sys.byteorder != "little":
+            arrays = [array('i', a) for a in arrays]
+            for a in arrays:
+                a.byteswap()
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.state_count,
+                                  len(self.dense), len(self.class_starts), len(self.sparse))
+        return header + zlib.compress(b"".join(a.tobytes() for a in arrays))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, tokens: 'TokenFactory') -> 'CompiledTable':
+        magic, version, state_count, dense_size, class_count, sparse_size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("unsupported compiled table format")
+        payload = zlib.decompress(data[cls.HEADER.size:])
+        arrays = []
+        offset = 0
+        for size in (dense_size, class_count, sparse_size, state_count):
+            a = array('i')
+            a.frombytes(payload[offset: offset + size * a.itemsize])
+            if sys.byteorder != "little":
+                a.byteswap()
+            arrays.append(a)
+            offset += size * a.itemsize
+        if offset != len(payload):
+            raise ValueError("compiled table is corrupted")
+        dense, class_starts, sparse, accepts = arrays
+        return cls(state_count, dense, class_starts, sparse, [None if i < 0 else tokens.get(i) for i in accepts])
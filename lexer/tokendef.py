@@ -1,13 +1,21 @@
 from dataclasses import dataclass
+from hashlib import sha256
+from typing import Dict, List, Optional, Tuple
 from lexer.re_expression import Expression
 
+# EOF 不属于任何 TokenDef，使用固定的 id
+EOF_TYPE = "__EOF__"
+EOF_KIND = -1
+
 
 @dataclass
 class TokenDef:
     name: str
     index: int
-    exp: Expression
+    exp: Optional[Expression]
     tag: str
+    # 关键字没有对应的表达式，由名为 keyword_of 的 token (例如 id) 匹配后再重新分类
+    keyword_of: Optional[str] = None
 
     def __str__(self):
         return f"Token(index={self.index}, name={self.name}, tag={self.tag})"
@@ -24,10 +32,12 @@ class TokenFactory:
     def __init__(self):
         self.index = 0
         self.token_mapping = {}
+        self.name_mapping = {EOF_TYPE: EOF_KIND}
 
     def create(self, exp: Expression, name: str, tag: str = None):
         token = TokenDef(name, self.index, exp, tag)
         self.token_mapping[self.index] = token
+        self.name_mapping.setdefault(name, self.index)
         self.index += 1
         return token
 
@@ -38,24 +48,110 @@ class TokenFactory:
             tag=tag
         )
 
+    # 关键字不会加入自动机，先按 base 对应的 token 匹配，再通过 keywords() 查表得到关键字的 token
+    def create_keyword(self, string: str, base: str = "id", tag: str = None):
+        token = TokenDef(string, self.index, None, tag, keyword_of=base)
+        self.token_mapping[self.index] = token
+        self.name_mapping.setdefault(string, self.index)
+        self.index += 1
+        return token
+
     def get(self, index: int):
         return self.token_mapping[index]
 
-    def tokens(self):
-        return self.token_mapping.values()
+    # 需要加入自动机的 token，不包括关键字
+    def tokens(self) -> List[TokenDef]:
+        return [token for token in self.token_mapping.values() if token.exp is not None]
+
+    # base token id -> {关键字文本: 关键字 token id}，同名关键字以先定义的为准
+    def keywords(self) -> Dict[int, Dict[str, int]]:
+        table = {}
+        for token in self.token_mapping.values():
+            if token.keyword_of is None:
+                continue
+            base = self.kind(token.keyword_of)
+            if base is None:
+                raise ValueError(f"keyword '{token.name}' is based on undefined token '{token.keyword_of}'")
+            table.setdefault(base, {}).setdefault(token.name, token.index)
+        return table
+
+    # 根据名称获取 token 的整数 id (即 TokenDef.index)，不存在时返回 None
+    def kind(self, name: str) -> Optional[int]:
+        return self.name_mapping.get(name)
+
+    # 下标为 token id 的名称表，用于由 id 还原 token_type
+    def names(self) -> List[str]:
+        names = [None] * self.index
+        for index, token in self.token_mapping.items():
+            names[index] = token.name
+        return names
+
+    # 根据所有 token 的定义计算指纹，定义不变时编译出的状态机也不会变
+    def fingerprint(self) -> str:
+        definition = [(token.index, token.name, token.tag, token.exp.key()) for token in self.tokens()]
+        return sha256(repr(definition).encode("utf-8")).hexdigest()
 
 
-@dataclass
 class Token:
-    token_type: str
-    text: str
-    start_pos: (int, int)
-    end_pos: (int, int)
+    """
+    token 只保存整数 id 以及在源码中的起止偏移量，文本和 (row, col) 位置在第一次访问时
+    通过 source 从源码中计算，source 需要提供 slice(start, end) 以及 position(offset, is_end)
+    """
+
+    __slots__ = ("kind", "token_type", "start", "end", "_source", "_text", "_start_pos", "_end_pos")
+
+    def __init__(self, token_type: str, text: str = None, start_pos: Tuple[int, int] = None, end_pos: Tuple[int, int] = None,
+                 kind: int = EOF_KIND, start: int = -1, end: int = -1, source=None):
+        self.token_type = token_type
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self._source = source
+        self._text = text
+        self._start_pos = start_pos
+        self._end_pos = end_pos
+
+    @property
+    def text(self) -> str:
+        if self._text is None and self._source is not None:
+            self._text = self._source.slice(self.start, self.end)
+        return self._text
+
+    @property
+    def start_pos(self) -> Tuple[int, int]:
+        if self._start_pos is None and self._source is not None:
+            self._start_pos = self._source.position(self.start, False)
+        return self._start_pos
+
+    @property
+    def end_pos(self) -> Tuple[int, int]:
+        if self._end_pos is None and self._source is not None:
+            self._end_pos = self._source.position(self.end, True)
+        return self._end_pos
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Token):
+            return NotImplemented
+        return self.token_type == other.token_type and self.text == other.text \
+            and self.start_pos == other.start_pos and self.end_pos == other.end_pos
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Token(token_type={self.token_type!r}, text={self.text!r}, start_pos={self.start_pos!r}, end_pos={self.end_pos!r})"
+
+    def __getstate__(self):
+        return self.token_type, self.text, self.start_pos, self.end_pos, self.kind
 
+    def __setstate__(self, state):
+        token_type, text, start_pos, end_pos, kind = state
+        self.__init__(token_type, text, start_pos, end_pos, kind)
 
 
 EOF = Token(
-        "__EOF__",
+        EOF_TYPE,
         "",
         None,
         None
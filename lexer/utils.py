@@ -3,6 +3,8 @@ from lexer.state import CharRange, Edge, DFAState, NFAState, NFA
 from functools import reduce
 from collections import defaultdict
 from lexer.range import RangeSearch
+from bisect import bisect_left
+from utils.logger import LOGGER
 
 
 def generate_range(ranges: Iterable[int]):
@@ -89,6 +91,86 @@ def nfa_to_dfa(nfa: NFA) -> DFAState:
     return dfa_init_state
 
 
+# 获取从初始状态可达的所有 dfa state
+def reachable_states(init_state: DFAState) -> List[DFAState]:
+    res = [init_state]
+    visited = {init_state}
+    for state in res:
+        for edge in state.edges:
+            if edge.state not in visited:
+                visited.add(edge.state)
+                res.append(edge.state)
+    return res
+
+
+# 将所有状态的转移区间统一切分为不相交的字符类，返回每个字符类的起始位置
+def char_classes(states: List[DFAState]) -> List[int]:
+    points = set()
+    for state in states:
+        for edge in state.edges:
+            points.add(edge.char.start)
+            points.add(edge.char.end + 1)
+    return sorted(points)
+
+
+# 使用 Moore 划分细化算法对 dfa 进行最小化
+# 初始时按照 accept_as 的 token 划分，保证合并之后的状态仍然接受优先级最高的 token
+# 之后不断根据每个字符类转移到的划分对状态进行拆分，直到划分不再变化
+def minimize_dfa(init_state: DFAState) -> DFAState:
+    states = reachable_states(init_state)
+    starts = char_classes(states)
+
+    # 每个状态在每个字符类上转移到的状态，不存在转移时为 None
+    moves = {}
+    for state in states:
+        move = [None] * len(starts)
+        for edge in state.edges:
+            first = bisect_left(starts, edge.char.start)
+            last = bisect_left(starts, edge.char.end + 1)
+            for k in range(first, last):
+                move[k] = edge.state
+        moves[state] = move
+
+    block_of = {state: (state.accept_as.index if state.accept_as else -1) for state in states}
+    block_count = len(set(block_of.values()))
+    while True:
+        signatures = {}
+        new_block_of = {}
+        for state in states:
+            signature = (block_of[state], tuple(block_of.get(s) for s in moves[state]))
+            new_block_of[state] = signatures.setdefault(signature, len(signatures))
+        block_of = new_block_of
+        if len(signatures) == block_count:
+            break
+        block_count = len(signatures)
+
+    # 每个划分创建一个新的 dfa state，并合并目标相同的相邻区间
+    new_states = {}
+    for state in states:
+        block = block_of[state]
+        if block not in new_states:
+            new_states[block] = DFAState(nfa_states=state.nfa_states, accept_as=state.accept_as)
+    done = set()
+    for state in states:
+        block = block_of[state]
+        if block in done:
+            continue
+        done.add(block)
+        new_state = new_states[block]
+        merged = []
+        for edge in sorted(state.edges, key=lambda e: e.char.start):
+            target = new_states[block_of[edge.state]]
+            if merged and merged[-1][1] is target and merged[-1][0].end + 1 == edge.char.start:
+                merged[-1] = (CharRange(merged[-1][0].start, edge.char.end), target)
+            else:
+                merged.append((edge.char, target))
+        for char, target in merged:
+            new_state.add_edge(Edge(char, target))
+
+    LOGGER.info("minimize dfa states from %d to %d", len(states), len(new_states))
+    return new_states[block_of[init_state]]
+
+
 def split_range_by(start, end, split_chars):
     if not split_chars:
         return [(start, end)]
@@ -0,0 +1,119 @@
+import glob
+import os
+import struct
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Callable, Optional
+
+from grammer import TOKENS
+from parser.expr import GRAMMAR_VERSION
+from parser.node import ProcNode
+from parser.serialize import dump_ast, load_ast, schema_fingerprint
+from utils.logger import LOGGER
+
+
+class AstCache:
+    """
+    语法分析结果的缓存，以源码的 hash 以及语法版本作为 key，源码没有变化时跳过词法分析和语法分析。
+    1. 进程内: 保存序列化后的数据，每次加载都会创建新的语法树，visitor 对语法树的修改不会影响缓存，最多保存 max_entries 个，
+       超过时淘汰最久没有使用的
+    2. 磁盘: 以 parser.serialize 的格式保存到 __pycache__ 中，写入后只保留最近使用的 max_files 个文件
+    """
+
+    MAX_ENTRIES = 128
+    MAX_FILES = 512
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = MAX_ENTRIES, max_files: int = MAX_FILES):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "ast")
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self._data: OrderedDict[str, bytes] = OrderedDict()
+        self._grammar: Optional[str] = None
+
+    def grammar(self) -> str:
+        # token 定义、语法分析规则以及节点的字段任意一个变化都会使之前的缓存失效
+        if self._grammar is None:
+            self._grammar = sha256(f"{TOKENS.fingerprint()}:{GRAMMAR_VERSION}:{schema_fingerprint()}".encode("utf-8")).hexdigest()
+        return self._grammar
+
+    def key(self, source: str) -> str:
+        return sha256(self.grammar().encode("utf-8") + source.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key[:32]}.ast")
+
+    def load(self, source: str, parser: Callable[[str], ProcNode]) -> ProcNode:
+        key = self.key(source)
+        data = self._data.get(key) or self._read(key)
+        if data is not None:
+            try:
+                node = load_ast(data)
+                self._remember(key, data)
+                return node
+            except (ValueError, IndexError, struct.error, UnicodeDecodeError) as e:
+                LOGGER.warning("ignore invalid ast cache %s: %s", self.path(key), e)
+        node = parser(source)
+        data = dump_ast(node)
+        self._remember(key, data)
+        self._write(key, data)
+        return node
+
+    def clear(self):
+        self._data.clear()
+
+    def _remember(self, key: str, data: bytes):
+        self._data[key] = data
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            LOGGER.warning("can not read ast cache %s: %s", self.path(key), e)
+            return None
+        try:
+            # 更新修改时间，清理时按照最近使用的时间保留
+            os.utime(self.path(key))
+        except OSError:
+            pass
+        return data
+
+    def _write(self, key: str, data: bytes):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # 缓存目录不可写时只是无法加速下次运行，不影响语法分析
+            LOGGER.info("can not write ast cache %s: %s", path, e)
+            return
+        self._prune()
+
+    def _prune(self):
+        # 删除最久没有使用的缓存文件，包括语法变化之前的缓存
+        paths = glob.glob(os.path.join(self.directory, "*.ast"))
+        if len(paths) <= self.max_files:
+            return
+        mtimes = []
+        for path in paths:
+            try:
+                mtimes.append((os.stat(path).st_mtime_ns, path))
+            except OSError:
+                pass
+        mtimes.sort()
+        for _, stale in mtimes[:len(mtimes) - self.max_files]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+AST_CACHE = AstCache()
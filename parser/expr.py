@@ -6,9 +6,12 @@ from parser.node import ASTNode, BinaryOpNode, LiteralNode, BlockNode, FunctionC
     TypeAnnotation, TypeInstance, TypeConstraint, TraitInstance, TraitConstraintNode, ForNode, LogicNotNode, \
     BitwiseNotNode
 from lexer.lexer import Lexer
-from typing import Optional, List, Type
+from typing import Optional, List, Type, Generator
 from parser.utils import RepeatParser, combiner
 
+# 语法分析的规则变化(即使 token 定义和节点字段没有变化)时需要升级，使 parser.cache 中的语法树缓存失效
+GRAMMAR_VERSION = 1
+
 
 def drop(token: str):
     def parse(lexer: Lexer):
@@ -65,32 +68,24 @@ def parse_struct_init(lexer: Lexer):
     return StructInitNode(type_node, [(var, expr) for var, expr in body])
 
 
-def parse_expr_unit(lexer: Lexer):
-    if lexer.peek().token_type == "not":
-        lexer.pop()
-        node = parse_rel(lexer)
-        return LogicNotNode(node)
-    if lexer.peek().token_type == "!":
-        lexer.pop()
-        node = parse_add(lexer)
-        return BitwiseNotNode(node)
-    if lexer.peek() == Lexer.EOF:
+LITERAL_TOKENS = ('float', 'int', 'string', 'id', 'self', 'true', 'false')
+
+# not/!/括号由 parse_binary 处理，这里只解析字面量、变量以及结构体初始化等操作数
+def parse_expr_unit(lexer: Lexer, token: Token = None):
+    # token 为已经 peek 到的当前 token
+    token = token or lexer.peek()
+    token_type = token.token_type
+    if token == Lexer.EOF:
         return None
-    if lexer.peek().token_type == "(":
-        lexer.pop()
-        res = parse_rel(lexer)
-        lexer.expect(")")
-        lexer.pop()
-        return res
-    elif lexer.peek().token_type == "[":
+    if token_type == "[":
         return parse_array(lexer)
-    elif lexer.peek().token_type == "{":
+    elif token_type == "{":
         return parse_dict(lexer)
-    lexer.expect('float', 'int', 'string', 'id', 'self', 'true', 'false')
-    token = lexer.peek()
-    if token.token_type == "id" or token.token_type == "self":
+    if token_type not in LITERAL_TOKENS:
+        lexer.expect(*LITERAL_TOKENS)
+    if token_type == "id" or token_type == "self":
         node = VarNode(parse_identifier(lexer))
-        node.is_self = token.token_type == "self"
+        node.is_self = token_type == "self"
         # need to check whether a struct init expr like
         if lexer.try_peek("{"):
             lexer.pop()
@@ -111,7 +106,7 @@ def parse_expr_unit(lexer: Lexer):
         return node
     else:
         lexer.pop()
-        lit = LiteralNode(token.text, 'Bool' if token.token_type in ('true', 'false') else token.token_type.capitalize())
+        lit = LiteralNode(token.text, 'Bool' if token_type in ('true', 'false') else token_type.capitalize())
         lit.start_pos = token.start_pos
         lit.end_pos = token.end_pos
         return lit
@@ -145,151 +140,112 @@ def parse_function_arg_type(lexer: Lexer):
         return parse_trait_constraint(lexer)
     return parse_type_instance(lexer)
 
-def parse_eq(lexer: Lexer):
-    left = parse_rel(lexer)
-    while True:
-        if lexer.peek().token_type not in ('==', '!='):
-            break
-        node = BinaryOpNode(lexer.peek().token_type)
-        lexer.pop()
-        right = parse_rel(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_and(lexer: Lexer):
-    left = parse_eq(lexer)
-    while True:
-        if lexer.peek().token_type != 'and':
-            break
-        node = BinaryOpNode(lexer.peek().token_type)
-        lexer.pop()
-        right = parse_eq(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_or(lexer: Lexer) -> ASTNode:
-    left = parse_and(lexer)
-    while True:
-        if lexer.peek().token_type != 'or':
-            break
-        node = BinaryOpNode(lexer.peek().token_type)
-        lexer.pop()
-        right = parse_and(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-
-def parse_attr(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_expr_unit(lexer)
+# 二元运算符的优先级，数值越大结合越紧密，同一优先级的运算符都是左结合
+OR_LEVEL = 1
+AND_LEVEL = 2
+EQ_LEVEL = 3
+REL_LEVEL = 4
+ADD_LEVEL = 5
+SHIFT_LEVEL = 6
+MUL_LEVEL = 7
+CAL_AND_LEVEL = 8
+XOR_LEVEL = 9
+CAL_OR_LEVEL = 10
+# 属性访问以及函数调用
+POSTFIX_LEVEL = 11
+
+BINDING_POWER = {
+    'or': OR_LEVEL,
+    'and': AND_LEVEL,
+    '==': EQ_LEVEL, '!=': EQ_LEVEL,
+    '>': REL_LEVEL, '<': REL_LEVEL, '>=': REL_LEVEL, '<=': REL_LEVEL,
+    '+': ADD_LEVEL, '-': ADD_LEVEL,
+    '<<': SHIFT_LEVEL, '>>': SHIFT_LEVEL,
+    '*': MUL_LEVEL, '/': MUL_LEVEL,
+    '&': CAL_AND_LEVEL,
+    '^': XOR_LEVEL,
+    '|': CAL_OR_LEVEL,
+    '.': POSTFIX_LEVEL,
+    '(': POSTFIX_LEVEL,
+}
+
+# 括号在 parse_binary 的栈中的标记
+PAREN = object()
+# 前缀运算符以及括号: (压栈的标记, 操作数中允许的最低优先级)
+PREFIX_OPERATORS = {
+    'not': (LogicNotNode, REL_LEVEL),
+    '!': (BitwiseNotNode, ADD_LEVEL),
+    '(': (PAREN, REL_LEVEL),
+}
+
+def parse_binary(lexer: Lexer, min_level: int = OR_LEVEL) -> Optional[ASTNode]:
+    """
+    Pratt parser: 先解析一个操作数，之后只要下一个运算符的优先级不低于当前的 level 就与左边结合，
+    右操作数只接受优先级更高的运算符，因此同一优先级为左结合。每个运算符只需要查一次 BINDING_POWER。
+    等待右操作数的运算符、前缀运算符、括号以及函数调用都保存在显式的栈中，而不是递归调用，
+    嵌套再深也不会超过 python 的递归深度限制。栈中保存 (等待操作数的节点, 外层的 level)
+    """
+    stack = []
+    level = min_level
     while True:
-        if lexer.peek().token_type not in ('.', '[', '('):
-            break
-        if lexer.try_peek("."):
-            lexer.pop()
-            node = AttributeNode(left, parse_identifier(lexer))
-            left = node
-        elif lexer.try_peek("("):
+        token = lexer.peek()
+        prefix = PREFIX_OPERATORS.get(token.token_type)
+        if prefix is not None:
             lexer.pop()
-            node = FunctionCallNode(left, RepeatParser(",", ")").parse(lexer, parse_expr))
-            left = node
-    return left
+            stack.append((prefix[0], level))
+            level = prefix[1]
+            continue
+        left = parse_expr_unit(lexer, token)
+        while True:
+            token = lexer.peek()
+            op_level = BINDING_POWER.get(token.token_type)
+            if op_level is not None and op_level >= level:
+                lexer.pop()
+                if op_level != POSTFIX_LEVEL:
+                    node = BinaryOpNode(token.token_type)
+                    node.left = left
+                    stack.append((node, level))
+                    level = op_level + 1
+                    break
+                if token.token_type == '.':
+                    left = AttributeNode(left, parse_identifier(lexer))
+                    continue
+                node = FunctionCallNode(left, [])
+                if lexer.try_peek(")"):
+                    lexer.pop()
+                    left = node
+                    continue
+                # 函数参数与 RepeatParser(",", ")") 的规则一致，允许最后一个参数后有逗号
+                stack.append((node, level))
+                level = OR_LEVEL
+                break
+            # 当前操作数已经结束，与栈顶等待操作数的节点结合
+            if not stack:
+                return left
+            waiting, level = stack.pop()
+            if type(waiting) is BinaryOpNode:
+                waiting.right = left
+                left = waiting
+            elif waiting is PAREN:
+                lexer.expect(")")
+                lexer.pop()
+            elif type(waiting) is FunctionCallNode:
+                waiting.args.append(left)
+                lexer.expect(",", ")")
+                if lexer.peek().token_type == ",":
+                    lexer.pop()
+                if lexer.peek().token_type == ")":
+                    lexer.pop()
+                    left = waiting
+                else:
+                    stack.append((waiting, level))
+                    level = OR_LEVEL
+                    break
+            else:
+                left = waiting(left)
 
-def parse_cal_or(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_attr(lexer)
-    while True:
-        if lexer.peek().token_type != '|':
-            break
-        node = BinaryOpNode(lexer.peek().text)
-        lexer.pop()
-        right = parse_attr(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_xor(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_cal_or(lexer)
-    while True:
-        if lexer.peek().token_type != '^':
-            break
-        node = BinaryOpNode(lexer.peek().text)
-        lexer.pop()
-        right = parse_cal_or(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_cal_and(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_xor(lexer)
-    while True:
-        if lexer.peek().token_type != '&':
-            break
-        node = BinaryOpNode(lexer.peek().text)
-        lexer.pop()
-        right = parse_xor(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_mul(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_cal_and(lexer)
-    while True:
-        if lexer.peek().token_type not in ('*', '/'):
-            break
-        node = BinaryOpNode(lexer.peek().token_type)
-        lexer.pop()
-        right = parse_cal_and(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_bitwise_shift(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_mul(lexer)
-    while True:
-        if lexer.peek().token_type not in ('<<', '>>'):
-            break
-        node = BinaryOpNode(lexer.peek().token_type)
-        lexer.pop()
-        right = parse_mul(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_add(lexer: Lexer) -> Optional[ASTNode]:
-    left = parse_bitwise_shift(lexer)
-    while True:
-        if lexer.peek().token_type not in ('+', '-'):
-            break
-        node = BinaryOpNode(lexer.peek().text)
-        lexer.pop()
-        right = parse_bitwise_shift(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
-
-def parse_rel(lexer: Lexer):
-    left = parse_add(lexer)
-    while True:
-        if lexer.peek().token_type not in ('>', '<', '>=', '<='):
-            break
-        node = BinaryOpNode(lexer.peek().token_type)
-        lexer.pop()
-        right = parse_add(lexer)
-        node.left = left
-        node.right = right
-        left = node
-    return left
+def parse_or(lexer: Lexer) -> ASTNode:
+    return parse_binary(lexer, OR_LEVEL)
 
 def parse_properties(lexer: Lexer):
     data = parse_identifier(lexer)
@@ -326,12 +282,32 @@ def parse_function_type(lexer: Lexer) -> FunctionTypeNode:
 
 
 
-def parse_stmt(lexer: Lexer) -> Optional[ASTNode]:
+def run_parser(parser: Generator):
+    """
+    语句以及代码块的解析函数写成生成器，需要解析子语句或者代码块时 yield 对应的生成器，
+    由这里用显式的栈驱动执行并把结果 send 回去，代码块嵌套的深度不受 python 递归深度的限制
+    """
+    stack = [parser]
+    value = None
+    while True:
+        try:
+            child = stack[-1].send(value)
+        except StopIteration as e:
+            stack.pop()
+            if not stack:
+                return e.value
+            value = e.value
+            continue
+        stack.append(child)
+        value = None
+
+
+def stmt_parser(lexer: Lexer) -> Generator:
     match lexer.peek().token_type:
         case "if":
-            node = parse_if_stmt(lexer)
+            node = yield if_stmt_parser(lexer)
         case "while":
-            node = parse_while_stmt(lexer)
+            node = yield while_stmt_parser(lexer)
         case "id":
             lexer.pop()
             if lexer.peek().token_type == '=':
@@ -342,7 +318,7 @@ def parse_stmt(lexer: Lexer) -> Optional[ASTNode]:
                 node = parse_expr(lexer)
             lexer.expect_pop(";")
         case "def":
-            node = parse_function_def(lexer)
+            node = yield function_def_parser(lexer)
         case "let":
             node = parse_var_def(lexer)
             lexer.expect_pop(";")
@@ -356,52 +332,51 @@ def parse_stmt(lexer: Lexer) -> Optional[ASTNode]:
             node.end_pos = t.end_pos
             lexer.expect_pop(";")
         case "for":
-            node = visit_for_node(lexer)
+            node = yield for_parser(lexer)
         case _:
             raise ValueError(f"Unexpected token '{lexer.peek().token_type}'")
     return node
 
 
-
-def parse_block(lexer: Lexer) -> Optional[BlockNode]:
+def block_parser(lexer: Lexer) -> Generator:
     lexer.expect_pop("{")
     node = BlockNode([])
     if lexer.try_peek("}"):
         lexer.pop()
         return node
     while True:
-        node.stmts.append(parse_stmt(lexer))
+        node.stmts.append((yield stmt_parser(lexer)))
         if lexer.try_peek("}"):
             lexer.pop()
             break
     return node
 
-def parse_if_stmt(lexer: Lexer) -> Optional[IfStatement]:
+def if_stmt_parser(lexer: Lexer) -> Generator:
     lexer.expect_pop("if")
     condition_node = parse_expr(lexer)
-    body_node = parse_block(lexer)
+    body_node = yield block_parser(lexer)
     branches = [(condition_node, body_node)]
     else_branches = None
     while True:
         if lexer.try_peek("elif"):
             lexer.pop()
             condition_node = parse_expr(lexer)
-            body_node = parse_block(lexer)
+            body_node = yield block_parser(lexer)
             branches.append((condition_node, body_node))
         elif lexer.try_peek("else"):
             lexer.pop()
-            else_branches = parse_block(lexer)
+            else_branches = yield block_parser(lexer)
         else:
             break
     return IfStatement(branches, else_branches)
 
-def parse_while_stmt(lexer: Lexer) -> Optional[LoopStatement]:
+def while_stmt_parser(lexer: Lexer) -> Generator:
     lexer.expect_pop("while")
     condition_node = parse_expr(lexer)
-    body_node = parse_block(lexer)
+    body_node = yield block_parser(lexer)
     return LoopStatement(condition_node, body_node)
 
-def parse_function_def(lexer: Lexer, trait_node: TraitImplNode=None) -> FunctionDefNode:
+def function_def_parser(lexer: Lexer, trait_node: TraitImplNode=None) -> Generator:
     lexer.expect_pop("def")
     function_name = parse_identifier(lexer)
     type_parameters = []
@@ -413,9 +388,33 @@ def parse_function_def(lexer: Lexer, trait_node: TraitImplNode=None) -> Function
     args = RepeatParser(",", ")").parse(lexer, combiner(parse_identifier, drop(":"), parse_function_arg_type))
     lexer.expect_pop("->")
     return_type = parse_function_arg_type(lexer)
-    body = parse_block(lexer)
+    body = yield block_parser(lexer)
     return FunctionDefNode(function_name, [VarDefNode(id, type) for id, type in args], body, return_type, trait_node, type_parameters)
 
+def for_parser(lexer: Lexer) -> Generator:
+    lexer.expect_pop("for")
+    var_node = parse_var(lexer)
+    lexer.expect_pop("in")
+    iterable = parse_expr(lexer)
+    body = yield block_parser(lexer)
+    return ForNode(var_node, iterable, body)
+
+
+def parse_stmt(lexer: Lexer) -> Optional[ASTNode]:
+    return run_parser(stmt_parser(lexer))
+
+def parse_block(lexer: Lexer) -> Optional[BlockNode]:
+    return run_parser(block_parser(lexer))
+
+def parse_if_stmt(lexer: Lexer) -> Optional[IfStatement]:
+    return run_parser(if_stmt_parser(lexer))
+
+def parse_while_stmt(lexer: Lexer) -> Optional[LoopStatement]:
+    return run_parser(while_stmt_parser(lexer))
+
+def parse_function_def(lexer: Lexer, trait_node: TraitImplNode=None) -> FunctionDefNode:
+    return run_parser(function_def_parser(lexer, trait_node))
+
 def parse_var_def(lexer: Lexer):
     lexer.expect_pop("let")
     id_node = parse_identifier(lexer)
@@ -557,12 +556,7 @@ def parse_proc(lexer: Lexer) -> ProcNode:
     return proc_node
 
 def visit_for_node(lexer: Lexer) -> ForNode:
-    lexer.expect_pop("for")
-    var_node = parse_var(lexer)
-    lexer.expect_pop("in")
-    iterable = parse_expr(lexer)
-    body = parse_block(lexer)
-    return ForNode(var_node, iterable, body)
+    return run_parser(for_parser(lexer))
 
 # def parse_generic_type(lexer: Lexer) -> GenericTypeNode:
 #     lexer.expect_pop("<")
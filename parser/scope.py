@@ -1,9 +1,12 @@
 import copy
-from typing import Optional, Dict
+import itertools
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Dict, Iterator, Tuple
 
 from error.exception import DuplicateDefineError
 from parser.symbol import *
-from parser.symbol_type import TraitImpl, TraitRef
+from parser.symbol_type import InternedType, TraitImpl, TraitRef, TypeRef, StructTypeRef
 
 
 
@@ -19,6 +22,8 @@ class Scope:
         self.generic_symbols: Dict[str, GenericParamSymbol] = {}
         self.child: Optional['Scope'] = None
         self.trait_impls: List[TraitTypeRef] = []
+        # 在该作用域中定义的 struct 的字段布局(类型参数已绑定)，key 为 TypeRef，值为 (struct 的定义, 布局)
+        self.struct_layouts: Dict[TypeRef, Tuple[StructTypeRef, StructTypeRef]] = {}
 
     def lookup_var(self, name: str) -> Optional[VarSymbol]:
         s = self.symbols.get(name)
@@ -44,6 +49,14 @@ class Scope:
             return None
         return self.parent.lookup_type(name)
 
+    def lookup_type_scope(self, name: str) -> Optional['Scope']:
+        # 定义了类型 name 的作用域
+        if name in self.generic_symbols or name in self.types:
+            return self
+        if not self.parent:
+            return None
+        return self.parent.lookup_type_scope(name)
+
     def exists(self, symbol: str) -> bool:
         s = self.symbols.get(symbol)
         return symbol == s
@@ -83,10 +96,17 @@ class Scope:
         return self.__str__()
 
     def __copy__(self):
-        return Scope(
-            self.parent,
-            self.symbols[:],
-        )
+        # 共享父作用域以及其中的符号，符号表单独复制
+        scope = Scope()
+        scope.parent = self.parent
+        scope.symbols = dict(self.symbols)
+        scope.traits = dict(self.traits)
+        scope.types = dict(self.types)
+        scope.generic_symbols = dict(self.generic_symbols)
+        scope.child = self.child
+        scope.trait_impls = list(self.trait_impls)
+        scope.struct_layouts = dict(self.struct_layouts)
+        return scope
 
 
 class ScopeManager:
@@ -96,6 +116,9 @@ class ScopeManager:
         self.current_scope: Scope = self.global_scope
         self.trait_impls: List[TraitTypeRef] = []
 
+    def reset(self, global_scope: Scope = None):
+        self.__init__(global_scope)
+
     def enter(self) -> Scope:
         current = self.current_scope
         self.current_scope = Scope()
@@ -168,28 +191,165 @@ class ScopeManager:
         self.exit()
         return False
 
+def type_key(type_ref: TypeRef|TypeVar) -> Optional[TypeRef]:
+    """
+    不包含类型变量的类型本身就可以作为 key (结构相同的类型是同一个对象)，包含类型变量时返回 None
+    """
+    stack = [type_ref]
+    while stack:
+        t = stack.pop()
+        if t.is_var:
+            return None
+        stack.extend(t.parameters)
+    return type_ref
+
+
+# impl 的版本号，在整个进程中递增
+_VERSIONS = itertools.count()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+def _merge(*candidates: List[tuple]) -> List[tuple]:
+    # 每个索引中的 (序号, impl, 是否已经匹配) 都按添加顺序排列，合并后保持与线性扫描相同的顺序
+    candidates = [c for c in candidates if c]
+    if len(candidates) == 1:
+        return candidates[0]
+    return sorted((x for c in candidates for x in c), key=lambda x: x[0])
+
+
 class TraitImpls:
+    """
+    impl 按照 trait 名以及目标类型的类型构造器(类型名)建立索引，查找时只需要检查可能匹配的 impl:
+    1. 目标类型不包含类型变量的 impl 以 type_key 为 key，查询的类型同样不包含类型变量时直接通过 key 找到匹配的 impl
+    2. 目标类型包含类型变量的 impl 以类型名为 key，找到后再通过 is_type_match 检查
+    3. 目标类型本身是类型变量的 impl (impl<T> Trait for T) 可以匹配任意类型，单独保存
+    每个索引都以 trait 名 (None 表示任意 trait) 作为 key 的一部分。
+
+    依赖 impl 的缓存(例如 code_gen.instances.InstanceCache)通过 record 记录分析过程中查找过的 (trait 名, 目标类型名) 及其版本号，
+    add_impl 只更新新的 impl 影响的 key 的版本号，其他的缓存仍然有效。
+    目标类型名为 None 表示目标类型是类型变量的 impl，ALL_TARGETS 表示 trait 的全部 impl。
+    """
+
+    ANY_TRAIT = None
+    ALL_TARGETS = "*"
+    # 缓存中可能包含大量只使用一次的类型变量，超过上限时清空
+    MAX_CACHE_SIZE = 1 << 16
 
     def __init__(self):
         self.trait_impls: List[TraitImpl] = []
+        self._by_trait: Dict[str, List[tuple]] = {}
+        self._exact: Dict[tuple, List[tuple]] = {}
+        self._by_head: Dict[tuple, List[tuple]] = {}
+        self._generic_by_head: Dict[tuple, List[tuple]] = {}
+        self._blanket: Dict[Optional[str], List[tuple]] = {}
+        # 在不含类型变量的 impl 目标类型中带有类型参数的类型名
+        self._parameterized: set = set()
+        # is_type_match 以及 bind_impl 的结果只依赖于参数和已有的 impl，add_impl 时清空
+        self._match_cache: Dict[tuple, bool] = {}
+        self._bind_cache: Dict[tuple, tuple] = {}
+        self.match_stats = CacheStats()
+        self.bind_stats = CacheStats()
+        self._versions: Dict[tuple, int] = {}
+        # 正在记录的依赖，嵌套记录时每一层都会记录
+        self._recorders: List[Dict[tuple, Optional[int]]] = []
+
+    def reset(self, impls: List[TraitImpl] = ()):
+        self.__init__()
+        for impl in impls:
+            self.add_impl(impl)
+
+    @contextmanager
+    def record(self) -> Iterator[Dict[tuple, Optional[int]]]:
+        """
+        记录期间所有 impl 查找依赖的 key 及其当时的版本号(没有 impl 时为 None)
+        """
+        dependencies = {}
+        self._recorders.append(dependencies)
+        try:
+            yield dependencies
+        finally:
+            self._recorders.pop()
+
+    def is_current(self, dependencies: Dict[tuple, Optional[int]]) -> bool:
+        # 依赖的 impl 都没有变化
+        versions = self._versions
+        return all(versions.get(key) == version for key, version in dependencies.items())
+
+    def _depend(self, keys):
+        versions = self._versions
+        for recorder in self._recorders:
+            for key in keys:
+                recorder[key] = versions.get(key)
+
+    def cache_info(self) -> Dict[str, CacheStats]:
+        return {"is_type_match": self.match_stats, "bind_impl": self.bind_stats}
+
+    def clear_cache(self):
+        self._match_cache.clear()
+        self._bind_cache.clear()
+
+    def _index(self, impl: TraitImpl):
+        seq = len(self.trait_impls)
+        target = impl.target_type
+        self._by_trait.setdefault(impl.trait.name, []).append((seq, impl, False))
+        for trait_name in (impl.trait.name, self.ANY_TRAIT):
+            if target.is_var:
+                self._blanket.setdefault(trait_name, []).append((seq, impl, False))
+                continue
+            self._by_head.setdefault((trait_name, target.name), []).append((seq, impl, False))
+            key = type_key(target)
+            if key is None:
+                self._generic_by_head.setdefault((trait_name, target.name), []).append((seq, impl, False))
+            else:
+                self._exact.setdefault((trait_name, key), []).append((seq, impl, True))
+        if not target.is_var and type_key(target) is not None:
+            self._collect_parameterized(target)
+
+    def _collect_parameterized(self, type_ref: TypeRef):
+        if type_ref.parameters:
+            self._parameterized.add(type_ref.name)
+            for param in type_ref.parameters:
+                self._collect_parameterized(param)
+
+    def _exact_key(self, type_ref: TypeRef) -> Optional[TypeRef]:
+        """
+        is_type_match 中没有类型参数的类型可以匹配任意参数(例如 Box 可以匹配 Box<Int>)，
+        只有查询的类型中不存在这种情况时才能通过 key 直接查找
+        """
+        stack = [type_ref]
+        while stack:
+            t = stack.pop()
+            if t.is_var:
+                return None
+            if not t.parameters and t.name in self._parameterized:
+                return None
+            stack.extend(t.parameters)
+        return type_ref
+
+    def _candidates(self, type_ref: TypeRef|TypeVar, trait_name: Optional[str]) -> List[tuple]:
+        blanket = self._blanket.get(trait_name)
+        if self._recorders:
+            self._depend(((trait_name, None),) if type_ref.is_var else ((trait_name, None), (trait_name, type_ref.name)))
+        # 类型变量不会匹配具体的类型
+        if type_ref.is_var:
+            return blanket or []
+        key = self._exact_key(type_ref)
+        if key is None:
+            return _merge(self._by_head.get((trait_name, type_ref.name)), blanket)
+        return _merge(self._exact.get((trait_name, key)), self._generic_by_head.get((trait_name, type_ref.name)), blanket)
 
     def get_impl(self, type_ref: TypeRef, trait_ref: TraitRef, need_bind=True) -> List[TraitImpl]:
         impls = []
         # type_ref: Box<String>
         # trait_ref: Trait1<T>
         # impl.trait = Trait1<String>
-        for impl in self.trait_impls:
-            # print(
-            #     trait_ref.name, impl.trait.name
-            # )
-            # print(
-            #     len(trait_ref.parameters), len(impl.trait.parameters)
-            # )
-            # print(
-            #     trait_ref.parameters, impl.trait.parameters , [self.is_type_match(r1, r2) for r1, r2 in zip(trait_ref.parameters, impl.trait.parameters)]
-            # )
-            if (self.is_type_match(type_ref, impl.target_type)
-                        and trait_ref.name == impl.trait.name
+        for _, impl, matched in self._candidates(type_ref, trait_ref.name):
+            if ((matched or self.is_type_match(type_ref, impl.target_type))
                         and len(trait_ref.parameters) == len(impl.trait.parameters)
                         #and all(self.is_type_match(r1, r2) for r1, r2 in zip(trait_ref.parameters, impl.trait.parameters) )
                         and all(self.is_type_match(r1, r2) for r1, r2 in zip(impl.trait.parameters, trait_ref.parameters) )
@@ -217,10 +377,30 @@ class TraitImpls:
         :param r2:
         :return:
         """
+        # 类型都是唯一的对象(见 symbol_type.Interned)，可以直接作为 key
+        if not isinstance(r1, InternedType) or not isinstance(r2, InternedType):
+            return self._is_type_match(r1, r2)
+        key = (r1, r2)
+        cached = self._match_cache.get(key)
+        if cached is not None:
+            self.match_stats.hits += 1
+            # 命中缓存时不会再查找 impl，需要补充计算时记录的依赖
+            if self._recorders:
+                self._depend(cached[1])
+            return cached[0]
+        self.match_stats.misses += 1
+        with self.record() as dependencies:
+            res = self._is_type_match(r1, r2)
+        if len(self._match_cache) >= self.MAX_CACHE_SIZE:
+            self._match_cache.clear()
+        self._match_cache[key] = (res, tuple(dependencies))
+        return res
+
+    def _is_type_match(self, r1: TypeRef|TypeVar, r2: TypeRef|TypeVar|TraitRef) -> bool:
         # support trait ref
         if isinstance(r2, TraitRef):
-            # 名字不是必须的，只要有约束即可
-            return self.is_type_match(r1, TypeVar.create("__", [r2]))
+            # 名字不是必须的，只要有约束即可，临时创建的类型变量不进入缓存
+            return self._is_type_match(r1, TypeVar.create("__", [r2]))
         # case 4
         if r1.is_var and not r2.is_var:
             return False
@@ -252,16 +432,45 @@ class TraitImpls:
 
     def bind_impl(self, impl: TraitImpl, real_trait: TraitRef|None=None, real_target: TypeRef|None=None):
         from parser.visitor.type_binder import TypeBinder
-        return TypeBinder(self).resolve_impl_and_bind(impl, real_target=real_target, real_trait=real_trait)
+        if not isinstance(real_trait, (InternedType, type(None))) or not isinstance(real_target, (InternedType, type(None))):
+            return TypeBinder(self).resolve_impl_and_bind(impl, real_target=real_target, real_trait=real_trait)
+        key = (id(impl), real_trait, real_target)
+        cached = self._bind_cache.get(key)
+        if cached is not None and cached[0] is impl:
+            self.bind_stats.hits += 1
+            if self._recorders:
+                self._depend(cached[2])
+            return self._copy_bound_impl(cached[1])
+        self.bind_stats.misses += 1
+        with self.record() as dependencies:
+            bound = TypeBinder(self).resolve_impl_and_bind(impl, real_target=real_target, real_trait=real_trait)
+        if len(self._bind_cache) >= self.MAX_CACHE_SIZE:
+            self._bind_cache.clear()
+        # 缓存中保存一份副本，调用方会修改返回值中的函数(例如 call_source_type)
+        self._bind_cache[key] = (impl, self._copy_bound_impl(bound), tuple(dependencies))
+        return bound
+
+    @staticmethod
+    def _copy_bound_impl(impl: TraitImpl) -> TraitImpl:
+        res = TraitImpl(impl.trait, impl.target_type, list(impl.type_parameters), binds=dict(impl.binds),
+                        target_type_define=impl.target_type_define)
+        for func_name, func in impl.functions.items():
+            f = copy.copy(func)
+            f.args = list(func.args)
+            f.association_impl = res
+            res.functions[func_name] = f
+        return res
 
     def get_impl_by_type(self, type_ref: TypeRef) -> List[TraitImpl]:
-        return [self.bind_impl(impl, real_target=type_ref) for impl in self.trait_impls if self.is_type_match(type_ref, impl.target_type)]
+        return [self.bind_impl(impl, real_target=type_ref) for _, impl, matched in self._candidates(type_ref, self.ANY_TRAIT)
+                if matched or self.is_type_match(type_ref, impl.target_type)]
 
     def get_impl_by_trait(self, trait_ref: TraitRef) -> List[TraitImpl]:
         impls = []
-        for impl in self.trait_impls:
-            if (trait_ref.name == impl.trait.name
-                    and len(trait_ref.parameters) == len(impl.trait.parameters)
+        if self._recorders:
+            self._depend(((trait_ref.name, self.ALL_TARGETS),))
+        for _, impl, _ in self._by_trait.get(trait_ref.name, []):
+            if (len(trait_ref.parameters) == len(impl.trait.parameters)
                     and all(self.is_type_match(r1, r2) for r1, r2 in zip(trait_ref.parameters, impl.trait.parameters))
             ):
                 impls.append(self.bind_impl(impl, real_trait=trait_ref))
@@ -279,4 +488,10 @@ class TraitImpls:
     #                 type_utils.get_type_id(trait)] = NameFunctionObject(compile_name, self.meta_manager.globals)
 
     def add_impl(self, impl: TraitImpl):
+        self.clear_cache()
+        version = next(_VERSIONS)
+        target = None if impl.target_type.is_var else impl.target_type.name
+        for key in ((impl.trait.name, target), (self.ANY_TRAIT, target), (impl.trait.name, self.ALL_TARGETS)):
+            self._versions[key] = version
+        self._index(impl)
         self.trait_impls.append(impl)
\ No newline at end of file
@@ -0,0 +1,242 @@
+"""
+语法树的扁平二进制格式，只用于保存语法分析的结果(还没有经过类型检查的语法树):
+1. 字符串表: 所有标识符、字面量等字符串去重后按出现顺序保存
+2. 条目表: 节点以及 list/tuple/dict 按后序排列(子条目在前)，每个条目为若干个 int64
+   - 节点: 节点类型编号、起始位置、结束位置，然后按 ASTNode._fields 的顺序保存每个字段的值
+   - list/tuple/dict: 类型编号(负数)、长度，然后是每个元素(dict 为 key, value 交替)
+3. 字段的值编码为一个 int64，低 3 位为类型标记，其余位为内容: 整数本身、字符串表下标或者条目下标
+4. 回填表: 指向祖先节点的引用(例如 FunctionDefNode.trait_node)无法按后序保存，
+   先写入 None，再以 (条目下标, 字段位置, 目标条目下标) 的形式记录，加载完所有条目后回填
+
+由于子条目总是在父条目之前，加载时只需要顺序扫描一遍，不需要递归。
+"""
+import struct
+import sys
+from array import array
+from hashlib import sha256
+from typing import Any, Dict, List
+
+from parser import node as ast
+from parser.node import ASTNode, ProcNode
+
+MAGIC = b"SCAST"
+# 编码方式变化时需要升级版本，节点字段的变化由 schema_fingerprint 检测
+VERSION = 1
+HEADER = struct.Struct("<5sHIIII")
+
+TAG_BITS = 3
+TAG_MASK = (1 << TAG_BITS) - 1
+TAG_NONE, TAG_BOOL, TAG_INT, TAG_STR, TAG_ITEM, TAG_FLOAT, TAG_BIG_INT = range(7)
+INT_MIN = -(1 << (63 - TAG_BITS))
+INT_MAX = (1 << (63 - TAG_BITS)) - 1
+
+KIND_LIST = -1
+KIND_TUPLE = -2
+KIND_DICT = -3
+
+# 按 parser.node 中的定义顺序为节点类型编号(TraitInstance 等别名只保留一次)
+NODE_CLASSES: List[type] = list(dict.fromkeys(
+    cls for cls in vars(ast).values() if isinstance(cls, type) and issubclass(cls, ASTNode) and cls is not ASTNode
+))
+NODE_KINDS: Dict[type, int] = {cls: i for i, cls in enumerate(NODE_CLASSES)}
+# scope 和 transformed 只由 visitor 填充，位置单独保存
+SKIP_FIELDS = ("scope", "start_pos", "end_pos", "transformed")
+NODE_FIELDS: List[tuple] = [tuple(f for f in cls._fields if f not in SKIP_FIELDS) for cls in NODE_CLASSES]
+
+
+def schema_fingerprint() -> str:
+    schema = [(cls.__name__, fields) for cls, fields in zip(NODE_CLASSES, NODE_FIELDS)]
+    return sha256(repr((VERSION, schema)).encode("utf-8")).hexdigest()
+
+
+class _Writer:
+
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.codes = array('q')
+        self.items = 0
+        self.memo: Dict[int, int] = {}
+        # 已经展开但还没有写入的条目，即当前条目的祖先
+        self.pending: Dict[int, Any] = {}
+        self.fixups: List[tuple] = []
+
+    def string(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def encode(self, value: Any) -> int:
+        # 只能编码标量，容器和节点需要先通过 write 写入条目表
+        if value is None:
+            return TAG_NONE
+        if value is True or value is False:
+            return int(value) << TAG_BITS | TAG_BOOL
+        if type(value) is int:
+            if INT_MIN <= value <= INT_MAX:
+                return value << TAG_BITS | TAG_INT
+            return self.string(str(value)) << TAG_BITS | TAG_BIG_INT
+        if type(value) is str:
+            return self.string(value) << TAG_BITS | TAG_STR
+        if type(value) is float:
+            return self.string(repr(value)) << TAG_BITS | TAG_FLOAT
+        return self.memo[id(value)] << TAG_BITS | TAG_ITEM
+
+    @staticmethod
+    def children(value: Any) -> List[Any]:
+        if isinstance(value, ASTNode):
+            return [getattr(value, f) for f in NODE_FIELDS[NODE_KINDS[type(value)]]]
+        if type(value) in (list, tuple):
+            return list(value)
+        if type(value) is dict:
+            return [x for kv in value.items() for x in kv]
+        return []
+
+    def write(self, root: ASTNode):
+        # 使用显式的栈进行后序遍历，嵌套很深的语法树也不会超过递归深度
+        stack = [(root, False)]
+        while stack:
+            value, expanded = stack.pop()
+            if id(value) in self.memo:
+                continue
+            if not expanded:
+                if id(value) in self.pending:
+                    continue
+                self.pending[id(value)] = value
+                stack.append((value, True))
+                for child in reversed(self.children(value)):
+                    if isinstance(child, (ASTNode, list, tuple, dict)) and id(child) not in self.memo:
+                        stack.append((child, False))
+                continue
+            self._write_item(value)
+            del self.pending[id(value)]
+
+    def _write_item(self, value: Any):
+        codes = self.codes
+        if isinstance(value, ASTNode):
+            kind = NODE_KINDS.get(type(value))
+            if kind is None or value.scope is not None or value.transformed is not None:
+                raise ValueError(f"can not serialize {type(value).__name__}")
+            codes.extend((kind, value._start, value._end))
+        elif type(value) is list:
+            codes.extend((KIND_LIST, len(value)))
+        elif type(value) is tuple:
+            codes.extend((KIND_TUPLE, len(value)))
+        elif type(value) is dict:
+            codes.extend((KIND_DICT, len(value)))
+        else:
+            raise ValueError(f"can not serialize {type(value).__name__}")
+        for i, child in enumerate(self.children(value)):
+            if not isinstance(child, (type(None), bool, int, str, float, ASTNode, list, tuple, dict)):
+                raise ValueError(f"can not serialize {type(child).__name__}")
+            if id(child) in self.pending:
+                if type(value) is tuple or type(value) is dict:
+                    raise ValueError("can not serialize cyclic reference in tuple or dict")
+                self.fixups.append((self.items, i, id(child)))
+                codes.append(TAG_NONE)
+            else:
+                codes.append(self.encode(child))
+        self.memo[id(value)] = self.items
+        self.items += 1
+
+
+def dump_ast(node: ProcNode) -> bytes:
+    writer = _Writer()
+    writer.write(node)
+    encoded = [s.encode("utf-8") for s in writer.strings]
+    lengths = array('I', [len(s) for s in encoded])
+    codes = writer.codes
+    fixups = array('q', [x for item, i, target in writer.fixups for x in (item, i, writer.memo[target])])
+    if sys.byteorder != "little":
+        lengths.byteswap()
+        codes = array('q', codes)
+        codes.byteswap()
+        fixups.byteswap()
+    header = HEADER.pack(MAGIC, VERSION, len(encoded), sum(len(s) for s in encoded), len(codes), len(fixups) // 3)
+    return b"".join((header, lengths.tobytes(), *encoded, codes.tobytes(), fixups.tobytes()))
+
+
+def load_ast(data: bytes) -> ProcNode:
+    magic, version, string_count, string_size, code_count, fixup_count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("unsupported ast format")
+    offset = HEADER.size
+    lengths = array('I')
+    lengths.frombytes(data[offset: offset + string_count * lengths.itemsize])
+    offset += string_count * lengths.itemsize
+    codes = array('q')
+    codes_offset = offset + string_size
+    codes.frombytes(data[codes_offset: codes_offset + code_count * codes.itemsize])
+    fixups = array('q')
+    fixups_offset = codes_offset + code_count * codes.itemsize
+    fixups.frombytes(data[fixups_offset: fixups_offset + fixup_count * 3 * fixups.itemsize])
+    if fixups_offset + fixup_count * 3 * fixups.itemsize != len(data):
+        raise ValueError("ast data is corrupted")
+    if sys.byteorder != "little":
+        lengths.byteswap()
+        codes.byteswap()
+        fixups.byteswap()
+
+    strings = []
+    for length in lengths:
+        strings.append(sys.intern(data[offset: offset + length].decode("utf-8")))
+        offset += length
+
+    items = []
+
+    def decode(code: int) -> Any:
+        tag = code & TAG_MASK
+        payload = code >> TAG_BITS
+        if tag == TAG_ITEM:
+            return items[payload]
+        if tag == TAG_STR:
+            return strings[payload]
+        if tag == TAG_INT:
+            return payload
+        if tag == TAG_BOOL:
+            return bool(payload)
+        if tag == TAG_NONE:
+            return None
+        if tag == TAG_FLOAT:
+            return float(strings[payload])
+        if tag == TAG_BIG_INT:
+            return int(strings[payload])
+        raise ValueError("ast data is corrupted")
+
+    i = 0
+    while i < code_count:
+        kind = codes[i]
+        if kind >= 0:
+            cls = NODE_CLASSES[kind]
+            fields = NODE_FIELDS[kind]
+            item = cls.__new__(cls)
+            item.scope = None
+            item.transformed = None
+            item._start = codes[i + 1]
+            item._end = codes[i + 2]
+            i += 3
+            for name in fields:
+                setattr(item, name, decode(codes[i]))
+                i += 1
+        else:
+            length = codes[i + 1]
+            values = [decode(code) for code in codes[i + 2: i + 2 + (length * 2 if kind == KIND_DICT else length)]]
+            i += 2 + len(values)
+            if kind == KIND_LIST:
+                item = values
+            elif kind == KIND_TUPLE:
+                item = tuple(values)
+            elif kind == KIND_DICT:
+                item = dict(zip(values[::2], values[1::2]))
+            else:
+                raise ValueError("ast data is corrupted")
+        items.append(item)
+    for k in range(0, len(fixups), 3):
+        item, i, target = items[fixups[k]], fixups[k + 1], items[fixups[k + 2]]
+        if isinstance(item, ASTNode):
+            setattr(item, NODE_FIELDS[NODE_KINDS[type(item)]][i], target)
+        else:
+            item[i] = target
+    if not items or not isinstance(items[-1], ProcNode):
+        raise ValueError("ast data is corrupted")
+    return items[-1]
@@ -1,7 +1,8 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Tuple
 from uuid import uuid4
 from enum import Enum
+from weakref import WeakValueDictionary
 
 from parser.types import TraitType
 
@@ -10,26 +11,61 @@ from parser.types import TraitType
 class PrimitiveType:
     name: str
 
-@dataclass(frozen=True)
-class TypeVar:
+
+class Interned(type):
+    """
+    TypeVar、TypeRef、TraitRef 的元类，实现 hash consing: 结构相同的类型只会创建一个对象。
+    类型的参数本身也是唯一的对象，因此 key 的 hash 以及比较都按 id 进行，类型之间的相等判断就是 is。
+    这些类型都是不可变的，copy、deepcopy 返回自身，pickle 加载时重新查找唯一的对象。
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        cls = super().__new__(mcs, name, bases, namespace)
+        # 不再使用的类型会被回收
+        cls._instances = WeakValueDictionary()
+        return cls
+
+    def __call__(cls, *args, **kwargs):
+        args = cls.normalize(*args, **kwargs)
+        key = cls.intern_key(args)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = super().__call__(*args)
+            cls._instances[key] = instance
+        return instance
+
+
+class InternedType:
+
+    @staticmethod
+    def intern_key(args: tuple) -> tuple:
+        return args
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+@dataclass(frozen=True, eq=False)
+class TypeVar(InternedType, metaclass=Interned):
     name: str
     id: str
     # 类型带的约束，例如 struct A<T: (Read + Write)> = {a: T}，此时 T 的约束为 Read + Write
-    constraints: List['TraitRef'] = field(default_factory=list)
+    constraints: Tuple['TraitRef', ...] = ()
     is_var = True
     is_primitive_type = False
 
-    def __eq__(self, other: 'TypeVar'):
-        if not isinstance(other, TypeVar):
-            return False
-        return other.id == self.id and other.name == self.name
+    @staticmethod
+    def normalize(name: str, id: str, constraints: Optional[List['TraitRef']] = None) -> tuple:
+        return name, id, tuple(constraints or ())
 
-    def __hash__(self) -> int:
-        return hash((self.id, self.name))
+    def __reduce__(self):
+        return TypeVar, (self.name, self.id, self.constraints)
 
     @staticmethod
     def create(name: str, constraints: Optional[List['TraitRef']] = None):
-        constraints = constraints or []
         return TypeVar(name, str(uuid4()), constraints)
 
     @staticmethod
@@ -50,66 +86,53 @@ class TypeVar:
     def __repr__(self):
         return self.__str__()
 
-@dataclass
-class TypeRef:
+
+PRIMITIVE_TYPE_NAMES = frozenset(("Float", "Int", "Bool", "String", "Any", "Unit"))
+
+
+@dataclass(frozen=True, eq=False)
+class TypeRef(InternedType, metaclass=Interned):
     # 类型名字
     name: str
-    # 类型参数列表，比如 A<K, V> 那么 parameters [K, V]
-    parameters: List[Union['TypeRef', TypeVar]] = field(default_factory=list)
-    struct_ref: Optional['StructTypeRef']=None
+    # 类型参数列表，比如 A<K, V> 那么 parameters (K, V)
+    parameters: Tuple[Union['TypeRef', TypeVar], ...] = ()
     is_var = False
+
+    @staticmethod
+    def normalize(name: str, parameters: Optional[List[Union['TypeRef', TypeVar]]] = None) -> tuple:
+        return name, tuple(parameters or ())
+
+    def __reduce__(self):
+        return TypeRef, (self.name, self.parameters)
+
     @property
     def is_primitive_type(self):
-        return self.name in (
-            "Float",
-            "Int",
-            "Bool",
-            "String",
-            "Any",
-            "Unit"
-        )
+        return self.name in PRIMITIVE_TYPE_NAMES
 
     def __str__(self):
         if self.parameters:
             string = f'<{", ".join(map(str, self.parameters))}>'
         else:
             string = ''
-        # if self.constraints:
-        #     cons = f':({", ".join(map(str, self.constraints))})'
-        # else:
-        cons = ''
-        return f"{self.name}{string}{cons}"
-
-    def __eq__(self, other: 'TypeRef'):
-        if self.name != other.name:
-            return False
-        if self.parameters:
-            return self.parameters == other.parameters
-
-        return True
-
-        # if self.is_var and other.is_var and self.constraints == other.constraints:
-        #     return True
-        # else:
-        #     return self.name == other.name and self.parameters == other.parameters
-
-    # def eq_type_only(self, other: 'TypeRef'):
-    #     return self.is_var and other.is_var or self.name == other.name
+        return f"{self.name}{string}"
 
     def __repr__(self):
         return self.__str__()
 
-    # @staticmethod
-    # def type_var(name: str, constraints: List['TraitRef'] = None) -> 'TypeVar':
-    #     return TypeVar(name, str(uuid4()), constraints)
 
-
-@dataclass
-class TraitRef:
+@dataclass(frozen=True, eq=False)
+class TraitRef(InternedType, metaclass=Interned):
     # trait 的名字
     name: str
     # trait 的参数列表
-    parameters: List['TypeRef'] = field(default_factory=list)
+    parameters: Tuple['TypeRef', ...] = ()
+
+    @staticmethod
+    def normalize(name: str, parameters: Optional[List['TypeRef']] = None) -> tuple:
+        return name, tuple(parameters or ())
+
+    def __reduce__(self):
+        return TraitRef, (self.name, self.parameters)
 
     def __str__(self):
         if self.parameters:
@@ -118,9 +141,6 @@ class TraitRef:
             string = ''
         return f"{self.name}{string}"
 
-    def __eq__(self, other: 'TraitRef'):
-        return self.name == other.name and self.parameters == other.parameters
-
     def __repr__(self):
         return self.__str__()
 
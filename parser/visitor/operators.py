@@ -19,4 +19,16 @@ OPERATOR_TRAIT_NAMES = {
     "-": "Sub",
     "*": "Mul",
     "/": "Div",
-}
\ No newline at end of file
+}
+# 原生类型的运算符在代码生成时直接使用 Python 的运算符，与 runtime/bridge 中 impl 调用的原生函数行为一致
+NATIVE_OPERATOR_TYPES = {
+    "+": ("Int", "Float", "String"),
+    "-": ("Int", "Float"),
+    "*": ("Int", "Float"),
+    "/": ("Int", "Float"),
+    ">": ("Int", "Float", "String"),
+    ">=": ("Int", "Float", "String"),
+    "<": ("Int", "Float", "String"),
+    "<=": ("Int", "Float", "String"),
+    "==": ("Int", "Float", "String"),
+}
@@ -1,14 +1,15 @@
-from typing import Dict
-from uuid import uuid4
+from typing import Callable, Dict
 
 from parser.scope import TraitImpls
 from parser.symbol_type import TraitRef
-from runtime.data import MetaManager, CodeFunctionObject, NameFunctionObject
+from runtime.data import MetaManager, field_slot
 from code_gen.script import PythonCodeGenerator
+from code_gen.instances import InstanceCache
 from parser.node import *
 from parser import utils
 from dataclasses import dataclass, field
 from parser.visitor import utils as type_utils
+from parser.visitor.operators import NATIVE_OPERATOR_TYPES
 from utils.logger import LOGGER
 
 
@@ -19,17 +20,59 @@ class TypeContext:
     function_name: Optional[str] = None
     return_type: Union[TypeRef, 'TypeVar'] = None
 
+@dataclass
+class CallTarget:
+    # 被调用的函数在全局变量中的名字，为空时调用 call_source 表达式的值
+    name: Optional[str]
+    # 方法调用的接收者，作为第一个参数传入
+    receiver: Optional[ASTNode]
+    # 参数的类型上下文
+    context: TypeContext
+
 class EvalVisitor(Visitor):
-    def __init__(self, meta_manager: MetaManager, code_generator: PythonCodeGenerator, trait_impl: TraitImpls):
+    def __init__(self, meta_manager: MetaManager, code_generator: PythonCodeGenerator, trait_impl: TraitImpls,
+                 instance_cache: Optional[InstanceCache] = None, dependencies: Optional[Dict[int, tuple]] = None):
         self.meta_manager = meta_manager
         self.code_gen = code_generator
         self.defined_functions = set()
         self.type_contexts: List[TypeContext] = []
         self.function_defs = []
         self.trait_impls = trait_impl
+        self.instance_cache = instance_cache
+        # TypeDetailVisitor 分析函数时依赖的 impl，key 为函数语法树的 id
+        self.dependencies = dependencies or {}
+        # 本次生成的函数 (函数定义, 编译后的函数名, 源码, 依赖的 impl)，执行之后加入 instance_cache
+        self.instances: List[Tuple[FunctionDefNode, str, str, dict]] = []
+
+    def define_function(self, function_ast: FunctionDefNode, define_ast: FunctionDefNode, compile_name: str, generate: Callable[[], str]):
+        """
+        生成单态化函数的代码，同一个函数只生成一次。
+        函数已经在之前的运行中定义并且依赖的 impl 没有变化时(见 InstanceCache)，跳过代码生成。
+        依赖包括本次运行分析 define_ast 以及生成代码时查找过的 impl，之前的运行中分析过的语法树不会再变化
+        """
+        if compile_name in self.defined_functions:
+            return
+        # 在生成之前加入，递归调用自身时不会重复生成
+        self.defined_functions.add(compile_name)
+        if self.instance_cache is not None and self.instance_cache.get(function_ast, compile_name, self.meta_manager.globals, self.trait_impls):
+            return
+        with self.trait_impls.record() as dependencies:
+            source = generate()
+        if not source:
+            # 泛型函数没有类型绑定等情况下不生成代码
+            return
+        analysis = self.dependencies.get(id(define_ast))
+        if analysis is not None and analysis[0] is define_ast:
+            dependencies.update(analysis[1])
+        self.function_defs.append(source)
+        self.instances.append((function_ast, compile_name, source, dependencies))
 
     def visit_bin_op(self, node: 'BinaryOpNode', context=None):
         if node.transformed:
+            if native_type := self.native_operand_type(node, context):
+                # 原生类型的运算不经过 trait 函数，直接使用 Python 的运算符
+                LOGGER.info("use native operator '%s' for %s", node.op, native_type)
+                return f"({node.left.accept(self, context)} {node.op} {node.right.accept(self, context)})"
             return node.transformed.accept(self, context)
         left = node.left.accept(self)
         right = node.right.accept(self)
@@ -40,10 +83,10 @@ class EvalVisitor(Visitor):
 
     def visit_lit(self, node: 'LiteralNode', context=None):
         match node.literal_type.lower():
-            case "float": return f"meta_manager.create_object('Float', {float(node.val)})"
-            case "string": return f"meta_manager.create_object('String', '{node.val[1: -1]}')"
-            case "int": return f"meta_manager.create_object('Int', {int(node.val)})"
-            case "bool": return f"meta_manager.create_object('Bool', {node.val == 'true'})"
+            case "float": return repr(float(node.val))
+            case "string": return f"'{node.val[1: -1]}'"
+            case "int": return repr(int(node.val))
+            case "bool": return repr(node.val == 'true')
             case _: return node.val
 
     def visit_var(self, node: 'VarNode', context=None):
@@ -53,16 +96,40 @@ class EvalVisitor(Visitor):
         res = "\n".join([utils.indent(stmt.accept(self, context), 1)   for stmt in node.stmts] )
         return res
 
+    def native_operand_type(self, node: 'BinaryOpNode', context: Optional[TypeContext]) -> Optional[str]:
+        """
+        运算符被转换为 trait 函数调用(例如 a + b 转换为 a.add(b))，并且静态分派到原生类型的 impl 时返回该原生类型
+        """
+        call = node.transformed
+        if not isinstance(call, FunctionCallNode) or call.dyn_dispatch or not call.call_ref or not call.call_ref.association_type:
+            return None
+        target = type_utils.bind_type(call.call_ref.association_type, context.type_binds if context else {})
+        if TypeVar.is_a_var(target) or target.name not in NATIVE_OPERATOR_TYPES.get(node.op, ()):
+            return None
+        return target.name
+
     def _current_context(self) -> TypeContext:
         return self.type_contexts[-1]
 
     def visit_function_call(self, node: 'FunctionCallNode', context: TypeContext=None):
+        context = context or TypeContext()
+        target = self.resolve_call(node, context)
+        args = [str(arg.accept(self, target.context)) for arg in node.args]
+        if target.receiver:
+            args.insert(0, target.receiver.accept(self, target.context))
+        function_call_source = target.name or node.call_source.accept(self, context)
+        return f"{function_call_source}({','.join(args)})"
+
+    def resolve_call(self, node: 'FunctionCallNode', context: TypeContext) -> CallTarget:
+        """
+        生成被调用的函数(单态化、trait 实现以及 dyn 对象需要的函数)，并返回调用的目标，
+        代码生成的后端只需要按照 CallTarget 生成调用
+        """
         # 如果这个函数是某个 trait 的实现
         trait_name = ""
-        context = context or TypeContext()
-        function_call_source = node.call_source.accept(self, context)
+        call_source_name = node.call_source.identifier.string if isinstance(node.call_source, VarNode) else None
         current_context = context
-        LOGGER.info("start to visit function call %s", function_call_source)
+        LOGGER.info("start to visit function call %s", node.call_ref.name)
         #LOGGER.info("start to visit function call: %s, %s, %s", node.call_ref.name, node.call_ref.association_trait, node.call_ref.association_type)
         source_function_name = node.call_ref.name
         """
@@ -85,7 +152,7 @@ class EvalVisitor(Visitor):
 
         if node.origin_call_ref:
             for arg_define_type, arg in zip(node.origin_call_ref.args, node.args):
-                if TypeVar.is_a_var(arg_define_type) and arg.expr_type.is_primitive_type:
+                if TypeVar.is_a_var(arg_define_type) and not TypeVar.is_a_var(arg.expr_type):
                     self.create_dyn_object(arg.expr_type, arg_define_type.constraints, bind_binds)
 
         if node.call_ref.association_trait:
@@ -119,63 +186,37 @@ class EvalVisitor(Visitor):
             trait_name = type_utils.get_type_id(trait)
             target = type_utils.bind_type(node.call_ref.association_type, current_context.type_binds)
 
+            arg_context = TypeContext(type_binds=bind_binds)
+            if isinstance(node.call_source, AttributeNode) and (node.dyn_dispatch or TypeVar.is_a_var(target)):
+                # 动态分派通过调用点的内联缓存查找函数，实际调用的函数在创建 dyn 对象时生成(见 create_dyn_object)
+                call_site = self.meta_manager.create_call_site(source_function_name, trait_name)
+                return CallTarget(call_site, node.call_source.data, arg_context)
+
             # 编译完成之后的名字，例如:
             compile_name = type_utils.get_trait_function_name(trait, target, source_function_name)
-            if compile_name not in self.defined_functions:
-                self.function_defs.append(self.visit_function_def(node.define_ast, TypeContext(trait = node.call_ref.association_trait, type_binds=bind_binds, function_name=compile_name, return_type=func.return_type)))
-            self.meta_manager.get_or_create_meta(type_utils.get_type_id(target)).vtable[source_function_name][type_utils.get_type_id(trait)] = CodeFunctionObject(lambda *args: eval(compile_name, self.meta_manager.globals)(*args))
+            self.define_function(node.call_ref.association_ast, node.define_ast, compile_name, lambda: self.visit_function_def(node.define_ast, TypeContext(trait = node.call_ref.association_trait, type_binds=bind_binds, function_name=compile_name, return_type=func.return_type)))
+            self.meta_manager.get_or_create_meta(type_utils.get_type_id(target)).vtable[source_function_name][type_utils.get_type_id(trait)] = self.meta_manager.function_handle(compile_name)
+            if isinstance(node.call_source, AttributeNode):
+                # 零开销抽象，静态分派时直接调用编译后的函数，例如 1.into() 实际上是 Into_for_Int___into(1)
+                # 省去查找 vtable 的开销，并且原生类型也不需要装箱
+                LOGGER.info("devirtualize %s to %s", source_function_name, compile_name)
+                return CallTarget(compile_name, node.call_source.data, arg_context)
+            return CallTarget(None, None, arg_context)
         elif node.type_binds:
-            compile_name = node.call_source.accept(self) + "___" + "___".join([str(type_utils.get_type_id(x)) for x in bind_binds.values()])
-            if compile_name not in self.defined_functions:
-                self.function_defs.append(self.visit_function_def(node.define_ast, TypeContext(type_binds=bind_binds, function_name=compile_name, return_type=node.call_ref.return_type)))
-                self.defined_functions.add(compile_name)
-            function_call_source = compile_name
+            compile_name = call_source_name + "___" + "___".join([str(type_utils.get_type_id(x)) for x in bind_binds.values()])
+            self.define_function(node.call_ref.association_ast, node.define_ast, compile_name, lambda: self.visit_function_def(node.define_ast, TypeContext(type_binds=bind_binds, function_name=compile_name, return_type=node.call_ref.return_type)))
         else:
-            compile_name = node.call_source.accept(self)
-            if compile_name not in self.defined_functions:
-                self.function_defs.append(self.visit_function_def(node.define_ast, TypeContext(function_name=compile_name, return_type=node.call_ref.return_type)))
-                self.defined_functions.add(compile_name)
-            function_call_source = compile_name
-
-        arg_str = "(" + ",".join([str(arg.accept(self, TypeContext(type_binds=bind_binds))) for arg in node.args]) + ")"
-        #tmp_var = f"tmp_var_{str(uuid4()).replace('-', '_')}"
-        if isinstance(node.call_source, AttributeNode) and node.call_ref.association_trait:
-            data = node.call_source.data.accept(self, TypeContext(type_binds=bind_binds))
-            #data = f"{tmp_var} = {node.call_source.data.accept(self, TypeContext(type_binds=bind_binds))}"
-            # 零开销抽象，如果是 primitive type 调用方法且不是动态分派，则会进行转换，这里不用对 primitive 进行包装
-            # 例如 1.into，实际上是 into(1)，可以省去装箱开箱的成本
-            # if node.call_ref.association_type.is_primitive_type and not node.dyn_dispatch:
-            #     function_call_source = f"meta_manager.get_or_create_meta('{node.call_ref.association_type.name}').vtable['{source_function_name}']['{trait_name}']"
-            #     arg_str = f"({data},{arg_str[1: -1]})"
-            # else:
-            #     arg_str = f".get('{trait_name}')({data},{arg_str[1: -1]})"
-
-            if "." in function_call_source:
-                parts = function_call_source.split(".")
-                call_data = ".".join(parts[0:-1])
-                attr = parts[-1]
-                tmp_var = f"tmp_var_{str(uuid4()).replace('-', '_')}"
-            else:
-                tmp_var = f"tmp_var_{str(uuid4()).replace('-', '_')}"
-                attr = ""
-                call_data = function_call_source
-            if node.call_ref.association_type.is_primitive_type and not node.dyn_dispatch:
-                function_call_source = f"meta_manager.get_or_create_meta('{node.call_ref.association_type.name}').vtable['{source_function_name}']['{trait_name}']"
-                arg_str = f"({data},{arg_str[1: -1]})"
-            elif attr:
-                return f"({tmp_var}:={call_data}, {tmp_var}.{attr}.get('{trait_name}')({call_data},{arg_str[1: -1]}))[-1]"
-            else:
-                return f"({tmp_var}:={call_data}, {tmp_var}.get('{trait_name}')({tmp_var},{arg_str[1: -1]}))[-1]"
-        return f"{function_call_source}{arg_str}"
-
-
+            compile_name = call_source_name
+            if compile_name is not None:
+                self.define_function(node.call_ref.association_ast, node.define_ast, compile_name, lambda: self.visit_function_def(node.define_ast, TypeContext(function_name=compile_name, return_type=node.call_ref.return_type)))
+        return CallTarget(compile_name, None, TypeContext(type_binds=bind_binds))
 
     def visit_if(self, node: 'IfStatement', context=None):
         if_branch = node.branches[0]
         elif_branch = node.branches[1:]
         else_branch = node.else_branch
         res = [
-            f"if is_true({if_branch[0].accept(self, context)}):",
+            f"if {if_branch[0].accept(self, context)}:",
             if_branch[1].accept(self, context)
        ]
 
@@ -243,12 +284,11 @@ class EvalVisitor(Visitor):
                     self.create_dyn_object(bind_type, define_type.constraints, binds)
                 for func_name, func in impl.functions.items():
                     compile_name = type_utils.get_trait_function_name(trait, target_type, func_name)
-                    if compile_name not in self.defined_functions:
-                        type_context = TypeContext(trait=target_trait, function_name=compile_name, type_binds=binds,
-                                                   return_type=func.return_type)
-                        self.function_defs.append(func.association_ast.accept(self, type_context))
+                    type_context = TypeContext(trait=target_trait, function_name=compile_name, type_binds=binds,
+                                               return_type=func.return_type)
+                    self.define_function(func.association_ast, func.association_ast, compile_name, lambda: func.association_ast.accept(self, type_context))
                     self.meta_manager.get_or_create_meta(type_utils.get_type_id(target_type)).vtable[func_name][
-                        type_utils.get_type_id(trait)] = NameFunctionObject(compile_name, self.meta_manager.globals)
+                        type_utils.get_type_id(trait)] = self.meta_manager.function_handle(compile_name)
 
     def visit_return(self, node: 'ReturnNode', context: TypeContext=None):
         """
@@ -262,15 +302,15 @@ class EvalVisitor(Visitor):
         :param context:
         :return:
         """
+        self.prepare_return(node, context)
+        return f"return {node.expr.accept(self, context)}"
+
+    def prepare_return(self, node: 'ReturnNode', context: TypeContext):
         expr_type = node.expr_type
         if context.return_type and TypeVar.is_dynamic_trait(context.return_type):
             # 传递类型绑定，获取 return 真实的类型
             target_type = type_utils.bind_type(expr_type, context.type_binds)
             self.create_dyn_object(target_type, context.return_type.constraints, context.type_binds)
-            # if target_type.is_primitive_type:
-            #     vtable_key = type_utils.get_type_id(expr_type)
-            #     return f"""return meta_manager.create_object('{vtable_key}', {node.expr.accept(self, context)})"""
-        return f"return {node.expr.accept(self, context)}"
 
     def visit_identifier(self, node: 'IdNode', context=None):
         pass
@@ -281,7 +321,10 @@ class EvalVisitor(Visitor):
     def visit_attribute(self, node: 'AttributeNode', context=None):
         # tmp_var = f"tmp_var_{str(uuid4())}"
         # data = f"{tmp_var} {node.data.accept(self, context)}"
-        return f"{node.data.accept(self, context)}.attr('{node.attr.string}')"
+        if node.is_field:
+            # struct 的字段直接读取 slot
+            return f"{node.data.accept(self, context)}.{field_slot(node.attr.string)}"
+        return f"get_attr({node.data.accept(self, context)}, '{node.attr.string}')"
 
     def visit_trait_function(self, node: 'TraitFunctionNode', context=None):
         super().visit_trait_function(node)
@@ -308,15 +351,27 @@ class EvalVisitor(Visitor):
         super().visit_type_constraint(node)
 
     def visit_struct_init(self, node: 'StructInitNode', context=None):
+        class_name, keywords = self.struct_layout(node, context)
+        values = [assign_expr.accept(self, context) for _, assign_expr in node.body]
+        if keywords is None:
+            return f"{class_name}({', '.join(values)})"
+        return f"{class_name}({', '.join(f'{keyword}={value}' for keyword, value in zip(keywords, values))})"
+
+    def struct_layout(self, node: 'StructInitNode', context: TypeContext) -> Tuple[str, Optional[List[str]]]:
+        """
+        返回 struct 对应的类在全局变量中的名字，以及按照名字传参时每个初始化表达式对应的参数名。
+        初始化的顺序与定义一致时按位置传参，参数名为 None；否则按照名字传参，保持表达式的求值顺序
+        """
         LOGGER.info("visit struct init: %s, %s", context.type_binds, node.type_name.name)
         if node.type_ref.parameters:
             type_ref = type_utils.bind_type(node.type_ref, context.type_binds)
             vtable_key = type_utils.get_type_id(type_ref)
-            LOGGER.info("vtable key: %s", vtable_key)
-            self.meta_manager.get_or_create_meta(vtable_key)
         else:
             vtable_key = node.type_name.name
-            LOGGER.info("vtable key: %s", vtable_key)
-            self.meta_manager.get_or_create_meta(vtable_key)
-        data_code = "{" + ", ".join([f"'{var.string}': {assign_expr.accept(self, context)}" for var, assign_expr in node.body]) + "}"
-        return f"""meta_manager.create_object('{vtable_key}', {data_code})"""
\ No newline at end of file
+        LOGGER.info("vtable key: %s", vtable_key)
+        init_fields = [var.string for var, _ in node.body]
+        fields = list(type_utils.get_struct_ref(node.type_ref, node.scope.child).fields)
+        class_name = self.meta_manager.struct_class(vtable_key, fields)
+        if init_fields == fields:
+            return class_name, None
+        return class_name, [field_slot(name) for name in init_fields]
@@ -1,5 +1,5 @@
 
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from parser.symbol_type import StructTypeRef, TraitTypeRef, FunctionTypeRef, TypeRef, TraitImpl, TraitRef, \
     PrimitiveType, \
     StructType, MultiResolvedFunction, TypeVar, ResolvedFunctionRef, ResolvedFunction
@@ -9,7 +9,7 @@ from parser.symbol import TypeSymbol, TraitSymbol, GenericParamSymbol, FunctionS
 from parser.visitor import utils, type_binder
 from parser.visitor.type_binder import TypeBinder
 from parser.visitor.utils import to_lookup, get_type_name
-from copy import copy, deepcopy
+from copy import copy
 from itertools import chain
 from dataclasses import dataclass, field
 from utils.logger import LOGGER
@@ -265,6 +265,48 @@ class TypeDetailVisitor(Visitor):
         self.trait_impls = trait_impls
         self.expect_types: List[TypeRef] = []
         self.vtable: Dict[str, FunctionDefNode] = {}
+        # 单态化的结果，key 为 (函数定义, 类型绑定)，同样的实例化只复制并分析一次，所有调用处共享
+        self.instances: Dict[tuple, Tuple[FunctionDefNode, FunctionDefNode]] = {}
+        # 分析每个函数时查找过的 impl，key 为函数语法树的 id，值为 (语法树, 依赖)，传给 EvalVisitor 用于 InstanceCache
+        self.dependencies: Dict[int, Tuple[FunctionDefNode, dict]] = {}
+
+    @staticmethod
+    def instance_key(function_ast: FunctionDefNode, type_binds: Optional[dict], binds: Optional[dict]) -> Optional[tuple]:
+        try:
+            return (id(function_ast),
+                    type_binds if type_binds is None else frozenset(type_binds.items()),
+                    binds if binds is None else frozenset(binds.items()))
+        except TypeError:
+            # 绑定中含有无法 hash 的类型(例如函数类型)时不共享
+            return None
+
+    def instantiate(self, function_ast: FunctionDefNode, type_binds: Optional[dict] = None, binds: Optional[dict] = None) -> FunctionDefNode:
+        """
+        获取函数在给定类型绑定下的语法树。type_binds 为调用处求解的类型变量，binds 为分析函数体时的全部类型绑定，
+        binds 为 None 时(动态分派)只复制，不进行分析
+        """
+        key = self.instance_key(function_ast, type_binds, binds)
+        instance = self.instances.get(key)
+        if instance is not None and instance[0] is function_ast:
+            return instance[1]
+        define_ast = utils.copy_function_ast(function_ast)
+        if key is None:
+            return define_ast
+        # 在分析之前加入，递归调用自身时直接使用正在分析的语法树
+        self.instances[key] = (function_ast, define_ast)
+        if binds is None:
+            return define_ast
+        try:
+            scope = define_ast.scope.child
+            new_symbols = {}
+            for var_name, var_symbol in scope.symbols.items():
+                new_symbols[var_name] = VarSymbol(var_name, utils.bind_type(var_symbol.type_ref, type_binds))
+            scope.symbols = new_symbols
+            define_ast.accept(self, TypeContext(type_binds=binds))
+        except BaseException:
+            del self.instances[key]
+            raise
+        return define_ast
 
 
     def visit_type_instance(self, node: 'TypeInstance', context=None) -> TypeRef|TypeVar:
@@ -345,6 +387,14 @@ class TypeDetailVisitor(Visitor):
         return FunctionTypeRef(name=None, parameters=parameters, return_type=node.return_type.accept(self))
 
     def visit_function_def(self, node: 'FunctionDefNode', context: TypeContext=None):
+        with self.trait_impls.record() as dependencies:
+            self._visit_function_def(node, context)
+        analysis = self.dependencies.get(id(node))
+        if analysis is not None and analysis[0] is node:
+            dependencies.update(analysis[1])
+        self.dependencies[id(node)] = (node, dependencies)
+
+    def _visit_function_def(self, node: 'FunctionDefNode', context: TypeContext=None):
         if not context:
             # 第一次对没有泛型参数/或者有泛型参数的模板进行编译
             symbol = self.scope_manager.lookup_var(node.name.string)
@@ -468,18 +518,18 @@ class TypeDetailVisitor(Visitor):
             bind_function = type_binder.bind(function_define)
 
             node.type_binds = type_binder.get_binds()
-            node.define_ast = deepcopy(function_define.association_ast)
             node.call_ref = bind_function
 
-            # 如果不是动态分派则进行单态化
-            if not node.dyn_dispatch and node.define_ast:
-                scope = node.define_ast.scope.child
-                new_symbols = {}
-                for var_name, var_symbol in scope.symbols.items():
-                    new_symbols[var_name] = VarSymbol(var_name, utils.bind_type(var_symbol.type_ref, node.type_binds))
-                scope.symbols = new_symbols
-                node.define_ast and node.define_ast.accept(self, TypeContext(type_binds=type_binder.get_binds() | type_context.type_binds | function_define.binds))
-            return utils.de_ref(bind_function.return_type, node.scope)
+            if function_define.association_ast:
+                # 如果不是动态分派则进行单态化
+                if node.dyn_dispatch:
+                    node.define_ast = self.instantiate(function_define.association_ast)
+                else:
+                    node.define_ast = self.instantiate(function_define.association_ast, node.type_binds,
+                                                       type_binder.get_binds() | type_context.type_binds | function_define.binds)
+            else:
+                node.define_ast = None
+            return bind_function.return_type
         elif isinstance(function_define, MultiResolvedFunction):
             """
                 # 如果一个 struct 实现了多个 trait，比如:
@@ -538,7 +588,7 @@ class TypeDetailVisitor(Visitor):
                     final_res, final_builder = filter_by_args[0]
                     node.type_binds = final_builder.get_binds()
                     node.call_ref = final_builder.bind(final_res)
-                    return utils.de_ref(node.call_ref.return_type, node.scope)
+                    return node.call_ref.return_type
                 else:
                     raise TypeError(f"multiple func match, '{function_define.functions[0].name}' in {traits}")
             else:
@@ -546,7 +596,7 @@ class TypeDetailVisitor(Visitor):
                 node.type_binds = final_builder.get_binds()
                 node.define_ast = final_res.association_ast
                 node.call_ref = final_builder.bind(final_res)
-                return utils.de_ref(node.call_ref.return_type, node.scope)
+                return node.call_ref.return_type
         else:
             raise TypeError(f"{function_define.name} is not callable")
 
@@ -642,21 +692,19 @@ class TypeDetailVisitor(Visitor):
             type_binder.resolve(defined_type, expr_type)
 
         type_ref = type_binder.bind(TypeRef(node.type_name.name, symbol.parameters))
-        res = utils.de_ref(type_ref, node.scope.child)
-        if context.type_binds:
-            LOGGER.info("deref %s to %s when init struct", type_ref, res)
-        node.type_ref = res
-        return res
+        node.type_ref = type_ref
+        return type_ref
 
     def visit_attribute(self, node: 'AttributeNode', context=None):
         context = context or TypeContext()
         type_ref: TypeRef|TypeVar = node.data.accept(self, context)
         type_ref = utils.bind_type(type_ref, context.type_binds)
+        struct_ref = None
         if not TypeVar.is_a_var(type_ref):
             symbol = self.scope_manager.lookup_type(type_ref.name)
             if isinstance(symbol.define, StructTypeRef):
-                type_ref = utils.de_ref(type_ref, node.scope)
-                LOGGER.info("deref struct type '%s' to %s", type_ref.name, type_ref.struct_ref.fields)
+                struct_ref = utils.get_struct_ref(type_ref, node.scope)
+                LOGGER.info("deref struct type '%s' to %s", type_ref.name, struct_ref.fields)
         LOGGER.info("visit attribute '%s', source type: %s", node.attr.string, type_ref)
         function_hits = []
         """
@@ -680,8 +728,9 @@ class TypeDetailVisitor(Visitor):
             else:
                 raise TypeError(f"attribute not available for generic type without constraint")
         # 先试图从 struct 中寻找属性，如果找不到就从 trait 实现中寻找
-        elif hasattr(type_ref, 'struct_ref') and type_ref.struct_ref and node.attr.string in type_ref.struct_ref.fields:
-            return type_ref.struct_ref.fields[node.attr.string]
+        elif struct_ref and node.attr.string in struct_ref.fields:
+            node.is_field = True
+            return struct_ref.fields[node.attr.string]
         else:
             LOGGER.info("try to find function according to type %s", type_ref)
             impl_traits = self.trait_impls.get_impl_by_type(type_ref)
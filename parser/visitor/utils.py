@@ -2,7 +2,7 @@ import copy
 from typing import List, Callable, Dict, Iterable, Tuple
 
 from parser.node import TypeInstance,TypeConstraint, TypeVarNode, TraitFunctionNode, FunctionDefNode, TraitConstraintNode
-from parser.symbol_type import TraitRef, TypeRef, StructTypeRef, PrimitiveType, FunctionTypeRef, TypeVar, TraitImpl, \
+from parser.symbol_type import TraitRef, TypeRef, StructTypeRef, FunctionTypeRef, TypeVar, TraitImpl, \
     ResolvedFunctionRef
 from parser.visitor.type_binder import TypeBinder
 from parser.visitor.visitor import Visitor
@@ -23,9 +23,7 @@ def get_type_ref(ast: 'TypeInstance', type_var_names: Dict[str, TypeVar|TypeRef]
             return TypeVar.create("ANON_TYPE_ARG_VAR", [get_trait_ref(trait, type_var_names) for trait in type_instance.traits])
         if type_var := type_var_names.get(type_instance.name):
             return type_var
-        ref = TypeRef(type_instance.name)
-        ref.parameters = [helper(param) for param in type_instance.parameters]
-        return ref
+        return TypeRef(type_instance.name, [helper(param) for param in type_instance.parameters])
     return helper(ast)
 
 def get_return_type_ref(ast: 'TypeInstance', type_var_names: Dict[str, TypeRef]=None, function_name:str=None):
@@ -49,9 +47,7 @@ def get_function_ref(trait_function_node: TraitFunctionNode | FunctionDefNode, t
     )
 
 def get_trait_ref(ast: 'TypeConstraint', type_var_names: Dict[str, TypeRef|TypeVar]=None) -> TraitRef:
-    trait_ref = TraitRef(ast.trait.name)
-    trait_ref.parameters = [get_type_ref(param, type_var_names) for param in ast.parameters]
-    return trait_ref
+    return TraitRef(ast.trait.name, [get_type_ref(param, type_var_names) for param in ast.parameters])
 
 
 def get_type_ref_from_type_var(ast: 'TypeVarNode') -> TypeVar:
@@ -97,27 +93,43 @@ def to_lookup[K, V](obj: List[K], key_mapper: Callable[[K], V]=identity) -> Dict
 def mapper[K, V](iterable: Iterable[K], _map:Callable[[K], V]) -> List[V]:
     return [_map(x) for x in iterable]
 
-def de_ref(type_ref: TypeRef|TypeVar, scope: Scope) -> TypeRef|TypeVar:
-    if isinstance(type_ref, TypeVar):
-        return type_ref
-    if type_ref.is_primitive_type or isinstance(type_ref, PrimitiveType):
-        return type_ref
-    else:
-        struct_type_ref = scope.lookup_type(type_ref.name).define
-        type_binds = {btype: dtype for btype, dtype in zip(struct_type_ref.parameters, type_ref.parameters)}
-        type_ref.struct_ref = StructTypeRef(type_ref.name, fields={name: bind_type(field, type_binds) for name, field in struct_type_ref.fields.items()})
-        return type_ref
-
-
-def get_struct_ref(ref: TypeRef, scope: Scope) -> TypeRef:
-    if not ref.struct_ref:
-        symbol = scope.lookup_type(ref.name)
-        assert symbol
-        assert symbol.define
-        if not isinstance(symbol.define, StructTypeRef):
-            raise TypeError(f"Type {ref.name} is not a struct")
-        ref.struct_ref = symbol.define
-    return ref
+def get_struct_ref(ref: TypeRef, scope: Scope) -> StructTypeRef:
+    """
+    struct 类型在作用域中的字段布局(类型参数已绑定)，缓存在定义该 struct 的作用域中。
+    驻留的 TypeRef 是不可变的，同名的 struct 在不同作用域中可能有不同的定义，因此布局不能保存在 TypeRef 上
+    """
+    define_scope = scope.lookup_type_scope(ref.name)
+    assert define_scope
+    symbol = define_scope.lookup_type(ref.name)
+    assert symbol.define
+    if not isinstance(symbol.define, StructTypeRef):
+        raise TypeError(f"Type {ref.name} is not a struct")
+    cached = define_scope.struct_layouts.get(ref)
+    # struct 重新定义之后旧的布局不再有效
+    if cached is not None and cached[0] is symbol.define:
+        return cached[1]
+    type_binds = {btype: dtype for btype, dtype in zip(symbol.define.parameters, ref.parameters)}
+    layout = StructTypeRef(ref.name, fields={name: bind_type(field, type_binds) for name, field in symbol.define.fields.items()})
+    define_scope.struct_layouts[ref] = (symbol.define, layout)
+    return layout
+
+def copy_function_ast(function_ast: FunctionDefNode) -> FunctionDefNode:
+    """
+    复制函数的语法树用于单态化，复制的语法树中的作用域以及类型信息可以单独修改。
+    函数定义所在作用域的外层作用域直接共享；所在作用域只复制一层，其中的符号仍然共享，
+    否则每次复制都会经过全局作用域复制整个程序的语法树
+    """
+    memo = {}
+    outer = function_ast.scope
+    if outer is not None:
+        parent = outer.parent
+        while parent is not None:
+            memo[id(parent)] = parent
+            parent = parent.parent
+        shared = copy.copy(outer)
+        memo[id(outer)] = shared
+        shared.child = copy.deepcopy(outer.child, memo)
+    return copy.deepcopy(function_ast, memo)
 
 def bind_type[T: TypeRef|FunctionTypeRef|TraitRef|ResolvedFunctionRef](type_ref: T, binds: Dict[TypeVar, TypeRef]) -> T:
     """
@@ -1,7 +1,7 @@
 from parser.scope import ScopeManager
 from parser.symbol import FunctionSymbol
 from parser.symbol_type import FunctionTypeRef, TypeRef
-from runtime.data import DataObject, MetaManager
+from runtime.data import MetaManager
 
 class NativeManager:
 
@@ -24,20 +24,30 @@ class NativeManager:
                     'input_types': input_types,
                     'output_type': output_type
                 }
-                self._scopeManager.add_symbol(
-                    FunctionSymbol(
-                        name,
-                        FunctionTypeRef(
-                            name,
-                            args=[TypeRef(x) for x in input_types],
-                            return_type=TypeRef(output_type)
-                        )
-                    )
-                )
+                self._define(name, input_types, output_type)
             return func
 
         return decorator
 
+    def _define(self, name, input_types, output_type):
+        self._scopeManager.add_symbol(
+            FunctionSymbol(
+                name,
+                FunctionTypeRef(
+                    name,
+                    args=[TypeRef(x) for x in input_types],
+                    return_type=TypeRef(output_type)
+                )
+            )
+        )
+
+    def define_functions(self):
+        """
+        在重置之后的作用域中重新定义所有已注册的原生函数
+        """
+        for name, func in self._native_functions.items():
+            self._define(name, func['input_types'], func['output_type'])
+
     @property
     def scope_manager(self):
         return self._scopeManager
@@ -53,6 +63,9 @@ class NativeManager:
 NATIVE_MANAGER = NativeManager()
 
 class NativeFunction:
+    """
+    原生函数，Int/Float/Bool/String 在运行时直接使用 Python 的 int/float/bool/str 表示
+    """
     def __init__(self, meta_manager: MetaManager):
         self._metaManager = meta_manager
 
@@ -62,13 +75,7 @@ class NativeFunction:
         ('string_to_float', ('String',),  'Float'),
     ])
     def to_float(self, obj):
-        if isinstance(obj, DataObject):
-            return DataObject(
-                data=float(obj.data),
-                meta=self._metaManager.get_or_create_meta('Float')
-            )
-        else:
-            return float(obj)
+        return float(obj)
 
     @NATIVE_MANAGER.register([
         ('int_to_string', ('Int',), 'String'),
@@ -76,13 +83,7 @@ class NativeFunction:
         ('bool_to_string', ('Bool',), 'String'),
     ])
     def to_string(self, obj):
-        if isinstance(obj, DataObject):
-            return DataObject(
-                data=str(obj.data),
-                meta=self._metaManager.get_or_create_meta('String')
-            )
-        else:
-            return str(obj)
+        return str(obj)
 
     @NATIVE_MANAGER.register([
         ('add_int', ('Int', 'Int'), 'Int'),
@@ -90,57 +91,40 @@ class NativeFunction:
         ('add_string', ('String', 'String'), 'String'),
     ])
     def add(self, l, r):
-        return DataObject(
-            data=l.data + r.data,
-            meta=l.meta
-        )
+        return l + r
 
     @NATIVE_MANAGER.register([
         ('sub_int', ('Int', 'Int'), 'Int'),
         ('sub_float', ('Float', 'Float'), 'Float')
     ])
     def sub(self, l, r):
-        return DataObject(
-            data=l.data - r.data,
-            meta=l.meta
-        )
+        return l - r
 
     @NATIVE_MANAGER.register([
         ('div_int', ('Int', 'Int'), 'Int'),
         ('div_float', ('Float', 'Float'), 'Float')
     ])
     def div(self, l, r):
-        return DataObject(
-            data=l.data / r.data,
-            meta=l.meta
-        )
+        return l / r
 
     @NATIVE_MANAGER.register([
         ('mul_int', ('Int', 'Int'), 'Int'),
         ('mul_float', ('Float', 'Float'), 'Float')
     ])
     def mul(self, l, r):
-        return DataObject(
-            data=l.data * r.data,
-            meta=l.meta
-        )
+        return l * r
+
     @NATIVE_MANAGER.register([
         ('logic_or', ('Bool', 'Bool'), 'Bool'),
     ])
     def _or(self, l, r):
-        return DataObject(
-            data=l.data or r.data,
-            meta=l.meta
-        )
+        return l or r
 
     @NATIVE_MANAGER.register([
         ('logic_and', ('Bool', 'Bool'), 'Bool'),
     ])
     def _and(self, l, r):
-        return DataObject(
-            data=l.data and r.data,
-            meta=l.meta
-        )
+        return l and r
 
     @NATIVE_MANAGER.register([
         ('lt_int', ('Int', 'Int'), 'Bool'),
@@ -148,10 +132,7 @@ class NativeFunction:
         ('lt_string', ('String', 'String'), 'Bool'),
     ])
     def lt(self, l, r):
-        return DataObject(
-            l.data < r.data,
-            meta=self._metaManager.get_or_create_meta('Bool')
-        )
+        return l < r
 
     @NATIVE_MANAGER.register([
         ('lte_int', ('Int', 'Int'), 'Bool'),
@@ -159,10 +140,7 @@ class NativeFunction:
         ('lte_string', ('String', 'String'), 'Bool'),
     ])
     def lte(self, l, r):
-        return DataObject(
-            l.data <= r.data,
-            meta=self._metaManager.get_or_create_meta('Bool')
-        )
+        return l <= r
 
     @NATIVE_MANAGER.register([
         ('gt_int', ('Int', 'Int'), 'Bool'),
@@ -170,10 +148,7 @@ class NativeFunction:
         ('gt_string', ('String', 'String'), 'Bool'),
     ])
     def gt(self, l, r):
-        return DataObject(
-            l.data > r.data,
-            meta=self._metaManager.get_or_create_meta('Bool')
-        )
+        return l > r
 
     @NATIVE_MANAGER.register([
         ('gte_int', ('Int', 'Int'), 'Bool'),
@@ -181,10 +156,7 @@ class NativeFunction:
         ('gte_string', ('String', 'String'), 'Bool'),
     ])
     def gte(self, l, r):
-        return  DataObject(
-            l.data >= r.data,
-            meta=self._metaManager.get_or_create_meta('Bool')
-        )
+        return l >= r
 
     @NATIVE_MANAGER.register([
         ('eq_int', ('Int', 'Int'), 'Bool'),
@@ -193,18 +165,13 @@ class NativeFunction:
         ('eq_string', ('String', 'String'), 'Bool'),
     ])
     def eq(self, l, r):
-        return DataObject(
-            l.data == r.data,
-            meta=self._metaManager.get_or_create_meta('Bool')
-        )
+        return l == r
 
     @NATIVE_MANAGER.register([
         ('echo', ('String', ), 'Unit'),
     ])
     def echo(self, obj):
-        if isinstance(obj, DataObject) and isinstance(obj.data, str):
-            print(obj.data)
-        elif isinstance(obj, str):
+        if isinstance(obj, str):
             print(obj)
         else:
             raise RuntimeError(f"can not print obj {type(obj)}")
@@ -220,7 +187,7 @@ class NativeFunction:
         ('is_true', ('Bool',), 'Bool'),
     ])
     def is_true(self, obj):
-        return obj.data is True
+        return obj is True
 
 
     # def create_data_object(self, obj, wrap_by: str):
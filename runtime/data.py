@@ -1,7 +1,8 @@
 import dataclasses
+import itertools
 from abc import abstractmethod
 from collections import defaultdict
-from typing import Dict, Any, Callable, DefaultDict
+from typing import Dict, Any, Callable, DefaultDict, Iterable, Tuple, Type
 from dataclasses import field
 from parser.symbol_type import TypeRef
 
@@ -26,13 +27,30 @@ class CodeFunctionObject(FunctionObject):
 
 
 class NameFunctionObject(FunctionObject):
+    """
+    按名字延迟绑定的函数，生成的函数 exec 到 globals 之后通过 bind 解析一次，之后直接调用。
+    同名函数被重新定义之后需要再次 bind (见 MetaManager.bind_functions)
+    """
+    __slots__ = ("function_name", "globals", "function")
 
     def call(self, *args, **kwargs):
-        return eval(self.function_name, self.globals)(*args, **kwargs)
+        function = self.function
+        if function is None:
+            function = self.bind()
+        return function(*args, **kwargs)
+
+    __call__ = call
+
+    def bind(self) -> Callable:
+        self.function = self.globals.get(self.function_name)
+        if self.function is None:
+            raise NameError(f"function {self.function_name} is not defined")
+        return self.function
 
     def __init__(self, function_name: str, globals: Dict[str, Any]):
         self.function_name = function_name
         self.globals = globals
+        self.function = None
 
 @dataclasses.dataclass(frozen=True)
 class TypeName:
@@ -63,6 +81,8 @@ class DataMeta:
 
 
 class DataObject:
+    __slots__ = ("data", "meta")
+
     def __init__(self, data: Dict[str, Any]|Any, meta: DataMeta):
         self.data = data
         self.meta: DataMeta = meta
@@ -75,11 +95,79 @@ class DataObject:
             return self.meta.vtable[name]
         return self.data.get(name)
 
+# struct 的字段保存在 slot 中，加上前缀避免与 data、meta 等属性以及 Python 的关键字冲突
+STRUCT_FIELD_PREFIX = "f_"
+
+
+def field_slot(name: str) -> str:
+    return STRUCT_FIELD_PREFIX + name
+
+
+class StructObject(DataObject):
+    """
+    struct 实例的基类，每个 struct 类型在运行时生成一个子类(见 MetaManager.struct_class)，
+    字段按照 StructTypeRef.fields 的顺序保存在 __slots__ 中，meta 以及字段名是类属性
+    """
+    __slots__ = ()
+    meta: DataMeta = None
+    fields: Tuple[str, ...] = ()
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return {name: getattr(self, field_slot(name), None) for name in self.fields}
+
+    def attr(self, name: str) -> Any:
+        functions = self.meta.vtable.get(name)
+        if functions is not None:
+            return functions
+        return getattr(self, field_slot(name), None)
+
+
+# 原生类型在运行时不进行装箱，通过 Python 的类型找到对应的 meta
+PRIMITIVE_META_NAMES = {
+    bool: "Bool",
+    int: "Int",
+    float: "Float",
+    str: "String",
+}
+
+
+class InlineCache:
+    """
+    动态分派调用点的单态内联缓存，记录上一次调用的接收者类型(DataObject 的 meta 或者原生类型)以及查找到的函数，
+    接收者类型不变时跳过 vtable 查找
+    """
+    __slots__ = ("meta_manager", "name", "trait", "key", "target")
+
+    def __init__(self, meta_manager: 'MetaManager', name: str, trait: str):
+        self.meta_manager = meta_manager
+        self.name = name
+        self.trait = trait
+        self.key = None
+        self.target = None
+
+    def __call__(self, obj: Any, *args):
+        key = obj.meta if isinstance(obj, DataObject) else type(obj)
+        if key is not self.key:
+            self.target = self.meta_manager.get_attr(obj, self.name)[self.trait]
+            self.key = key
+        return self.target(obj, *args)
+
+
 class MetaManager:
 
     def __init__(self):
         self.metas: Dict[str, DataMeta] = {}
         self.globals = {}
+        self._call_sites = itertools.count()
+        # vtable 中使用的函数，以编译后的函数名为 key
+        self._functions: Dict[str, NameFunctionObject] = {}
+        self._struct_classes: Dict[str, Type[StructObject]] = {}
+
+    def get_attr(self, obj: Any, name: str) -> Any:
+        if isinstance(obj, DataObject):
+            return obj.attr(name)
+        return self.get_or_create_meta(PRIMITIVE_META_NAMES[type(obj)]).vtable[name]
 
     def create_object(self, name: str, data: Dict[str, Any]|str|int|float|bool) -> DataObject:
         meta = self.metas[name]
@@ -91,4 +179,59 @@ class MetaManager:
     def get_or_create_meta(self, name: str) -> DataMeta:
         if name not in self.metas:
             self.metas[name] = DataMeta(name)
-        return self.metas[name]
\ No newline at end of file
+        return self.metas[name]
+
+    def create_call_site(self, name: str, trait: str) -> str:
+        """
+        为生成的代码中的动态分派调用点创建内联缓存，返回其在全局变量中的名字
+        """
+        call_site = f"call_site_{next(self._call_sites)}"
+        self.globals[call_site] = InlineCache(self, name, trait)
+        return call_site
+
+    def function_handle(self, name: str) -> NameFunctionObject:
+        """
+        获取编译后函数的延迟绑定对象，同名的函数共享同一个对象
+        """
+        handle = self._functions.get(name)
+        if handle is None or handle.globals is not self.globals:
+            handle = self._functions[name] = NameFunctionObject(name, self.globals)
+        return handle
+
+    def bind_functions(self):
+        """
+        生成的函数 exec 之后调用，重新解析所有函数，被重新定义的函数也会绑定到新的定义
+        """
+        for name, handle in list(self._functions.items()):
+            if handle.globals is not self.globals:
+                # Interpreter.init 创建了新的全局变量
+                del self._functions[name]
+            elif name in self.globals:
+                handle.bind()
+
+    def struct_class(self, name: str, fields: Iterable[str]) -> str:
+        """
+        获取 struct 类型对应的类，构造函数按照字段的顺序接收参数，未初始化的字段为 None。
+        类定义在全局变量中，返回其名字
+        """
+        fields = tuple(fields)
+        meta = self.get_or_create_meta(name)
+        cls = self._struct_classes.get(name)
+        if cls is None or cls.meta is not meta or cls.fields != fields:
+            slots = tuple(field_slot(field) for field in fields)
+            source = "\n".join([
+                f"def __init__(self, {', '.join(f'{slot}=None' for slot in slots)}):",
+                *[f"    self.{slot} = {slot}" for slot in slots],
+                "    pass",
+            ])
+            namespace = {}
+            exec(source, namespace)
+            cls = self._struct_classes[name] = type(name, (StructObject,), {
+                "__slots__": slots,
+                "__init__": namespace["__init__"],
+                "meta": meta,
+                "fields": fields,
+            })
+        class_name = f"struct_{name}"
+        self.globals[class_name] = cls
+        return class_name
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from error.reporter import SourceCodeMaker
+from grammer import TOKENS
+from lexer.lexer import BaseLexer
+from parser.cache import AST_CACHE
+from parser.expr import parse_proc
+from parser.node import ProcNode
+
+
+def parse_source(source: str) -> ProcNode:
+    lexer = BaseLexer(TOKENS, SourceCodeMaker(source), source, ignore={"white_space", "comment"}, streaming=True)
+    return parse_proc(lexer)
+
+
+def parse_cached(source: str) -> ProcNode:
+    # 源码没有变化时直接从缓存中加载语法树，跳过词法分析和语法分析
+    return AST_CACHE.load(source, parse_source)
+
+
+def parse_file(path: str) -> ProcNode:
+    with open(path, encoding='utf-8') as f:
+        return parse_cached(f.read())
+
+
+def merge_procs(nodes: Sequence[ProcNode]) -> ProcNode:
+    """
+    按文件顺序合并多个文件的语法树，合并后的语法树交给 TypeDefVisitor/TypeDetailVisitor 统一处理
+    """
+    res = ProcNode()
+    for node in nodes:
+        res.children.extend(node.children)
+    return res
+
+
+def parse_files(paths: Sequence[str], max_workers: Optional[int] = None) -> List[ProcNode]:
+    """
+    在进程池中并行进行词法分析和语法分析，每个文件由一个子进程处理，返回值与 paths 的顺序一致。
+    语法分析得到的语法树还没有绑定 scope 等信息，直接 pickle 后传回主进程，
+    pickle 的数据比 parser.serialize 的扁平格式更小，加载也更快。
+    """
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    # 只有一个文件或者只允许一个进程时，启动进程池的开销大于收益
+    if max_workers <= 1:
+        return [parse_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(parse_file, paths))
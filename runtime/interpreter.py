@@ -1,3 +1,4 @@
+from code_gen.instances import InstanceCache
 from code_gen.script import PythonCodeGenerator
 from error.reporter import SourceCodeMaker
 from lexer.lexer import BaseLexer
@@ -11,7 +12,12 @@ from runtime.bridge import BRIDGE_CODE
 from runtime.bridge.native_function import NativeFunction, NATIVE_MANAGER, NativeManager
 from parser.expr import parse_proc
 from parser.visitor.type_visitor import TypeDefVisitor, TypeDetailVisitor
+from runtime.frontend import parse_cached, parse_files, merge_procs
+from runtime.snapshot import PreludeSnapshot, PRELUDE_SNAPSHOT
+from parser.node import ProcNode
 from functools import partial
+from types import CodeType
+from typing import List, Optional
 
 PRIMITIVE_TYPE_NAME = [
     "Int",
@@ -26,6 +32,7 @@ class Interpreter:
     def __init__(self, native_manager: NativeManager,
                  trait_impls: TraitImpls,
                  token_factory: TokenFactory):
+        self._native_manager = native_manager
         self._native_funcs = native_manager.native_functions
         self._meta_manager = native_manager.meta_manager
         self._scope_manager = native_manager.scope_manager
@@ -33,38 +40,85 @@ class Interpreter:
         self._trait_impls = trait_impls
         self._runtime_symbols = None
         self._native_func_obj = NativeFunction(self._meta_manager)
+        self._instance_cache = InstanceCache()
 
     def _native_functions(self):
         return {name: partial(func['func'], self._native_func_obj) for name, func in self._native_funcs.items()}
 
     @staticmethod
     def get_ast(source):
-        lexer = BaseLexer(TOKENS, SourceCodeMaker(source), source, ignore={"white_space", "comment"})
-        node = parse_proc(lexer)
-        return node
+        return parse_cached(source)
 
-    def init(self):
+    def init(self, snapshot: Optional[PreludeSnapshot] = PRELUDE_SNAPSHOT):
+        symbols = globals() | {'meta_manager': self._meta_manager, 'get_attr': self._meta_manager.get_attr} | self._native_functions()
+        self._meta_manager.globals = symbols
+
+        # 快照有效时直接恢复 bridge 代码类型检查之后的状态，跳过 TypeDefVisitor/TypeDetailVisitor
+        state = snapshot.load() if snapshot is not None else None
+        if state is not None:
+            self._restore_prelude(state)
+            return
+
+        # 再次初始化时清空之前定义的类型、trait impl 以及 meta，否则 bridge 代码的类型检查会重复定义
+        self._scope_manager.reset()
+        self._native_manager.define_functions()
+        self._trait_impls.reset()
+        self._meta_manager.metas = {}
         node = self.get_ast(BRIDGE_CODE)
         for t in PRIMITIVE_TYPE_NAME:
             self._scope_manager.add_type(TypeSymbol(t, define=PrimitiveType(t), parameters=[]))
             self._meta_manager.get_or_create_meta(t)
 
-        symbols = globals() | {'meta_manager': self._meta_manager} | self._native_functions()
-        self._meta_manager.globals = symbols
-
         TypeDefVisitor(self._scope_manager, self._trait_impls).visit_proc(node)
         TypeDetailVisitor(self._scope_manager, self._trait_impls).visit_proc(node)
+        if snapshot is not None:
+            snapshot.save(self._prelude_state())
+
+    def _prelude_state(self):
+        return self._scope_manager.global_scope, self._trait_impls.trait_impls, self._meta_manager.metas
 
+    def _restore_prelude(self, state):
+        global_scope, trait_impls, metas = state
+        self._scope_manager.reset(global_scope)
+        self._trait_impls.reset(trait_impls)
+        self._meta_manager.metas = metas
 
-    def run(self, source):
-        node = self.get_ast(source)
+
+    def run(self, source, byte_code: bool = False):
+        """
+        :param byte_code: 使用 BytecodeGenerateVisitor 直接生成字节码，否则生成 Python 源码后再 compile
+        """
+        self.run_ast(self.get_ast(source), byte_code)
+
+    def run_files(self, paths: List[str], max_workers: Optional[int] = None, byte_code: bool = False):
+        # 多个文件并行解析，合并后按文件顺序进行类型检查以及执行
+        self.run_ast(merge_procs(parse_files(paths, max_workers)), byte_code)
+
+    def _byte_code_visitor(self, dependencies):
+        # 字节码后端依赖可选的 bytecode 包，只在选择时导入
+        try:
+            from code_gen.byte_code_generator import BytecodeGenerateVisitor
+        except ImportError as e:
+            raise RuntimeError("byte code backend requires the optional dependency 'bytecode' (pip install bytecode)") from e
+        return BytecodeGenerateVisitor(self._meta_manager, self._trait_impls, self._instance_cache, dependencies)
+
+    def run_ast(self, node: ProcNode, byte_code: bool = False):
         TypeDefVisitor(self._scope_manager, self._trait_impls).visit_proc(node)
-        TypeDetailVisitor(self._scope_manager, self._trait_impls).visit_proc(node)
-        code_visitor = EvalVisitor(self._meta_manager, PythonCodeGenerator(), self._trait_impls)
+        type_visitor = TypeDetailVisitor(self._scope_manager, self._trait_impls)
+        type_visitor.visit_proc(node)
+        if byte_code:
+            code_visitor = self._byte_code_visitor(type_visitor.dependencies)
+        else:
+            code_visitor = EvalVisitor(self._meta_manager, PythonCodeGenerator(), self._trait_impls, self._instance_cache,
+                                       type_visitor.dependencies)
         code_res = code_visitor.visit_proc(node)
+        symbols = self._meta_manager.globals
         for func in code_visitor.function_defs:
             #print(func)
-            exec(func, self._meta_manager.globals)
+            exec(func if isinstance(func, CodeType) else self._instance_cache.compile(func), symbols)
+        self._meta_manager.bind_functions()
+        for function_ast, compile_name, source, dependencies in code_visitor.instances:
+            self._instance_cache.add(function_ast, compile_name, source, symbols, dependencies)
         #print(code_res, flush=True)
         exec(code_res, self._meta_manager.globals)
 
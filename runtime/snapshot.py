@@ -0,0 +1,80 @@
+import glob
+import os
+import pickle
+import sys
+from hashlib import sha256
+from typing import Any, Optional
+
+from parser.cache import AST_CACHE
+from runtime.bridge import BRIDGE_CODE
+from utils.logger import LOGGER
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 这些目录中的代码决定了 Interpreter.init 之后的状态，任意文件变化都会使快照失效
+SOURCE_PACKAGES = ("grammer", "lexer", "parser", os.path.join("parser", "visitor"), "runtime", os.path.join("runtime", "bridge"),
+                   "code_gen", "utils", "error")
+
+
+class PreludeSnapshot:
+    """
+    Interpreter.init 之后的状态快照(全局作用域、trait impl 以及 meta)，使用 pickle 保存到 __pycache__ 中。
+    快照的 key 包括 bridge 代码、语法版本以及相关源码文件的大小和修改时间，与 .pyc 的失效方式相同。
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+        self._key: Optional[str] = None
+
+    def key(self) -> str:
+        if self._key is None:
+            files = []
+            for package in SOURCE_PACKAGES:
+                with os.scandir(os.path.join(ROOT, package)) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".py"):
+                            stat = entry.stat()
+                            files.append((package, entry.name, stat.st_size, stat.st_mtime_ns))
+            files.sort()
+            definition = (self.VERSION, sys.version_info[:2], AST_CACHE.grammar(), BRIDGE_CODE, files)
+            self._key = sha256(repr(definition).encode("utf-8")).hexdigest()
+        return self._key
+
+    def path(self) -> str:
+        return os.path.join(self.directory, f"prelude-{self.key()[:32]}.snapshot")
+
+    def load(self) -> Optional[Any]:
+        try:
+            with open(self.path(), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 快照损坏或者与当前代码不兼容时重新初始化
+            LOGGER.warning("ignore invalid prelude snapshot %s: %s", self.path(), e)
+            return None
+
+    def save(self, state: Any):
+        path = self.path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, RecursionError) as e:
+            # 无法保存快照只会使下次启动变慢
+            LOGGER.info("can not write prelude snapshot %s: %s", path, e)
+            return
+        # 删除源码变化之前的快照
+        for stale in glob.glob(os.path.join(self.directory, "prelude-*.snapshot")):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+PRELUDE_SNAPSHOT = PreludeSnapshot()
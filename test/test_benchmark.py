@@ -0,0 +1,33 @@
+import sys
+from unittest import TestCase
+from benchmark import parser_bench
+from benchmark.lexer_bench import CORPORA, MB, compare, generate, run
+
+
+class TestLexerBenchmark(TestCase):
+
+    def test_generate(self):
+        for corpus in CORPORA:
+            source = generate(corpus, 1000, seed=1)
+            self.assertGreaterEqual(len(source), 1000)
+            self.assertEqual(source, generate(corpus, 1000, seed=1))
+
+    def test_run(self):
+        report = run(list(CORPORA), [2000 / MB])
+        self.assertEqual(len(report["results"]), len(CORPORA))
+        for r in report["results"]:
+            self.assertGreater(r["tokens"], 0)
+            self.assertGreater(r["peak_memory_bytes"], 0)
+        self.assertGreater(report["construction"]["dfa_states"], 1)
+        self.assertEqual(len(compare(report, report)), len(CORPORA))
+
+
+class TestParserBenchmark(TestCase):
+
+    def test_run(self):
+        report = parser_bench.run(scale=1, depth=sys.getrecursionlimit() * 2, repeat=1)
+        self.assertEqual(len(report["results"]), len(parser_bench.CORPORA) + len(parser_bench.DEEP_CORPORA))
+        for r in report["results"]:
+            self.assertNotIn("error", r)
+            self.assertGreater(r["tokens"], 0)
+        self.assertEqual(len(parser_bench.compare(report, report)), len(report["results"]))
@@ -1,9 +1,13 @@
 import dis
+import pickle
+import sys
+from copy import deepcopy
 from unittest import TestCase
 
 from code_gen.byte_code_generator import BytecodeGenerateVisitor
 from code_gen.script import PythonCodeGenerator
 from parser.expr import parse_proc
+from parser.node import BinaryOpNode, LogicNotNode, BitwiseNotNode, AttributeNode, FunctionCallNode, VarNode
 from lexer.lexer import BaseLexer
 from grammer import TOKENS
 from parser.scope import ScopeManager
@@ -51,6 +55,59 @@ class Test(TestCase):
         SymbolDefinitionVisitor(reporter).visit_proc(node)
         reporter.report_all()
 
+    def expr_shape(self, node):
+        if isinstance(node, BinaryOpNode):
+            return self.expr_shape(node.left), node.op, self.expr_shape(node.right)
+        if isinstance(node, LogicNotNode):
+            return "not", self.expr_shape(node.expr)
+        if isinstance(node, BitwiseNotNode):
+            return "!", self.expr_shape(node.expr)
+        if isinstance(node, AttributeNode):
+            return self.expr_shape(node.data), ".", node.attr.string
+        if isinstance(node, FunctionCallNode):
+            return self.expr_shape(node.call_source), [self.expr_shape(arg) for arg in node.args]
+        if isinstance(node, VarNode):
+            return node.identifier.string
+        return node.val
+
+    def test_binding_power(self):
+        cases = {
+            "a + b * c - d": (("a", "+", ("b", "*", "c")), "-", "d"),
+            "a or b and c == d < e << f | g": ("a", "or", ("b", "and", ("c", "==", ("d", "<", ("e", "<<", ("f", "|", "g")))))),
+            "a & b ^ c | d": ("a", "&", ("b", "^", ("c", "|", "d"))),
+            "not a < b == c": (("not", ("a", "<", "b")), "==", "c"),
+            "!a + b * c": ("!", ("a", "+", ("b", "*", "c"))),
+            "(a + b).c(1, d) * e": (((("a", "+", "b"), ".", "c"), ["1", "d"]), "*", "e"),
+        }
+        for code, shape in cases.items():
+            node = self.parse_tree(f"let v = {code};").children[0]
+            self.assertEqual(self.expr_shape(node.init_expr), shape, code)
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        node = self.parse_tree("let v = " + "a + (" * depth + "b" + ")" * depth + ";").children[0].init_expr
+        for _ in range(depth):
+            self.assertEqual(node.op, "+")
+            node = node.right
+        self.assertEqual(node.identifier.string, "b")
+        node = self.parse_tree("while a < 1 {" * depth + "f(a);" + "}" * depth).children[0]
+        for _ in range(depth - 1):
+            node = node.body.stmts[0]
+        self.assertIsInstance(node.body.stmts[0], FunctionCallNode)
+
+    def test_slotted_node(self):
+        node = self.parse_tree("let v = a + f(b);\n").children[0].init_expr
+        self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.unknown_field = 1
+        self.assertEqual(node.left.identifier.start_pos, (1, 9))
+        self.assertEqual(node.left.identifier.end_pos, (1, 9))
+        self.assertEqual([k for k, _ in node.iter_fields()][-3:], ["op", "left", "right"])
+        copied = pickle.loads(pickle.dumps(node))
+        self.assertEqual(self.expr_shape(copied), ("a", "+", ("f", ["b"])))
+        self.assertEqual(copied.left.identifier.start_pos, (1, 9))
+        self.assertEqual(self.expr_shape(deepcopy(node)), ("a", "+", ("f", ["b"])))
+
     def test_parse_tree(self):
         self.parse_tree(
             """
@@ -0,0 +1,38 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from parser.serialize import dump_ast
+from runtime.frontend import parse_files, parse_source, merge_procs
+
+
+class TestFrontend(TestCase):
+
+    SOURCES = [
+        """
+        struct Point { x: Int, y: Int }
+        def add(a: Int, b: Int) -> Int { return a + b; }
+        """,
+        """
+        let p = Point{x: 1, y: 2};
+        print(add(p.x, p.y).to_string());
+        """,
+        """
+        # empty module
+        """
+    ]
+
+    def test_parse_files(self):
+        with TemporaryDirectory() as directory:
+            paths = []
+            for i, source in enumerate(self.SOURCES):
+                path = os.path.join(directory, f"m{i}.ps")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(source)
+                paths.append(path)
+            expected = [parse_source(source) for source in self.SOURCES]
+            for max_workers in (1, 2):
+                nodes = parse_files(paths, max_workers)
+                self.assertEqual([dump_ast(node) for node in nodes], [dump_ast(node) for node in expected])
+            merged = merge_procs(nodes)
+            self.assertEqual(len(merged.children), 4)
+            self.assertEqual(merged.children[2:], nodes[1].children)
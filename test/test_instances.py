@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from code_gen.instances import InstanceCache
+from parser.scope import TraitImpls
+from parser.symbol_type import TraitImpl, TraitRef, TypeRef
+from runtime.frontend import parse_source
+from runtime.interpreter import INTERPRETER
+
+
+class TestInstanceCache(TestCase):
+
+    def test_reuse_across_runs(self):
+        INTERPRETER.init()
+        cache = INTERPRETER._instance_cache
+        INTERPRETER.run("def id<T>(a: T) -> T { return a; }")
+        INTERPRETER.run("let a = id(1);")
+        symbols = INTERPRETER._meta_manager.globals
+        function = symbols["id___Int"]
+        hits = cache.stats.hits
+
+        # 之后的运行直接使用已经定义的函数
+        INTERPRETER.run("let b = id(2);")
+        self.assertIs(symbols["id___Int"], function)
+        self.assertEqual(cache.stats.hits, hits + 1)
+        INTERPRETER.run("let c = id(1.5);")
+        self.assertIn("id___Float", symbols)
+
+        # 重新初始化之后全局变量中没有之前的函数
+        INTERPRETER.init()
+        INTERPRETER.run("def id<T>(a: T) -> T { return a; }")
+        INTERPRETER.run("let a = id(1);")
+        self.assertIsNot(INTERPRETER._meta_manager.globals["id___Int"], function)
+
+    def test_invalidate(self):
+        cache = InstanceCache()
+        function_ast, other_ast = parse_source("def f(a: Int) -> Int { return a; } def g(a: Int) -> Int { return a; }").children
+        symbols = {}
+        source = "def f___Int(a):\n    return a"
+        exec(cache.compile(source), symbols)
+        self.assertIs(cache.compile(source), cache.compile(source))
+        impls = TraitImpls()
+        with impls.record() as dependencies:
+            impls.get_impl(TypeRef("Int"), TraitRef("Show"))
+        cache.add(function_ast, "f___Int", source, symbols, dependencies)
+        self.assertIsNotNone(cache.get(function_ast, "f___Int", symbols, impls))
+        # 与查找过的类型无关的 impl 不影响缓存
+        impls.add_impl(TraitImpl(TraitRef("Show"), TypeRef("Float")))
+        impls.add_impl(TraitImpl(TraitRef("Eq"), TypeRef("Int")))
+        self.assertIsNotNone(cache.get(function_ast, "f___Int", symbols, impls))
+        self.assertIsNone(cache.get(other_ast, "f___Int", symbols, impls))
+        # 函数被覆盖
+        symbols["f___Int"] = None
+        self.assertIsNone(cache.get(function_ast, "f___Int", symbols, impls))
+        self.assertIsNone(cache.get(function_ast, "f___Int", {}, impls))
+        # 依赖的 impl 变化之后需要重新生成
+        exec(cache.compile(source), symbols)
+        cache.add(function_ast, "f___Int", source, symbols, dependencies)
+        impls.add_impl(TraitImpl(TraitRef("Show"), TypeRef("Int")))
+        self.assertIsNone(cache.get(function_ast, "f___Int", symbols, impls))
+
+    def test_reuse_with_impls(self):
+        # 每次运行都声明新的 impl，不依赖这些 impl 的实例仍然可以复用
+        INTERPRETER.init()
+        cache = INTERPRETER._instance_cache
+        INTERPRETER.run("trait Show { def show() -> String; } def id<T>(a: T) -> T { return a; }")
+        INTERPRETER.run('struct A { x: Int } impl Show for A { def show() -> String { return "a"; } } '
+                        'let a = A{x: 1}; let b = id(1); let c = a.show();')
+        symbols = INTERPRETER._meta_manager.globals
+        functions = {name: symbols[name] for name in ("id___Int", "Show_for_A___show")}
+        hits = cache.stats.hits
+        INTERPRETER.run('struct B { x: Int } impl Show for B { def show() -> String { return "b"; } } '
+                        'let d = A{x: 2}; let e = id(2); let f = d.show();')
+        self.assertEqual(cache.stats.hits, hits + 2)
+        for name, function in functions.items():
+            self.assertIs(symbols[name], function)
+        self.assertEqual(symbols["f"], "a")
@@ -0,0 +1,183 @@
+import io
+import sys
+from contextlib import redirect_stdout
+from unittest import TestCase
+from unittest.mock import patch
+
+from code_gen.script import PythonCodeGenerator
+from parser.visitor.script_gen_visitor import EvalVisitor
+from parser.visitor.type_visitor import TypeDefVisitor, TypeDetailVisitor
+from runtime.frontend import parse_source
+from runtime.interpreter import INTERPRETER
+
+
+class TestEvalVisitor(TestCase):
+
+    def run_code(self, code: str) -> str:
+        INTERPRETER.init()
+        with redirect_stdout(io.StringIO()) as out:
+            INTERPRETER.run(code)
+        return out.getvalue()
+
+    def test_native_operator(self):
+        code = """
+            def fib(n: Int) -> Int {
+                if n < 2 {
+                    return n;
+                }
+                return fib(n - 1) + fib(n - 2);
+            }
+            let a = fib(10);
+        """
+        INTERPRETER.init()
+        node = parse_source(code)
+        TypeDefVisitor(INTERPRETER._scope_manager, INTERPRETER._trait_impls).visit_proc(node)
+        TypeDetailVisitor(INTERPRETER._scope_manager, INTERPRETER._trait_impls).visit_proc(node)
+        visitor = EvalVisitor(INTERPRETER._meta_manager, PythonCodeGenerator(), INTERPRETER._trait_impls)
+        self.assertEqual(visitor.visit_proc(node).strip(), "a = fib(10)")
+        fib = next(x for x in visitor.function_defs if x.startswith("def fib"))
+        # 原生类型的运算直接使用 Python 的运算符
+        self.assertIn("(n < 2)", fib)
+        self.assertIn("(fib((n - 1)) + fib((n - 2)))", fib)
+        self.assertNotIn("vtable", fib)
+
+    def test_primitive_values(self):
+        output = self.run_code("""
+            def fib(n: Int) -> Int {
+                if n < 2 {
+                    return n;
+                }
+                return fib(n - 1) + fib(n - 2);
+            }
+            def show(x: impl ToString) -> String {
+                return x.to_string();
+            }
+            print(fib(15).to_string());
+            print(show(1.5));
+            print(show(2 > 1));
+            print("a" + "b");
+        """)
+        self.assertEqual(output, "610\n1.5\nTrue\nab\n")
+
+    def test_devirtualize(self):
+        output = self.run_code("""
+            trait Shape { def area() -> Float; }
+            struct Sq { s: Float }
+            impl Shape for Sq { def area() -> Float { return self.s * self.s; } }
+            struct Ci { r: Float }
+            impl Shape for Ci { def area() -> Float { return self.r * 3.0; } }
+            def area(s: impl Shape) -> Float { return s.area(); }
+            let sq = Sq{s: 2.0};
+            let ci = Ci{r: 1.0};
+            print(sq.area().to_string());
+            print(area(sq).to_string());
+            print(area(ci).to_string());
+        """)
+        self.assertEqual(output, "4.0\n4.0\n3.0\n")
+        symbols = INTERPRETER._meta_manager.globals
+        # 动态分派的调用点缓存上一次的接收者类型
+        call_sites = [v for k, v in symbols.items() if k.startswith("call_site_")]
+        self.assertTrue(call_sites)
+        self.assertIn(INTERPRETER._meta_manager.metas["Ci"], [site.key for site in call_sites])
+
+    def test_inline_cache(self):
+        INTERPRETER.init()
+        meta_manager = INTERPRETER._meta_manager
+        INTERPRETER.run("def total(x: impl ToString) -> String { return x.to_string(); } let a = total(1);")
+        site = meta_manager.globals[meta_manager.create_call_site("to_string", "ToString")]
+        self.assertEqual(site(1), "1")
+        self.assertIs(site.key, int)
+        target = site.target
+        self.assertEqual(site(2), "2")
+        self.assertIs(site.target, target)
+
+    def test_function_handle(self):
+        INTERPRETER.init()
+        meta_manager = INTERPRETER._meta_manager
+        handle = meta_manager.function_handle("double")
+        self.assertIs(meta_manager.function_handle("double"), handle)
+        exec("def double(a):\n    return a * 2", meta_manager.globals)
+        meta_manager.bind_functions()
+        self.assertEqual(handle(2), 4)
+        # 函数被重新定义之后绑定到新的定义
+        exec("def double(a):\n    return a + a + 1", meta_manager.globals)
+        meta_manager.bind_functions()
+        self.assertEqual(handle(2), 5)
+        INTERPRETER.init()
+        self.assertIsNot(meta_manager.function_handle("double"), handle)
+
+    def test_struct_class(self):
+        output = self.run_code("""
+            struct Box<T> { item: T, n: Int }
+            def get<T>(b: Box<T>) -> T { return b.item; }
+            let b = Box{n: 2, item: 1.5};
+            let c = Box{item: "s", n: 1};
+            print(get(b).to_string());
+            print(get(c));
+            print(b.n.to_string());
+        """)
+        self.assertEqual(output, "1.5\ns\n2\n")
+        symbols = INTERPRETER._meta_manager.globals
+        b = symbols["b"]
+        self.assertEqual(b.fields, ("item", "n"))
+        self.assertEqual(b.data, {"item": 1.5, "n": 2})
+        self.assertIs(b.meta, INTERPRETER._meta_manager.metas["Box_p_Float_q_"])
+        self.assertFalse(hasattr(b, "__dict__"))
+        self.assertIsNot(type(b), type(symbols["c"]))
+
+
+class TestBytecodeGenerateVisitor(TestCase):
+
+    def run_code(self, code: str, byte_code: bool) -> str:
+        INTERPRETER.init()
+        with redirect_stdout(io.StringIO()) as out:
+            INTERPRETER.run(code, byte_code=byte_code)
+        return out.getvalue()
+
+    def test_same_output(self):
+        code = """
+            trait Shape { def area() -> Float; }
+            struct Sq { s: Float }
+            impl Shape for Sq { def area() -> Float { return self.s * self.s; } }
+            struct Box<T> { item: T, n: Int }
+            def get<T>(b: Box<T>) -> T { return b.item; }
+            def fib(n: Int) -> Int {
+                if n < 2 {
+                    return n;
+                }
+                return fib(n - 1) + fib(n - 2);
+            }
+            def show(x: impl ToString) -> String { return x.to_string(); }
+            def mk() -> impl Shape { return Sq{s: 2.0}; }
+            let b = Box{n: 2, item: "box"};
+            print(fib(10).to_string());
+            print(show(2.5));
+            print(mk().area().to_string());
+            print(get(b));
+            if b.n > 3 { print("big"); } else { print("small"); }
+        """
+        expected = "55\n2.5\n4.0\nbox\nsmall\n"
+        self.assertEqual(self.run_code(code, byte_code=False), expected)
+        self.assertEqual(self.run_code(code, byte_code=True), expected)
+        self.assertIsInstance(INTERPRETER._meta_manager.globals["fib"].__code__.co_code, bytes)
+
+    def test_loop(self):
+        # 源码后端不支持循环，字节码后端可以直接生成跳转
+        output = self.run_code("""
+            let i = 0;
+            let s = 0;
+            while i < 5 {
+                i = i + 1;
+                if i == 2 { continue; }
+                if i == 4 { break; }
+                s = s + i;
+            }
+            print(s.to_string());
+        """, byte_code=True)
+        self.assertEqual(output, "4\n")
+
+    def test_unsupported_version(self):
+        INTERPRETER.init()
+        with patch.object(sys, "version_info", (3, 13, 0)):
+            with self.assertRaises(RuntimeError):
+                INTERPRETER.run("let a = 1;", byte_code=True)
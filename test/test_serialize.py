@@ -0,0 +1,82 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from parser.cache import AstCache
+from parser.node import FunctionDefNode, TraitImplNode
+from parser.serialize import dump_ast, load_ast
+from runtime.bridge import BRIDGE_CODE
+from runtime.frontend import parse_source
+
+
+class TestSerialize(TestCase):
+
+    def test_round_trip(self):
+        node = parse_source(BRIDGE_CODE)
+        data = dump_ast(node)
+        loaded = load_ast(data)
+        self.assertEqual(dump_ast(loaded), data)
+        self.assertEqual(loaded.children[0].start_pos, node.children[0].start_pos)
+        # impl 中的函数通过 trait_node 指向所在的 TraitImplNode
+        impl = next(child for child in loaded.children if isinstance(child, TraitImplNode))
+        self.assertIsInstance(impl.functions[0], FunctionDefNode)
+        self.assertIs(impl.functions[0].trait_node, impl)
+        self.assertIsNone(impl.scope)
+        self.assertIsNone(impl.functions[0].body.stmts[0].expr_type)
+
+    def test_deep_tree(self):
+        depth = 5000
+        node = parse_source("while a < 1 {" * depth + "f(a);" + "}" * depth)
+        loaded = load_ast(dump_ast(node)).children[0]
+        for _ in range(depth):
+            loaded = loaded.body.stmts[0]
+        self.assertEqual(loaded.call_source.identifier.string, "f")
+
+    def test_invalid(self):
+        data = dump_ast(parse_source("let a = 1;"))
+        with self.assertRaises(ValueError):
+            load_ast(b"XXXXX" + data[5:])
+        with self.assertRaises(ValueError):
+            load_ast(data[:-8])
+
+    def test_cache(self):
+        with TemporaryDirectory() as directory:
+            parsed = []
+
+            def parser(source):
+                parsed.append(source)
+                return parse_source(source)
+
+            cache = AstCache(directory)
+            first = cache.load(BRIDGE_CODE, parser)
+            second = cache.load(BRIDGE_CODE, parser)
+            # 每次加载都是新的语法树
+            self.assertIsNot(first, second)
+            self.assertEqual(dump_ast(first), dump_ast(second))
+            self.assertEqual(len(parsed), 1)
+
+            # 新的缓存实例从磁盘加载，不再重新解析
+            loaded = AstCache(directory).load(BRIDGE_CODE, parser)
+            self.assertEqual(len(parsed), 1)
+            self.assertEqual(dump_ast(loaded), dump_ast(first))
+
+            # 源码变化以及缓存文件损坏时重新解析
+            AstCache(directory).load(BRIDGE_CODE + "\n", parser)
+            self.assertEqual(len(parsed), 2)
+            with open(cache.path(cache.key(BRIDGE_CODE)), "wb") as f:
+                f.write(b"broken")
+            AstCache(directory).load(BRIDGE_CODE, parser)
+            self.assertEqual(len(parsed), 3)
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_cache_bound(self):
+        with TemporaryDirectory() as directory:
+            cache = AstCache(directory, max_entries=2, max_files=3)
+            sources = [f"let a{i} = {i};" for i in range(5)]
+            for i, source in enumerate(sources):
+                cache.load(source, parse_source)
+                # 保证修改时间不同
+                os.utime(cache.path(cache.key(source)), ns=(i, i))
+            # 进程内只保留最近使用的两个，磁盘只保留最近写入的三个
+            self.assertEqual(list(cache._data), [cache.key(source) for source in sources[3:]])
+            self.assertEqual(sorted(os.listdir(directory)), sorted(os.path.basename(cache.path(cache.key(source))) for source in sources[2:]))
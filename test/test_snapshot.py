@@ -0,0 +1,62 @@
+import io
+import os
+import subprocess
+import sys
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from runtime.interpreter import INTERPRETER
+from runtime.snapshot import PreludeSnapshot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 每次在新的进程中初始化解释器，第一次运行生成快照，之后的运行从快照恢复
+SCRIPT = """
+import logging, sys
+from utils.logger import LOGGER
+LOGGER.setLevel(logging.WARNING)
+from runtime.interpreter import INTERPRETER
+from runtime.snapshot import PreludeSnapshot
+directory = sys.argv[1]
+INTERPRETER.init(PreludeSnapshot(directory) if directory else None)
+with open(sys.argv[2], encoding="utf-8") as f:
+    INTERPRETER.run(f.read())
+"""
+
+
+class TestPreludeSnapshot(TestCase):
+
+    def run_demo(self, directory: str, demo: str) -> str:
+        res = subprocess.run([sys.executable, "-c", SCRIPT, directory, os.path.join(ROOT, "demo", demo)],
+                             cwd=ROOT, capture_output=True, text=True, timeout=60)
+        self.assertEqual(res.returncode, 0, res.stderr)
+        return res.stdout
+
+    def test_restore(self):
+        with TemporaryDirectory() as directory:
+            expected = self.run_demo("", "trait.ps")
+            self.assertEqual(self.run_demo(directory, "trait.ps"), expected)
+            snapshots = os.listdir(directory)
+            self.assertEqual(len(snapshots), 1)
+            self.assertEqual(self.run_demo(directory, "trait.ps"), expected)
+            self.assertEqual(os.listdir(directory), snapshots)
+
+            # 快照损坏时重新初始化并覆盖
+            with open(os.path.join(directory, snapshots[0]), "wb") as f:
+                f.write(b"broken")
+            output = self.run_demo(directory, "trait.ps")
+            self.assertIn("ignore invalid prelude snapshot", output)
+            self.assertTrue(output.endswith(expected))
+            self.assertGreater(os.path.getsize(os.path.join(directory, snapshots[0])), 1000)
+
+    def test_reinit(self):
+        # 不使用快照或者快照目录不可写时，再次初始化会重新进行类型检查，不能残留上一次定义的类型
+        with TemporaryDirectory() as directory:
+            unwritable = PreludeSnapshot(os.path.join(directory, "file", "snapshot"))
+            open(os.path.join(directory, "file"), "w").close()
+            for snapshot in (None, None, unwritable, unwritable):
+                INTERPRETER.init(snapshot)
+                with redirect_stdout(io.StringIO()) as out:
+                    INTERPRETER.run('struct P { x: Int } let p = P{x: 1}; print(p.x.to_string());')
+                self.assertEqual(out.getvalue(), "1\n")
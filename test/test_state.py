@@ -1,8 +1,14 @@
 from unittest import TestCase
 from lexer.re_expression import *
 from lexer.tokendef import TokenFactory, EOF
-from lexer.lexer import BaseLexer, SimpleCharSteam
+import os
+from tempfile import TemporaryDirectory
+from random import Random
+from lexer.lexer import BaseLexer, SimpleCharSteam, Utf8CharStream, IncrementalLexer
 from grammer import TOKENS
+from error.reporter import SourceCodeMaker
+from parser.expr import parse_proc
+from error.exception import SyntaxError
 
 class TestCharRange(TestCase):
     def test_char(self):
@@ -77,4 +83,134 @@ def test(a: String): String{
         """
         lexer = BaseLexer(TOKENS, code, ignore="white_space")
         while lexer.peek() != EOF:
-            print(lexer.pop())
\ No newline at end of file
+            print(lexer.pop())
+
+    def test_streaming(self):
+        code = """
+        struct Point { x: Int, y: Int }
+        let p = Point{x: 1, y: 2};
+        # comment
+        print("\\"" + p.x.to_string());
+        """
+        ignore = {"white_space", "comment"}
+        eager = BaseLexer(TOKENS, SourceCodeMaker(code), code, ignore=ignore)
+        streaming = BaseLexer(TOKENS, SourceCodeMaker(code), code, ignore=ignore, streaming=True, buffer_size=4)
+        while eager.peek() != EOF:
+            self.assertEqual(eager.pop(), streaming.pop())
+        self.assertEqual(streaming.peek(), EOF)
+        # 只保留最近 3 个 token 可以回退
+        for _ in range(3):
+            streaming.unpop()
+        self.assertRaises(IndexError, streaming.unpop)
+
+        streaming = BaseLexer(TOKENS, SourceCodeMaker(code), code, ignore=ignore, streaming=True, buffer_size=4)
+        parse_proc(streaming)
+
+    def test_utf8_stream(self):
+        code = """
+        let s = "中文é\U0001F600";
+        print(s);
+        """
+        ignore = {"white_space", "comment"}
+        expected = BaseLexer(TOKENS, SourceCodeMaker(code), code, ignore=ignore)._parse_all()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "code.sc")
+            with open(path, "wb") as f:
+                f.write(code.encode("utf-8"))
+            for chars in (code.encode("utf-8"), memoryview(code.encode("utf-8")), Utf8CharStream.open(path)):
+                tokens = BaseLexer(TOKENS, SourceCodeMaker(code), chars, ignore=ignore)._parse_all()
+                self.assertEqual([(t.token_type, t.text, t.start_pos, t.end_pos) for t in tokens],
+                                 [(t.token_type, t.text, t.start_pos, t.end_pos) for t in expected])
+                if isinstance(chars, Utf8CharStream):
+                    self.assertEqual(chars.peek_line(1).strip(), 'let s = "中文é\U0001F600";')
+                    chars.buffer.close()
+
+    def test_token_store(self):
+        code = "let a = 1;\nlet b = \"中x\";"
+        lexer = BaseLexer(TOKENS, SourceCodeMaker(code), code, ignore={"white_space", "comment"})
+        store = lexer._mock_lexer._tokens
+        self.assertEqual(len(store), 11)
+        self.assertEqual(store.kinds[0], TOKENS.kind("let"))
+        self.assertEqual(store.kinds[-1], EOF.kind)
+        self.assertEqual((store.starts[8], store.ends[8]), (19, 23))
+        token = store[8]
+        self.assertEqual((token.token_type, token.text, token.start_pos, token.end_pos), ("string", '"中x"', (2, 9), (2, 12)))
+        # expect/try_peek 可以使用 token 名称或者整数 id
+        self.assertEqual(lexer.expect_pop(TOKENS.kind("let")).text, "let")
+        self.assertEqual(lexer.peek_kind(), TOKENS.kind("id"))
+        self.assertIsNotNone(lexer.try_peek("id"))
+        self.assertIsNone(lexer.try_peek(TOKENS.kind("=")))
+        self.assertRaises(SyntaxError, lexer.expect, "=")
+
+    def test_keyword(self):
+        tokens = TokenFactory()
+        tokens.create_keyword("if")
+        tokens.create_keyword("in")
+        tokens.create(Expression.range("a", "z").many(), "id")
+        tokens.create_by_string(" ", "white_space")
+        self.assertEqual([token.name for token in tokens.tokens()], ["id", " "])
+        self.assertEqual(tokens.keywords(), {2: {"if": 0, "in": 1}})
+        code = "if iff in i"
+        lexer = BaseLexer(tokens, SourceCodeMaker(code), code, ignore={" "})
+        res = []
+        while lexer.peek() != EOF:
+            res.append(lexer.pop().token_type)
+        self.assertEqual(res, ["if", "id", "in", "id"])
+
+    def test_incremental(self):
+        code = """
+        struct Point { x: Int, y: Int }
+        # comment
+        let p = Point{x: 1, y: 2.5};
+        print("\\"" + p.x.to_string());
+        """ * 5
+        ignore = {"white_space", "comment"}
+        lexer = IncrementalLexer(TOKENS, ignore)
+        store = lexer.lex(code)
+        # 修改标识符时只重新分析编辑位置附近的 token
+        offset = code.index("print") + 2
+        self.assertEqual(lexer.relex(store, offset, 1, "x").ends, lexer.lex(code[:offset] + "x" + code[offset + 1:]).ends)
+        self.assertLess(lexer.scanned, 15)
+        random = Random(7)
+        for _ in range(100):
+            offset = random.randint(0, len(code))
+            removed = random.randint(0, min(5, len(code) - offset))
+            inserted = random.choice(["", "a", "1", " ", "\\n", "# ", "let", ".", "2.", "ab_c"])
+            new_code = code[:offset] + inserted + code[offset + removed:]
+            try:
+                expected = lexer.lex(new_code)
+            except Exception:
+                continue
+            store = lexer.relex(store, offset, removed, inserted)
+            code = new_code
+            self.assertEqual((store.kinds, store.starts, store.ends), (expected.kinds, expected.starts, expected.ends))
+            self.assertEqual(store.positions.lines, expected.positions.lines)
+            self.assertEqual([store[i].start_pos for i in range(len(store) - 1)],
+                             [expected[i].start_pos for i in range(len(expected) - 1)])
+
+    def test_incremental_chunks(self):
+        code = "let a = 1;\n# comment\nprint(a.to_string());\n" * 1200
+        ignore = {"white_space", "comment"}
+        lexer = IncrementalLexer(TOKENS, ignore)
+        old = lexer.lex(code)
+        offset = code.index("print")
+        store = lexer.relex(old, offset, 0, "ab_c")
+        code = code[:offset] + "ab_c" + code[offset:]
+        # 编辑位置之后的块只修改 delta，不复制其中的偏移量
+        self.assertGreater(len(old.starts._chunks), 2)
+        self.assertIs(store.starts._chunks[-1], old.starts._chunks[-1])
+        self.assertIs(store.positions.lines._chunks[-1], old.positions.lines._chunks[-1])
+        self.assertEqual(store.ends, lexer.lex(code).ends)
+        random = Random(11)
+        for _ in range(15):
+            # 删除的范围可能跨越多个块
+            offset = random.randint(0, len(code))
+            removed = random.randint(0, min(3000, len(code) - offset))
+            inserted = random.choice(["", "b", "\n", "let x = 2;\n" * 50])
+            code = code[:offset] + inserted + code[offset + removed:]
+            expected = lexer.lex(code)
+            store = lexer.relex(store, offset, removed, inserted)
+            self.assertEqual(str(store.positions.chars.rope), code)
+            self.assertEqual((store.kinds, store.starts, store.ends), (expected.kinds, expected.starts, expected.ends))
+            self.assertEqual(store.positions.lines, expected.positions.lines)
+            self.assertEqual(store[len(store) - 2].start_pos, expected[len(expected) - 2].start_pos)
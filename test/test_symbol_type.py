@@ -0,0 +1,53 @@
+import pickle
+from copy import deepcopy
+from unittest import TestCase
+
+from parser.scope import Scope
+from parser.symbol import TypeSymbol
+from parser.symbol_type import StructTypeRef, TraitRef, TypeRef, TypeVar
+from parser.visitor.utils import get_struct_ref
+
+
+class TestInternedType(TestCase):
+
+    def test_intern(self):
+        box = TypeRef("Box", [TypeRef("String")])
+        self.assertIs(box, TypeRef("Box", parameters=(TypeRef("String"),)))
+        self.assertIsNot(box, TypeRef("Box", [TypeRef("Int")]))
+        self.assertEqual(TraitRef("Add", [box]), TraitRef("Add", [TypeRef("Box", [TypeRef("String")])]))
+        self.assertNotEqual(TypeRef("Box"), box)
+        self.assertEqual(len({box, TypeRef("Box", [TypeRef("String")])}), 1)
+
+        var = TypeVar.create("T", [TraitRef("Show")])
+        self.assertIsNot(var, TypeVar.create("T", [TraitRef("Show")]))
+        self.assertIs(TypeVar(var.name, var.id, var.constraints), var)
+        self.assertEqual(var.constraints, (TraitRef("Show"),))
+        # 约束也是 key 的一部分，不会得到约束不同的已有对象
+        self.assertIsNot(TypeVar(var.name, var.id, [TraitRef("Eq")]), var)
+
+    def test_immutable(self):
+        box = TypeRef("Box", [TypeRef("String")])
+        with self.assertRaises(AttributeError):
+            box.parameters = []
+        self.assertIs(deepcopy(box), box)
+        # pickle 加载后仍然是唯一的对象
+        var = TypeVar.create("T")
+        ref = TypeRef("Box", [var])
+        loaded_ref, loaded_var = pickle.loads(pickle.dumps([ref, var]))
+        self.assertIs(loaded_ref, ref)
+        self.assertIs(loaded_var, var)
+
+    def test_struct_layout(self):
+        outer = Scope()
+        inner = Scope()
+        inner.parent = outer
+        var = TypeVar.create("T")
+        outer.add_type(TypeSymbol("P", StructTypeRef("P", {"x": var}, [var]), [var]))
+        inner.add_type(TypeSymbol("P", StructTypeRef("P", {"y": TypeRef("Int")}), []))
+        ref = TypeRef("P", [TypeRef("Float")])
+        # 布局保存在定义 struct 的作用域中，同一个 TypeRef 在不同作用域中得到不同的布局
+        self.assertEqual(get_struct_ref(ref, outer).fields, {"x": TypeRef("Float")})
+        self.assertEqual(get_struct_ref(ref, inner).fields, {"y": TypeRef("Int")})
+        self.assertFalse(hasattr(ref, "struct_ref"))
+        outer.types["P"].define = StructTypeRef("P", {"z": var}, [var])
+        self.assertEqual(get_struct_ref(ref, outer).fields, {"z": TypeRef("Float")})
@@ -0,0 +1,80 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from lexer.cache import TableCache
+from lexer.lexer import StateTable
+from lexer.re_expression import Expression, OrExpression
+from lexer.table import CompiledTable
+from lexer.tokendef import TokenFactory
+from lexer.utils import nfa_to_dfa
+
+
+class TestCompiledTable(TestCase):
+
+    def build_tokens(self):
+        tokens = TokenFactory()
+        tokens.create_by_string("if")
+        tokens.create(Expression.range("a", "z").many(), "id")
+        tokens.create(Expression.char('"') + Expression.any_char(['"']).star() + Expression.char('"'), "string")
+        return tokens
+
+    def build(self, tokens=None):
+        tokens = tokens or self.build_tokens()
+        expressions = []
+        for token in tokens.tokens():
+            token.exp.accept_as = token
+            expressions.append(token.exp)
+        return StateTable(nfa_to_dfa(OrExpression(expressions).to_nfa()))
+
+    def run_table(self, table: StateTable, text: str):
+        table.init()
+        for c in text:
+            if table.trans(ord(c)) is None:
+                return None
+        return table.get_accept()
+
+    def test_trans(self):
+        table = self.build()
+        self.assertEqual(self.run_table(table, "if").name, "if")
+        self.assertEqual(self.run_table(table, "iff").name, "id")
+        self.assertEqual(self.run_table(table, '"中文é"').name, "string")
+        self.assertEqual(self.run_table(table, '"\U0001F600"').name, "string")
+        self.assertIsNone(self.run_table(table, "A"))
+        table.init()
+        self.assertIsNone(table.trans(-1))
+
+    def test_compiled_matches_trans_table(self):
+        table = self.build()
+        compiled = table._table
+        for state, trans in table._trans_table.items():
+            for r, next_state in trans.items():
+                for c in {r.start, r.end, (r.start + r.end) // 2}:
+                    self.assertEqual(compiled.next_state(state, c), next_state)
+        self.assertEqual(compiled.next_state(StateTable.INIT_STATE, ord("A")), CompiledTable.STOP_STATE)
+
+    def test_serialize(self):
+        tokens = self.build_tokens()
+        table = self.build(tokens)._table
+        loaded = CompiledTable.from_bytes(table.to_bytes(), tokens)
+        self.assertEqual(loaded.dense, table.dense)
+        self.assertEqual(loaded.class_starts, table.class_starts)
+        self.assertEqual(loaded.sparse, table.sparse)
+        self.assertEqual([t and t.name for t in loaded.accepts], [t and t.name for t in table.accepts])
+
+    def test_cache(self):
+        with TemporaryDirectory() as directory:
+            built = []
+            def builder():
+                built.append(1)
+                return CompiledTable.compile(*StateTable.get_trans_table(nfa_to_dfa(exp.to_nfa())))
+            tokens = TokenFactory()
+            token = tokens.create(Expression.range("a", "z").many(), "id")
+            exp = OrExpression([token.exp])
+            token.exp.accept_as = token
+            cache = TableCache(directory)
+            table = cache.load(tokens, builder)
+            self.assertIs(cache.load(tokens, builder), table)
+            # 新的缓存实例从磁盘加载，不再重新编译
+            loaded = TableCache(directory).load(tokens, builder)
+            self.assertEqual(len(built), 1)
+            self.assertEqual(loaded.dense, table.dense)
+            self.assertNotEqual(tokens.fingerprint(), TokenFactory().fingerprint())
@@ -0,0 +1,83 @@
+import random
+from unittest import TestCase
+
+from parser.scope import TraitImpls
+from parser.symbol_type import TraitImpl, TraitRef, TypeRef, TypeVar
+
+
+class TestTraitImpls(TestCase):
+
+    def linear_get_impl(self, impls: TraitImpls, type_ref, trait_ref):
+        return [impl for impl in impls.trait_impls
+                if impls.is_type_match(type_ref, impl.target_type)
+                and trait_ref.name == impl.trait.name
+                and len(trait_ref.parameters) == len(impl.trait.parameters)
+                and all(impls.is_type_match(r1, r2) for r1, r2 in zip(impl.trait.parameters, trait_ref.parameters))]
+
+    def random_type(self, rand: random.Random, depth=0, constrained=False):
+        r = rand.random()
+        if r < 0.15:
+            # impl 的目标类型为带约束的类型变量时(impl<T: Show> Show for T)会无限递归，只在查询中使用约束
+            return TypeVar.create("T", [TraitRef(rand.choice(["Show", "Eq"]))] if constrained and rand.random() < 0.3 else [])
+        if depth < 2 and r < 0.5:
+            return TypeRef(rand.choice(["List", "Box"]), [self.random_type(rand, depth + 1, constrained)])
+        return TypeRef(rand.choice(["Int", "String", "Box", "Point"]))
+
+    def test_same_as_linear_scan(self):
+        rand = random.Random(0)
+        impls = TraitImpls()
+        for _ in range(60):
+            trait = TraitRef(rand.choice(["Show", "Eq", "Add"]), [self.random_type(rand)] if rand.random() < 0.2 else [])
+            impls.add_impl(TraitImpl(trait=trait, target_type=self.random_type(rand)))
+        for _ in range(2000):
+            type_ref = self.random_type(rand, constrained=True)
+            trait_ref = TraitRef(rand.choice(["Show", "Eq", "Add"]), [self.random_type(rand)] if rand.random() < 0.2 else [])
+            expected = self.linear_get_impl(impls, type_ref, trait_ref)
+            self.assertEqual([id(x) for x in impls.get_impl(type_ref, trait_ref, need_bind=False)], [id(x) for x in expected])
+            self.assertEqual([id(x) for _, x, matched in impls._candidates(type_ref, impls.ANY_TRAIT)
+                              if matched or impls.is_type_match(type_ref, x.target_type)],
+                             [id(x) for x in impls.trait_impls if impls.is_type_match(type_ref, x.target_type)])
+            self.assertEqual(len(impls.get_impl_by_trait(TraitRef(trait_ref.name))),
+                             len([x for x in impls.trait_impls if x.trait.name == trait_ref.name and not x.trait.parameters]))
+
+    def test_candidates(self):
+        impls = TraitImpls()
+        for i in range(100):
+            impls.add_impl(TraitImpl(trait=TraitRef("Show"), target_type=TypeRef(f"S{i}")))
+        blanket = TraitImpl(trait=TraitRef("Show"), target_type=TypeVar.create("T"))
+        generic = TraitImpl(trait=TraitRef("Show"), target_type=TypeRef("List", [TypeVar.create("T")]))
+        impls.add_impl(blanket)
+        impls.add_impl(generic)
+        # 只检查同名类型以及目标为类型变量的 impl
+        self.assertEqual([impl for _, impl, _ in impls._candidates(TypeRef("S1"), "Show")], [impls.trait_impls[1], blanket])
+        self.assertEqual([impl for _, impl, _ in impls._candidates(TypeRef("List", [TypeRef("Int")]), "Show")], [blanket, generic])
+        self.assertEqual(impls.get_impl(TypeRef("S7"), TraitRef("Show"), need_bind=False), [impls.trait_impls[7], blanket])
+
+        restored = TraitImpls()
+        restored.reset(impls.trait_impls)
+        self.assertEqual(restored.get_impl(TypeRef("S7"), TraitRef("Show"), need_bind=False), [impls.trait_impls[7], blanket])
+
+    def test_cache(self):
+        impls = TraitImpls()
+        impls.add_impl(TraitImpl(trait=TraitRef("Show"), target_type=TypeRef("Int")))
+        box = TypeRef("Box", [TypeRef("Int")])
+        constraint = TypeVar.create("T", [TraitRef("Show")])
+        self.assertFalse(impls.is_type_match(box, constraint))
+        self.assertFalse(impls.is_type_match(TypeRef("Box", [TypeRef("Int")]), constraint))
+        self.assertEqual(impls.match_stats.hits, 1)
+
+        # 添加 impl 后缓存失效
+        generic = TypeVar.create("T", [TraitRef("Show")])
+        impls.add_impl(TraitImpl(trait=TraitRef("Show"), target_type=TypeRef("Box", [generic]), type_parameters=[generic]))
+        self.assertTrue(impls.is_type_match(box, constraint))
+        self.assertEqual(impls.match_stats.hits, 1)
+
+        first = impls.get_impl(box, TraitRef("Show"))
+        second = impls.get_impl(TypeRef("Box", [TypeRef("Int")]), TraitRef("Show"))
+        self.assertEqual(impls.cache_info()["bind_impl"].hits, 1)
+        self.assertEqual(first[0].binds, {generic: TypeRef("Int")})
+        self.assertEqual(second[0].binds, first[0].binds)
+        # 每次返回的都是新的对象
+        self.assertIsNot(first[0], second[0])
+        second[0].binds.clear()
+        self.assertEqual(impls.get_impl(box, TraitRef("Show"))[0].binds, {generic: TypeRef("Int")})
@@ -642,4 +642,27 @@ class Test(TestCase):
         # print(scope_manager.lookup_traits('Convert'))
         # print(scope_manager.lookup_type('Pair'))
         # print(scope_manager.lookup_traits('Display'))
-        # print(trait_impls.trait_impls)
\ No newline at end of file
+        # print(trait_impls.trait_impls)
+    def test_instance_cache(self):
+        code = """
+            def id<T>(a: T) -> T {
+                return a;
+            }
+            let a = id(1);
+            let b = id(2);
+            let c = id(1.5);
+        """
+        INTERPRETER.init()
+        node = self.parse_tree(code)
+        TypeDefVisitor(INTERPRETER._scope_manager, INTERPRETER._trait_impls).visit_proc(node)
+        visitor = TypeDetailVisitor(INTERPRETER._scope_manager, INTERPRETER._trait_impls)
+        visitor.visit_proc(node)
+        a, b, c = [var.init_expr.define_ast for var in node.children[1:]]
+        # 同样的类型绑定共享同一个单态化的语法树
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+        self.assertIsNot(a, node.children[0])
+        self.assertEqual(len(visitor.instances), 2)
+        # 单态化不会修改原函数的作用域
+        self.assertIsNot(a.body.scope, node.children[0].body.scope)
+        self.assertIs(a.scope.parent, node.children[0].scope.parent)
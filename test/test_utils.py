@@ -1,5 +1,7 @@
 from unittest import TestCase
-from lexer.utils import generate_range, dis_join, split_range_by
+from lexer.utils import generate_range, dis_join, split_range_by, nfa_to_dfa, minimize_dfa, reachable_states
+from lexer.re_expression import Expression
+from lexer.tokendef import TokenFactory
 from lexer.state import CharRange
 from runtime.data import TypeName
 
@@ -32,6 +34,26 @@ class Test(TestCase):
         ])
         print(res)
 
+    def test_minimize_dfa(self):
+        tokens = TokenFactory()
+        keyword = tokens.create(Expression.string("ac") | Expression.string("bc"), "keyword")
+        number = tokens.create(Expression.range("0", "9").many(), "number")
+        keyword.exp.accept_as = keyword
+        number.exp.accept_as = number
+        dfa = nfa_to_dfa((keyword.exp | number.exp).to_nfa())
+        minimized = minimize_dfa(dfa)
+        self.assertLess(len(reachable_states(minimized)), len(reachable_states(dfa)))
+
+        def accept(state, text):
+            for c in text:
+                state = next((e.state for e in state.edges if e.char.cover(ord(c))), None)
+                if state is None:
+                    return None
+            return state.accept_as and state.accept_as.name
+
+        for text in ["ac", "bc", "a", "12", "1", "c", "ab"]:
+            self.assertEqual(accept(minimized, text), accept(dfa, text))
+
     def test_split_range(self):
         print(split_range_by(0, 65535, '"='))
 